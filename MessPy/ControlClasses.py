@@ -1,18 +1,20 @@
-import threading
+import contextlib
 import time
 import typing as T
 from asyncio import Task
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import numpy as np
 from attr import Factory, attrib, attrs, define
 from loguru import logger
 from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
-import asyncio as aio
 
 from qasync import Slot
 
 import MessPy.Instruments.interfaces as I
+from MessPy.Instruments.signal_processing import RunningStats
 from MessPy.Config import config
+from MessPy.PlanRunner import PlanRunner
 from MessPy.HwRegistry import (
     _cam,
     _cam2,
@@ -41,16 +43,27 @@ class Cam(QObject):
     shots: int = attrib(init=False)
 
     last_read: T.Optional[I.Reading] = attrib(init=False)
+    running_stats: T.Optional[RunningStats] = attrib(init=False, default=None)
     wavelengths: np.ndarray = attrib(init=False)
     wavenumbers: np.ndarray = attrib(init=False)
     disp_axis: np.ndarray = attrib(init=False)
 
+    # All reads run on this single, long-lived worker thread, in submission order.
+    _worker: ThreadPoolExecutor = attrib(init=False)
+    # Read kept armed by `next_read` while the previous one is processed
+    _armed: T.Optional[Future] = attrib(init=False, default=None)
+    # Exponential moving average of the achieved read rate
+    reads_per_s: float = attrib(init=False, default=0.0)
+    _last_read_time: T.Optional[float] = attrib(init=False, default=None)
+    _read_count: int = attrib(init=False, default=0)
+
     sigShotsChanged: T.ClassVar[pyqtSignal] = pyqtSignal(int)
     sigReadCompleted: T.ClassVar[pyqtSignal] = pyqtSignal()
     sigRefCalibrationFinished : T.ClassVar[pyqtSignal] = pyqtSignal(object, object)
 
     def __attrs_post_init__(self):
         QObject.__init__(self)
+        self._worker = ThreadPoolExecutor(1, thread_name_prefix=f"{self.cam.name} reader")
         self.shots = self.cam.shots
         if self.shots > 1000:
             self.set_shots(20)
@@ -90,6 +103,7 @@ class Cam(QObject):
     def set_shots(self, shots):
         """Sets the number of shots recorded"""
         logger.info(f"Setting shots to {shots}")
+        self.wait_for_reads()
         try:
             self.shots = int(shots)
             self.cam.set_shots(self.shots)
@@ -100,18 +114,99 @@ class Cam(QObject):
 
     @pyqtSlot()
     def read_cam(self, two_dim=False):
+        """
+        Makes a new reading and replaces `last_read`. The previous reading goes back
+        to the reading pool of the camera, use `hold_last_read` to keep a reading
+        valid while using it from another thread.
+        """
         logger.trace("Reading cam")
         rd = self.cam.make_reading()
-        self.last_read = rd
+        pool = self.cam.reading_pool
+        with pool.lock:
+            old, self.last_read = getattr(self, "last_read", None), rd
+        pool.release(old)
+        if self.running_stats is not None:
+            self.running_stats.add(rd.full_data)
+        self._update_read_rate()
         # self.sigReadCompleted.emit()
         return rd
 
+    def _update_read_rate(self):
+        now = time.perf_counter()
+        if self._last_read_time is not None:
+            rate = 1 / max(now - self._last_read_time, 1e-9)
+            if self.reads_per_s:
+                self.reads_per_s += 0.1 * (rate - self.reads_per_s)
+            else:
+                self.reads_per_s = rate
+        self._last_read_time = now
+        self._read_count += 1
+        if self._read_count % 500 == 0:
+            logger.debug(
+                f"{self.cam.name}: {self.reads_per_s:.1f} reads/s, "
+                f"{100 * self.trigger_efficiency:.0f}% of the laser shots"
+            )
+
+    @property
+    def trigger_efficiency(self) -> float:
+        """Fraction of the laser shots (at the rep. rate of the camera) which are read."""
+        return self.reads_per_s * self.shots / self.cam.rep_rate
+
+    def submit_read(self) -> "Future[I.Reading]":
+        """
+        Queues a read on the worker thread. It starts after all previously submitted
+        reads, hence the camera is never used by two reads at once.
+        """
+        return self._worker.submit(self.read_cam)
+
+    def next_read(self) -> I.Reading:
+        """
+        Returns the armed read, or makes one, and directly arms the next read. Hence
+        the camera is already acquiring while the returned reading is processed.
+        """
+        fut, self._armed = self._armed or self.submit_read(), None
+        try:
+            return fut.result()
+        finally:
+            self._armed = self.submit_read()
+
+    def wait_for_reads(self):
+        """
+        Blocks until the submitted reads are done and disarms `next_read`. Has to be
+        called before using the camera outside of the worker.
+        """
+        self._armed = None
+        self._worker.submit(lambda: None).result()
+
+    @contextlib.contextmanager
+    def hold_last_read(self) -> T.Iterator[I.Reading]:
+        """Context manager, which keeps the current `last_read` from being reused."""
+        pool = self.cam.reading_pool
+        with pool.lock:
+            rd = self.last_read
+            pool.hold(rd)
+        try:
+            yield rd
+        finally:
+            pool.release(rd)
+
+    def copy_last(self, kind: str, i: int) -> np.ndarray:
+        """Returns a copy of row i of an array of `last_read`, e.g. ("lines", 0)."""
+        with self.hold_last_read() as rd:
+            return getattr(rd, kind)[i, :].copy()
+
+    @pyqtSlot(bool)
+    def accumulate_stats(self, enable: bool):
+        """Starts (or stops) merging the shots of every read into `running_stats`."""
+        self.running_stats = RunningStats() if enable else None
+
     def start_two_reading(self):
         pass
 
     @pyqtSlot()
     def set_wavelength(self, wl, timeout=5):
         logger.info(f"Setting wavelength to {wl}")
+        self.wait_for_reads()
         assert self.cam.spectrograph is not None
         self.cam.spectrograph.set_wavelength(wl, timeout=timeout)
         self.cam.spectrograph.sigWavelengthChanged.emit(wl)
@@ -126,17 +221,20 @@ class Cam(QObject):
     @pyqtSlot()
     def get_bg(self):
         logger.info("Getting new background")
+        self.wait_for_reads()
         self.cam.set_background(self.shots)
 
     @pyqtSlot()
     def remove_bg(self):
         logger.info("Removing background")
+        self.wait_for_reads()
         self.cam.remove_background()
 
     @pyqtSlot(float)
     def set_slit(self, slit):
         if self.cam.spectrograph is not None:
             logger.info(f"Setting slit to {slit}")
+            self.wait_for_reads()
             self.cam.spectrograph.set_slit(slit)
             slit = self.cam.spectrograph.get_slit()
             self.cam.spectrograph.sigSlitChanged.emit(slit)
@@ -150,6 +248,7 @@ class Cam(QObject):
     def calibrate_ref(self):
         try:
             logger.info("Calibrating reference to probe")
+            self.wait_for_reads()
             self.cam.calibrate_ref()
             self.sigRefCalibrationFinished.emit(self.cam.deltaK1, self.cam.deltaK2)
         except AttributeError:
@@ -162,6 +261,10 @@ class DelayLine(QObject):
     pos: float = 0
     moving: bool = False
     _thread: T.Optional[object] = None
+    # Runs the waiting moves of `submit_move`
+    _mover: ThreadPoolExecutor = attrib(
+        init=False, factory=lambda: ThreadPoolExecutor(1, thread_name_prefix="delay line")
+    )
 
     sigPosChanged: T.ClassVar[pyqtSignal] = pyqtSignal(float)
 
@@ -184,12 +287,16 @@ class DelayLine(QObject):
             self.wait_and_update()
         else:
             logger.info("Waiting for delay line to finish moving")
-            while _dl.is_moving():
-                time.sleep(0.1)
+            while self._dl.is_moving():
+                time.sleep(0.01)
             self.moving = False
         self.pos = self._dl.get_pos_fs()
         self.sigPosChanged.emit(self.pos)
 
+    def submit_move(self, pos_fs: float) -> "Future[None]":
+        """Moves the delay line from a worker thread, the future is done when it stopped."""
+        return self._mover.submit(self.set_pos, pos_fs, True)
+
     def wait_and_update(self):
         "Wait until not moving. Do update position while moving"
         self.pos = self._dl.get_pos_fs()
@@ -244,6 +351,12 @@ class Controller(QObject):
     async_tasks: list = Factory(list)
     plan: T.Optional["Plan"] = None
     pause_plan: bool = False
+    # A child of the controller, so that the plans are stepped in its thread
+    runner: PlanRunner = attrib(init=False)
+    # While a plan runs, loop_finished is emitted at this interval to update the views
+    view_interval_ms: int = 30
+    # Owned by the controller, so that it can not fire after the controller is gone
+    _view_timer: QTimer = attrib(init=False)
 
     loop_finished: T.ClassVar[pyqtSignal] = pyqtSignal()
     stopping_plan: T.ClassVar[pyqtSignal] = pyqtSignal(bool)
@@ -260,29 +373,34 @@ class Controller(QObject):
             self.cam_list.append(self.cam2)
         else:
             self.cam2 = None
-        self.t1 = None
+        self.runner = PlanRunner()
+        self.runner.setParent(self)
+        self.runner.sigPlanPaused.connect(self._runner_paused)
+        self._view_timer = QTimer(self)
+        self._view_timer.setSingleShot(True)
+        self._view_timer.timeout.connect(self.loop_finished.emit)
 
-    @pyqtSlot()
-    def start_standard_read(self):
-        # t0 = time.time()
-        self.t1 = threading.Thread(target=self.cam.read_cam)
-        self.t1.start()
-        if self.cam2:
-            self.t2 = threading.Thread(target=self.cam2.read_cam)
-            self.t2.start()
-
-    def standard_read_running(self):
-        return self.t1.is_alive()
+    @pyqtSlot(bool)
+    def _runner_paused(self, paused: bool):
+        self.pause_plan = paused
 
     def standard_read(self):
-        self.t1.join()
-        self.cam.sigReadCompleted.emit()
-        # print((time.time()-t0)*1000)
+        """
+        Collects the armed read of each camera and arms the next one, which then is
+        acquired while the readings are emitted and plotted.
+        """
+        for cam in self.cam_list:
+            try:
+                cam.next_read()
+            except Exception as e:
+                logger.error(f"Reading {cam.name} failed: {e}")
+                continue
+            cam.sigReadCompleted.emit()
 
-        if self.cam2:
-            self.t2.join()
-            self.cam2.sigReadCompleted.emit()
-        self.t1 = None
+    def stop_standard_read(self):
+        """Waits for the armed reads, so that a plan can use the cameras."""
+        for cam in self.cam_list:
+            cam.wait_for_reads()
 
     @pyqtSlot()
     def loop(self):
@@ -293,36 +411,18 @@ class Controller(QObject):
 
             debugpy.debug_this_thread()
         if self.plan is None or self.pause_plan:
-            if self.t1 is None:
-                t0 = time.time()
-                self.start_standard_read()
-                self.standard_read()
-                # logger.info(f"Standard read took {(time.time()-t0)*1000} ms")
-                self.loop_finished.emit()
-        elif getattr(self.plan, "is_async", False) and self.plan.task:
-            t = self.plan.task
-            t: aio.Task
-            # print(t)
-            if t.done():
-                if t.exception():
-                    t.cancel()
-                    self.plan = None
-                    raise t.exception()
-                else:
-                    self.plan.task = None
-
-            time.sleep(0.02)
-            self.loop_finished.emit()
-        elif hasattr(self.plan, "make_step"):
-            try:
-                self.plan.make_step()
-                time.sleep(0.02)
-            except StopIteration:
-                self.pause_plan = True
-            except Exception as e:
-                logger.error(f"Error in loop: {e}")
-                self.pause_plan = True
+            self.runner.pause_plan()
+            self.standard_read()
             self.loop_finished.emit()
+            return
+        # The plan itself is stepped by the runner, the loop only refreshes the views
+        if self.runner.plan is not self.plan:
+            self.stop_standard_read()
+            self.runner.start_plan(self.plan)
+        elif self.runner.state == "paused":
+            self.stop_standard_read()
+            self.runner.resume_plan()
+        self._view_timer.start(self.view_interval_ms)
 
     @Slot(object)
     def start_plan(self, plan):
@@ -336,7 +436,10 @@ class Controller(QObject):
     def stop_plan(self):
         logger.info("Stopping plan")
         if self.plan:
-            self.plan.stop_plan()
+            if self.runner.plan is self.plan:
+                self.runner.stop_plan()
+            else:
+                self.plan.stop_plan()
             self.plan = None
             self.stopping_plan.emit(True)
 
@@ -2,7 +2,6 @@ import platform
 import sys
 from MessPy.Config import config
 from MessPy.Instruments.mocks import CamMock, DelayLineMock, StageMock, PowerMeterMock
-from MessPy.Instruments.spec_mightex import MightexSpectrometer
 from loguru import logger
 
 logger.info("Init HwRegistry")
@@ -27,8 +26,14 @@ else:
 logger.info(f"Running on {pc_name}")
 
 
-#logger.info("Unknown PC, using mocks")
-_cam = MightexSpectrometer()
+if TESTING:
+    logger.info("Testing, using mocks")
+    _cam = CamMock()
+else:
+    # The Mightex SDK is a windows dll, a broken driver has to fail here
+    from MessPy.Instruments.spec_mightex import MightexSpectrometer
+
+    _cam = MightexSpectrometer()
 _dl = DelayLineMock()
 _sh = StageMock()
 _power_meter = PowerMeterMock()
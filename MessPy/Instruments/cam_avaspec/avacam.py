@@ -55,14 +55,13 @@ class AvaCam(ICam):
     def make_reading(self) -> Reading:
         spec = self.get_spectra(frames=2)[0]["Probe"]
         assert spec.signal is not None
-        return Reading(
-            lines=spec.mean[None, :],
-            stds=np.clip(spec.std[None, :], 0, 100),
-            signals=spec.signal[None, :],
-            valid=True,
-            full_data=spec.data,
-            shots=self.shots,
-        )
+        # full_data is the array of the spectrum, which is already allocated per read
+        rd = self.new_reading(None, lines=1, std_lines=1, sig_lines=1)
+        rd.lines[0] = spec.mean
+        np.clip(spec.std, 0, 100, out=rd.stds[0])
+        rd.signals[0] = spec.signal
+        rd.full_data = spec.data
+        return rd
 
     def get_spectra(
         self, frames: Optional[int] = None
@@ -83,7 +82,11 @@ class AvaCam(ICam):
         ff = int(self._spec.analog_in[0] < 100)
 
         spec = Spectrum.create(
-            self._spec.data, name="Probe", frames=frames, first_frame=ff
+            self._spec.data,
+            name="Probe",
+            frames=frames,
+            first_frame=ff,
+            dtype=self.float_dtype,
         )
         # if ff == 0:
         # spec.signal *= -1
@@ -1,22 +1,23 @@
-import concurrent
-import concurrent.futures
 from math import log
 from pathlib import Path
 from typing import ClassVar, Dict, List, Optional, Tuple
 
 import attr
 import numpy as np
-from PyQt5.QtCore import Signal, .pyqtslotfrom scipy.stats import trim_mean
+from PyQt5.QtCore import pyqtSignal
 
 from MessPy.Instruments.cam_phasetec.imaq_newcffi import Cam
 from MessPy.Instruments.cam_phasetec.spec_sp2500i import SP2150i
 from MessPy.Instruments.interfaces import ICam
 from MessPy.Instruments.signal_processing import (
+    PhaseCycle,
     Reading,
     Reading2D,
     Spectrum,
     fast_col_mean,
+    fast_trim_mean_pair,
     first,
+    pumped_shots,
 )
 
 LOG10 = log(10)
@@ -72,7 +73,7 @@ class PhaseTecCam(ICam):
     darklevel: int = 0
     amplification: int = 7
 
-    sigRowsChanged: ClassVar[Signal] = pyqtSignal()
+    sigRowsChanged: ClassVar[pyqtSignal] = pyqtSignal()
 
     def get_state(self):
         # The following state is saved an restored after a restart
@@ -147,9 +148,14 @@ class PhaseTecCam(ICam):
                 name=name,
                 frames=frames,
                 first_frame=first_frame,
+                dtype=self.float_dtype,
             )
         return spectra, ch
 
+    def get_chopper(self, ch) -> np.ndarray:
+        # ch is the analog readout, shape (channels, shots)
+        return pumped_shots(np.asarray(ch[self.frame_channel]), 1)
+
     def make_reading(self, frame_data=None) -> Reading:
         d, ch = self.get_spectra(frames=2, get_max=True)
         probe = d["Probe1"]
@@ -159,14 +165,13 @@ class PhaseTecCam(ICam):
             normed = probe.data / ref.data
             norm_std = 100 * np.nanstd(normed, 1) / np.nanmean(normed, 1)
 
-            n = first(ch[0], 1)
+            n = first(np.asarray(ch[0], dtype=np.float64), 1)
             if (n % 2) == 0:
                 f = -1000
             else:
                 f = 1000
 
-            pu = trim_mean(normed[:, ::2], 0.2, 1)
-            not_pu = trim_mean(normed[:, 1::2], 0.2, 1)
+            pu, not_pu = fast_trim_mean_pair(normed, 0.2).T.astype(normed.dtype)
 
             sig = f * np.log10(pu / not_pu)
             sig_noref = d["Probe1"].signal
@@ -189,23 +194,16 @@ class PhaseTecCam(ICam):
                 sig_pr2 = (-f / LOG10) * np.log1p(dp2.mean(1) / probe2.mean)
             else:
                 # no ref calibration
-                pu2 = trim_mean(normed2[:, ::2], 0.2, 1)
-                not_pu2 = trim_mean(normed2[:, 1::2], 0.2, 1)
+                pu2, not_pu2 = fast_trim_mean_pair(normed2, 0.2).T.astype(normed2.dtype)
                 sig_pr2 = -f * np.log10(pu2 / not_pu2)
 
-            pu2 = trim_mean(probe2.data[:, ::2], 0.2, 1)
-            not_pu2 = trim_mean(probe2.data[:, 1::2], 0.2, 1)
-
-            sig_pr2_noref = probe2.signal  # f * np.log10(pu2 / not_pu2)
+            sig_pr2_noref = probe2.signal
 
-            reading = Reading(
-                lines=np.stack((probe.mean, probe2.mean, ref.mean, probe.max)),
-                stds=np.stack((probe.std, probe2.std, ref.std, norm_std)),
-                signals=np.stack((sig_noref, sig, sig_pr2_noref, sig_pr2)),
-                full_data=np.stack((probe.data, probe2.data, ref.data)),
-                shots=self.shots,
-                valid=True,
-            )  #
+            reading = self.new_reading((3,) + probe.data.shape)
+            np.stack((probe.mean, probe2.mean, ref.mean, probe.max), out=reading.lines)
+            np.stack((probe.std, probe2.std, ref.std, norm_std), out=reading.stds)
+            np.stack((sig_noref, sig, sig_pr2_noref, sig_pr2), out=reading.signals)
+            np.stack((probe.data, probe2.data, ref.data), out=reading.full_data)
         return reading
 
     def make_2D_reading(
@@ -214,22 +212,19 @@ class PhaseTecCam(ICam):
         rot_frame: float,
         repetitions: int = 1,
         save_frames: bool = False,
+        pump_grid: Optional[Tuple[float, float, int]] = None,
+        phase_cycle: Optional[PhaseCycle] = None,
     ) -> tuple[Dict[str, Reading2D], Dict[str, Spectrum]]:
-        spectra, ch = self.get_spectra(frames=self.shots // repetitions, get_max=False)
-
-        two_d_data = {}
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            for name in ("Probe1", "Probe2"):
-                future = executor.submit(
-                    Reading2D.from_spectrum, spectra[name], t2, rot_frame, save_frames
-                )
-                two_d_data[name] = future
-            for name in ("Probe1", "Probe2"):
-                two_d_data[name] = two_d_data[name].result()
-            two_d_data["Ref"] = spectra["Ref"]
+        two_d_data, spectra = super().make_2D_reading(
+            t2, rot_frame, repetitions, save_frames, pump_grid, phase_cycle
+        )
         self.two_d_data_ = two_d_data
         return two_d_data, spectra
 
+    def get_2D_spectra(self, repetitions: int = 1) -> Dict[str, Spectrum]:
+        spectra, ch = self.get_spectra(frames=self.shots // repetitions, get_max=False)
+        return spectra
+
     def calibrate_ref(self):
         tmp_shots = self.shots
         self._cam.set_shots(4000)
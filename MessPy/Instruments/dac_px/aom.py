@@ -2,7 +2,7 @@ from MessPy.Instruments.interfaces import IDevice
 from PyQt5.QtCore import pyqtSignal, QMutex
 from loguru import logger
 from pathlib import Path
-from typing import Optional, Literal
+from typing import Optional, Literal, Union
 from typing import TYPE_CHECKING, Tuple
 
 import attr
@@ -14,6 +14,7 @@ from MessPy.Instruments.dac_px.shaper_calculations import (
     cm2THz,
     THz2cm,
 )
+from MessPy.Instruments.signal_processing import PhaseCycle
 
 if TYPE_CHECKING:
     from MessPy.Instruments.dac_px.pxdac import PXDAC
@@ -173,20 +174,25 @@ class AOM(IDevice):
         taus: np.ndarray,
         rot_frame: float,
         rot_frame2: float,
-        phase_frames: Literal[1, 2, 4] = 4,
+        phase_frames: Union[int, PhaseCycle] = 4,
     ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Calculates the masks for creating a series a double pulses with phase cycling.
+        `phase_frames` is either the number of frames of a standard cycle or a
+        `PhaseCycle`, the frames of a cycle are consecutive for each tau.
         """
         if self.nu is None:
             raise ValueError("Spectral calibration is required to calculate the masks.")
-        phase = np.pi * np.array([(1, 1), (1, 0), (0, 0), (0, 1)])
-        phase = phase[:phase_frames, :]
-        phase = np.tile(phase, (taus.shape[0], 1))
+        if isinstance(phase_frames, PhaseCycle):
+            cycle = phase_frames
+        else:
+            cycle = PhaseCycle.standard(phase_frames)
+        phase = np.tile(cycle.phases, (taus.shape[0], 1))
+        amps = np.tile(cycle.amps, taus.shape[0])
         phi1 = phase[:, 0]
         phi2 = phase[:, 1]
-        taus = taus.repeat(phase_frames)
-        masks = double_pulse_mask(
+        taus = taus.repeat(cycle.n_frames)
+        masks = amps[None, :] * double_pulse_mask(
             self.nu[:, None],
             rot_frame,
             taus[None, :],
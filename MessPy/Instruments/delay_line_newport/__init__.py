@@ -14,9 +14,11 @@ Created on Tue Jun 03 15:41:22 2014
 
 
 import time
+import typing as T
+
 import attr
 import serial
-from PyQt5.QtCore import QObject, Signal, QTimer
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
 from MessPy.Instruments.interfaces import IDelayLine
 
 controller_states = {
@@ -57,6 +59,9 @@ class NewportDelay(IDelayLine):
     rot: serial.Serial = attr.ib()
     last_pos: float = 0
     pos_sign = -1.0
+    has_velocity_control: T.ClassVar[bool] = True
+    # Velocity before the first `set_velocity`, restored by `set_velocity(None)`
+    default_velocity: T.Optional[float] = None
     _busy_cnt = 0
     """
     At least answer n-times with true for is_moving after calling move. Workaround since
@@ -120,6 +125,16 @@ class NewportDelay(IDelayLine):
             print(ans)
             return 0
 
+    def get_velocity(self) -> float:
+        self.w("1VA?")
+        ans = self.rot.read_until(b"\r\n").decode()
+        return float(ans[ans.find("VA") + 2 : -2])
+
+    def set_velocity(self, mm_per_s: T.Optional[float]):
+        if self.default_velocity is None:
+            self.default_velocity = self.get_velocity()
+        self.w(f"1VA{mm_per_s or self.default_velocity}")
+
     def is_moving(self):
         if self._busy_cnt > 0:
             self._busy_cnt -= 1
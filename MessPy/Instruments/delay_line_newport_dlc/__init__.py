@@ -1,5 +1,5 @@
 import time
-from typing import Literal
+from typing import ClassVar, Literal, Optional
 from MessPy.Instruments.interfaces import IDelayLine
 from serial import Serial
 import attr
@@ -50,6 +50,9 @@ class NewportDLC(IDelayLine):
     name: str = 'Newport DLC'
     port: str = 'COM8'
     serial: Serial = attr.ib()
+    has_velocity_control: ClassVar[bool] = True
+    # Velocity before the first `set_velocity`, restored by `set_velocity(None)`
+    default_velocity: Optional[float] = None
 
     @serial.default
     def _default_serial(self):
@@ -97,6 +100,15 @@ class NewportDLC(IDelayLine):
     def move_mm(self, mm: float, *args, **kwargs):
         self.write(f'PA{mm:.3f}')
 
+    def get_velocity(self) -> float:
+        self.write('VA?')
+        return float(self.read()[2:])
+
+    def set_velocity(self, mm_per_s: Optional[float]):
+        if self.default_velocity is None:
+            self.default_velocity = self.get_velocity()
+        self.write(f'VA{mm_per_s or self.default_velocity:.3f}')
+
 
 if __name__ == '__main__':
     dl = NewportDLC()
@@ -18,7 +18,13 @@ from loguru import logger
 from PyQt5.QtCore import QThread, pyqtSignal, QObject  # type: ignore
 from scipy.constants import c
 
-from .signal_processing import Reading, Reading2D, Spectrum
+from .signal_processing import (
+    PhaseCycle,
+    Reading,
+    Reading2D,
+    ReadingPool,
+    Spectrum,
+)
 
 QObjectType = type(QObject)
 
@@ -185,8 +191,38 @@ class ICam(IDevice):
 
     can_validate_pixel: bool = False
     reader_thread: T.Optional[TargetThread] = None
+    # repetition rate of the laser triggering the camera in Hz
+    rep_rate: float = 1000.0
+    # dtype of the processed arrays. float32 halves the memory of full_data and of
+    # the saved shots. The reduction kernels still accumulate in float64, so they
+    # do not get faster, the conversion can even make them slightly slower.
+    float_dtype: T.Literal["float32", "float64"] = "float64"
+    # make_reading fills readings from the pool instead of allocating new arrays
+    reading_pool: ReadingPool = attr.Factory(ReadingPool)
+    # Spectra of get_spectra, which are references and not transformed in 2D
+    ref_names: T.ClassVar[T.Tuple[str, ...]] = ("Ref",)
     interface_type: T.ClassVar[str] = "Camera"
 
+    def new_reading(
+        self,
+        full_shape: T.Optional[T.Tuple[int, ...]],
+        lines: T.Optional[int] = None,
+        std_lines: T.Optional[int] = None,
+        sig_lines: T.Optional[int] = None,
+    ) -> Reading:
+        """
+        Returns a reading from the pool, with one row per line, std and signal name
+        unless given otherwise. The arrays have to be filled by the caller.
+        """
+        return self.reading_pool.acquire(
+            (lines or self.lines, self.channels),
+            (std_lines or self.std_lines, self.channels),
+            (sig_lines or self.sig_lines, self.channels),
+            full_shape,
+            self.shots,
+            self.float_dtype,
+        )
+
     @property
     def sig_lines(self) -> int:
         return len(self.sig_names)
@@ -213,14 +249,61 @@ class ICam(IDevice):
     ) -> T.Tuple[T.Dict[str, Spectrum], T.Any]:
         pass
 
+    def get_chopper(self, ch) -> np.ndarray:
+        """
+        Per shot mask of the pumped shots from the chopper data returned by
+        `get_spectra`. By default that is already the mask.
+        """
+        return np.asarray(ch, dtype=bool)
+
     def make_2D_reading(
         self,
         t2: np.ndarray,
         rot_frame: float,
         repetitions: int = 1,
         save_frames: bool = False,
+        pump_grid: T.Optional[T.Tuple[float, float, int]] = None,
+        phase_cycle: T.Optional[PhaseCycle] = None,
+    ) -> T.Tuple[T.Dict[str, Reading2D], T.Dict[str, Spectrum]]:
+        spectra = self.get_2D_spectra(repetitions)
+        two_d_data = self.process_2D_spectra(
+            spectra, t2, rot_frame, save_frames, pump_grid, phase_cycle
+        )
+        return two_d_data, spectra
+
+    def get_2D_spectra(self, repetitions: int = 1) -> T.Dict[str, Spectrum]:
+        """
+        The acquisition part of `make_2D_reading`. The returned spectra own their
+        frame data, so the camera can be read again while they are processed.
+        """
+        spectra, _ = self.get_spectra(frames=self.shots // repetitions)
+        return spectra
+
+    def process_2D_spectra(
+        self,
+        spectra: T.Dict[str, Spectrum],
+        t2: np.ndarray,
+        rot_frame: float,
+        save_frames: bool = False,
+        pump_grid: T.Optional[T.Tuple[float, float, int]] = None,
+        phase_cycle: T.Optional[PhaseCycle] = None,
     ) -> T.Dict[str, Reading2D]:
-        raise NotImplementedError
+        """
+        The processing part of `make_2D_reading`, demodulation and FFT of the
+        spectra of the camera. The spectra in `ref_names` are returned as they are.
+        """
+        two_d_data: T.Dict[str, T.Any] = Reading2D.from_spectra(
+            {n: s for n, s in spectra.items() if n not in self.ref_names},
+            t2,
+            rot_frame,
+            save_frames,
+            phase_cycle=phase_cycle,
+            pump_grid=pump_grid,
+        )
+        for name in self.ref_names:
+            if name in spectra:
+                two_d_data[name] = spectra[name]
+        return two_d_data
 
     @abc.abstractmethod
     def set_shots(self, shots):
@@ -271,6 +354,8 @@ class IDelayLine(IDevice):
     min_pos: float = -np.inf
 
     interface_type: T.ClassVar[str] = "DelayLine"
+    # Implements `set_velocity` and `get_velocity`, needed for the fast scans
+    has_velocity_control: T.ClassVar[bool] = False
 
     def get_state(self) -> dict:
         return dict(home_pos=self.home_pos)
@@ -305,6 +390,16 @@ class IDelayLine(IDevice):
     def is_moving(self) -> bool:
         return False
 
+    def set_velocity(self, mm_per_s: T.Optional[float]):
+        """
+        Sets the velocity of the following moves in mm/s, None restores the
+        default. Needed for the fast scans, which read while the stage moves.
+        """
+        raise NotImplementedError(f"{self.name} has no velocity control")
+
+    def get_velocity(self) -> T.Optional[float]:
+        raise NotImplementedError(f"{self.name} has no velocity control")
+
     def def_home(self):
         self.home_pos = self.get_pos_mm()
         self.save_state()
@@ -391,6 +486,9 @@ class ILissajousScanner(IDevice):
     has_zaxis: bool = False
 
     interface_type: T.ClassVar[str] = "LissajousScanner"
+    # Implements `set_vel_mm` and `get_vel_mm` of the x axis, needed for the fly
+    # scans, which only move along x
+    has_velocity_control: T.ClassVar[bool] = False
     sigPositionChanged: T.ClassVar[pyqtSignal] = pyqtSignal(float, float)
 
     def init_motor(self):
@@ -412,6 +510,13 @@ class ILissajousScanner(IDevice):
     def set_vel_mm(self, xvel=None, yvel=None):
         pass
 
+    def get_vel_mm(self) -> typing.Tuple[float, typing.Optional[float]]:
+        """
+        Velocities of the x and y axis in mm/s. The fly scans only use x, y is
+        None if the stage has no velocity control of the y axis.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def is_moving(self) -> typing.Tuple[bool, bool]:
         pass
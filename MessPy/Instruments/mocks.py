@@ -7,6 +7,7 @@ import attr
 from skultrafast.unit_conversions import names
 
 from MessPy.Instruments.interfaces import (
+    mm_to_fs,
     ICam,
     IDelayLine,
     IRotationStage,
@@ -15,6 +16,7 @@ from MessPy.Instruments.interfaces import (
     ISpectrograph,
     ILissajousScanner,
     IPowerMeter, IChopper,
+    Spectrum,
 )
 import time
 
@@ -29,14 +31,37 @@ class MockState:
     shutter: bool = False
     rot_stage_angle: float = 45
     stage_pos: list[float] = [0, 0, 0]
+    # The moving delay line, used for the delays during a read
+    delay_line: Optional["DelayLineMock"] = None
+    # The sample stage, whose position during a read is used
+    sample_stage: Optional["StageMock"] = None
+
+    def delay_at(self, times: np.ndarray) -> np.ndarray:
+        """The delay in fs at the given `time.perf_counter` times."""
+        if self.delay_line is None:
+            return np.full(np.shape(times), self.t, dtype=float)
+        return self.delay_line.pos_fs_at(times)
+
+    def stage_pos_now(self) -> list[float]:
+        """The x, y and z position of the sample stage, which may be moving."""
+        if self.sample_stage is None:
+            return self.stage_pos
+        return self.sample_stage.pos_at(time.perf_counter())
+
+    def stage_pos_at(self, times: np.ndarray) -> list[np.ndarray]:
+        """The x, y and z position of the sample stage at the given times."""
+        if self.sample_stage is None:
+            return [np.full(np.shape(times), p, dtype=float) for p in self.stage_pos]
+        return [ax.pos_at(times) for ax in self.sample_stage.motion]
 
     def knife_amp(self) -> float:
         from math import erfc, sqrt
 
-        z_pos = self.stage_pos[2] + 0.5
+        x, y, z = self.stage_pos_now()
+        z_pos = z + 0.5
         sigma = 0.25 * sqrt(1 + (z_pos / 0.5) ** 2)
-        x_pos = self.stage_pos[0] - 0.5 + 0.1 * self.stage_pos[2]
-        y_pos = self.stage_pos[1] - 0.5
+        x_pos = x - 0.5 + 0.1 * z
+        y_pos = y - 0.5
         knife_amp = 2 - erfc(sqrt(2) * (-x_pos) / sigma)
         knife_amp *= 2 - erfc(sqrt(2) * (-y_pos) / sigma)
         return knife_amp
@@ -101,6 +126,8 @@ class CamMock(ICam):
 
     def read_cam(self):
         t0 = time.time()
+        # the shots are emitted with the repetition rate from the start of the read
+        shot_times = time.perf_counter() + np.arange(self.shots) / self.rep_rate
         x = self.get_wavelength_array()
         y = 300 * np.exp(-((x - 250) ** 2) / self.peak_width**2 / 2)
 
@@ -122,47 +149,59 @@ class CamMock(ICam):
         ext = np.random.normal(size=(self.shots, self.ext_channels))
         chop = np.zeros(self.shots, "bool")
         chop[::2] = True
-        signal = (
-            0.1 * np.exp(-state.t / 3000)
-            if state.t > 0
-            else 0.1 * np.exp(state.t / 100)
-        )
+        t = state.delay_at(shot_times)
+        with np.errstate(over="ignore"):
+            signal = np.where(t > 0, 0.1 * np.exp(-t / 3000), 0.1 * np.exp(t / 100))
         y_sig = 300 * np.exp(-((x - 250) ** 2) / 20**2 / 2)
         y_sig -= 300 * np.exp(-((x - 310) ** 2) / 20**2 / 2)
-        dist = np.sqrt(state.stage_pos[0] ** 2 + state.stage_pos[1] ** 2)
-        y_sig *= np.exp(-dist / 0.5)
-        a[::2, :] *= 1 + signal * y_sig / 300
+        # the sample moves during the read in the fly scans
+        x_pos, y_pos, _ = state.stage_pos_at(shot_times)
+        dist = np.sqrt(x_pos**2 + y_pos**2)
+        signal = signal * np.exp(-dist / 0.5)
+        a[::2, :] *= 1 + signal[::2, None] * y_sig / 300
         dt = time.time() - t0
-        time.sleep(max(self.shots / 1000.0 - dt, 0))
+        # a read takes at least shots / rep_rate
+        time.sleep(max(self.shots / self.rep_rate - dt, 0))
         return a, b, chop, ext
 
     def make_reading(self) -> Reading:
         a, b, chopper, ext = self.read_cam()
+        a = a.astype(self.float_dtype, copy=False)
+        b = b.astype(self.float_dtype, copy=False)
         if self.background is not None:
             a -= self.background[0, ...]
             b -= self.background[1, ...]
-        tmp = np.stack((a, b, a / b))
-        tm = tmp.mean(1)
-        ts = 100 * tmp.std(1) / tm
+        # full_data has the (line, pixel, shots) layout of the real cameras
+        rd = self.new_reading((3, self.channels, self.shots))
+        tmp = rd.full_data
+        tmp[0] = a.T
+        tmp[1] = b.T
+        np.divide(tmp[0], tmp[1], out=tmp[2])
+        tm = tmp.mean(2, dtype=np.float64)
+        rd.lines[:] = tm[:2, :]
+        np.divide(100 * tmp.std(2, dtype=np.float64), tm, out=rd.stds)
 
         with np.errstate(all="ignore"):
-            signal = -1000 * np.log10(
+            rd.signals[1] = -1000 * np.log10(
                 np.nanmean(a[chopper, :], 0) / np.nanmean(a[~chopper, :], 0)
             )
-            signal2 = -1000 * np.log10(
-                np.nanmean((a / b)[chopper, :], 0) / np.nanmean((a / b)[~chopper, :], 0)
+            rd.signals[0] = -1000 * np.log10(
+                np.nanmean(tmp[2][:, chopper], 1) / np.nanmean(tmp[2][:, ~chopper], 1)
             )
-        return Reading(
-            lines=tm[:2, :],
-            stds=ts,
-            signals=np.stack((signal2, signal)),
-            valid=True,
-            full_data=tmp,
-            shots=self.shots,
-        )
+        return rd
 
-    def get_spectra(self, frames):
-        pass
+    def get_spectra(self, frames=None):
+        a, b, chopper, ext = self.read_cam()
+        spectra = {}
+        for name, data in (("Probe1", a), ("Probe2", b), ("Ref", b)):
+            spectra[name] = Spectrum.create(
+                np.ascontiguousarray(data.T, dtype=self.float_dtype),
+                name=name,
+                frames=frames,
+                first_frame=0,
+                dtype=self.float_dtype,
+            )
+        return spectra, chopper
 
     def set_background(self, shots):
         pass
@@ -179,32 +218,164 @@ class CamMock(ICam):
         return MockWidget(self)
 
 
+@attr.s(auto_attribs=True)
+class MotionAxis:
+    """
+    Motion of a single mock axis with a trapezoidal velocity profile. A move
+    accelerates with `acceleration` (units/s²) up to `max_velocity` (units/s),
+    cruises and decelerates to the target. The axis counts as moving until
+    `settle_time` (s) after the profile ended. Read positions have a gaussian
+    noise with the std. `readback_noise`. Without a `max_velocity`, moves are
+    instantaneous.
+    """
+
+    max_velocity: Optional[float] = 20.0
+    acceleration: float = 200.0
+    settle_time: float = 0.02
+    readback_noise: float = 1e-4
+    # Target of the last move
+    pos: float = 0.0
+    # (start time, start pos, end pos, max. velocity) of the last move
+    current_move: Optional[tuple] = None
+
+    def move(self, target: float, velocity: Optional[float] = None):
+        """Starts a move, `velocity` overrides the max. velocity of the axis."""
+        velocity = velocity or self.max_velocity
+        now = time.perf_counter()
+        if velocity is None:
+            self.current_move = None
+        else:
+            self.current_move = (now, float(self.pos_at(now)), target, velocity)
+        self.pos = target
+
+    def profile(self) -> typing.Tuple[float, float, float]:
+        """Acceleration time, cruise time and peak velocity of the current move."""
+        _, start, end, v = self.current_move
+        d = abs(end - start)
+        a = self.acceleration
+        t_acc = min(v / a, np.sqrt(d / a))
+        v_peak = a * t_acc
+        t_cruise = (d - a * t_acc**2) / v_peak if v_peak > 0 else 0.0
+        return t_acc, t_cruise, v_peak
+
+    def done_at(self) -> float:
+        """perf_counter time at which the current move is settled."""
+        if self.current_move is None:
+            return -np.inf
+        t_acc, t_cruise, _ = self.profile()
+        return self.current_move[0] + 2 * t_acc + t_cruise + self.settle_time
+
+    def pos_at(self, times) -> np.ndarray:
+        """True position at the given perf_counter times."""
+        if self.current_move is None:
+            return np.full(np.shape(times), self.pos, dtype=float)
+        t0, start, end, _ = self.current_move
+        t_acc, t_cruise, v_peak = self.profile()
+        a = self.acceleration
+        t = np.asarray(times, dtype=float) - t0
+        t_dec = np.clip(t - t_acc - t_cruise, 0, t_acc)
+        dist = (
+            a / 2 * np.clip(t, 0, t_acc) ** 2
+            + v_peak * np.clip(t - t_acc, 0, t_cruise)
+            + v_peak * t_dec
+            - a / 2 * t_dec**2
+        )
+        return start + np.sign(end - start) * dist
+
+    def read_pos(self) -> float:
+        """Position as read back from the controller, including the noise."""
+        pos = float(self.pos_at(time.perf_counter()))
+        if self.readback_noise > 0:
+            pos += np.random.normal(scale=self.readback_noise)
+        return pos
+
+    def is_moving(self) -> bool:
+        return time.perf_counter() < self.done_at()
+
+
 @attr.s(auto_attribs=True)
 class DelayLineMock(IDelayLine):
+    """
+    Moves along a trapezoidal velocity profile, see `MotionAxis`. A velocity set
+    by `set_velocity`, e.g. for the fast scans, replaces the max. velocity.
+    """
+
     name: str = "MockDelayStage"
-    pos_mm: float = 0.0
-    mock_speed: float = 6.0
-    moving: bool = False
-    current_move: tuple = None
+    has_velocity_control: typing.ClassVar[bool] = True
+    motion: MotionAxis = attr.Factory(MotionAxis)
+    # Velocity in mm/s, None for the default of the motion
+    velocity: Optional[float] = None
+
+    def set_velocity(self, mm_per_s: Optional[float]):
+        self.velocity = mm_per_s
+
+    def get_velocity(self) -> Optional[float]:
+        return self.velocity
+
+    def pos_mm_at(self, times) -> np.ndarray:
+        return self.motion.pos_at(times)
+
+    def pos_fs_at(self, times) -> np.ndarray:
+        mm = self.pos_mm_at(times)
+        return self.pos_sign * mm_to_fs((mm - self.home_pos) * self.beam_passes)
 
     def move_mm(self, mm, do_wait=True):
-        distance = mm - self.pos_mm
-        duration = distance / self.mock_speed
-        self.current_move = (time.time(), mm)
-        self.moving = True
-        self.pos_mm = mm
+        self.motion.move(mm, self.velocity)
 
     def get_pos_mm(self):
-        if self.moving:
-            time_passed = self.current_move[0] - time.time()
-        return self.pos_mm
+        return self.motion.read_pos()
 
     def is_moving(self):
-        return False
+        return self.motion.is_moving()
 
     def move_fs(self, fs, do_wait=False):
         super().move_fs(fs, do_wait=do_wait)
         state.t = fs
+        state.delay_line = self
+
+
+class DACMock:
+    """Stands in for the PXDAC of the AOM, the loaded buffer is kept."""
+
+    def __init__(self):
+        self.voltage = [0, 0]
+        self.buffer_size = 0
+
+    def SetDacSampleSizeXD48(self, size):
+        pass
+
+    def GetDacSampleSizeXD48(self, ch):
+        return 2
+
+    def GetDacSampleFormatXD48(self, ch):
+        return 0
+
+    def get_output_voltage(self):
+        return self.voltage
+
+    def set_output_voltage(self, ch1=None, ch2=None):
+        self.voltage = [ch1, ch2]
+
+    def SetExternalTriggerEnableXD48(self, enable):
+        pass
+
+    def GetExternalTriggerEnableXD48(self, ch):
+        return 1
+
+    def SetTriggerModeXD48(self, mode):
+        pass
+
+    def SetActiveChannelMaskXD48(self, mask):
+        pass
+
+    def LoadRamBufXD48(self, offset, size, ptr, flags):
+        self.buffer_size = size
+
+    def BeginRamPlaybackXD48(self, offset, size, frame_size):
+        pass
+
+    def EndRamPlaybackXD48(self):
+        pass
 
 
 @attr.s(auto_attribs=True)
@@ -236,36 +407,67 @@ class ShutterMock(IShutter):
 
 @attr.s(auto_attribs=True)
 class StageMock(ILissajousScanner):
+    """
+    The x, y and z axes move like `MotionAxis`, the position is in mm. A velocity
+    set by `set_vel_mm` replaces the max. velocity of the x or y axis.
+    """
+
     name: str = "MockSampleStage"
+    has_velocity_control: typing.ClassVar[bool] = True
     has_zaxis: bool = True
     _pos: list[float] = [0, 0, 0]
     pos_home: tuple[float, float] = (0, 0)
+    motion: list[MotionAxis] = attr.Factory(
+        lambda: [
+            MotionAxis(max_velocity=5.0, acceleration=50.0, settle_time=0.05)
+            for _ in range(3)
+        ]
+    )
+    # Velocities of the x and y axis in mm/s, None for the default of the motion
+    velocity: list[Optional[float]] = attr.Factory(lambda: [None, None])
+
+    def __attrs_post_init__(self):
+        super().__attrs_post_init__()
+        for ax, pos in zip(self.motion, state.stage_pos):
+            ax.pos = pos
+        state.sample_stage = self
 
     def is_moving(self) -> typing.Tuple[bool, bool]:
-        return False, False
+        return self.motion[0].is_moving(), self.motion[1].is_moving()
 
     def set_home(self):
         pass
 
     def set_zpos_mm(self, mm: float):
+        self.motion[2].move(mm)
         state.stage_pos[2] = mm
-        print(f"zpos{mm=}")
 
     def get_zpos_mm(self) -> float:
-        return state.stage_pos[2]
+        return self.motion[2].read_pos()
 
     def is_zmoving(self) -> bool:
-        return False
+        return self.motion[2].is_moving()
 
     def get_pos_mm(self) -> typing.Tuple[float, float]:
-        return tuple(state.stage_pos[:2])
+        return self.motion[0].read_pos(), self.motion[1].read_pos()
+
+    def set_vel_mm(self, xvel=None, yvel=None):
+        for i, vel in enumerate((xvel, yvel)):
+            if vel is not None:
+                self.velocity[i] = vel
+
+    def get_vel_mm(self) -> typing.Tuple[float, float]:
+        return tuple(v or ax.max_velocity for v, ax in zip(self.velocity, self.motion))
 
     def set_pos_mm(self, x=None, y=None):
-        print(f"{x=} {y=}")
-        if x is not None:
-            state.stage_pos[0] = x
-        if y is not None:
-            state.stage_pos[1] = y
+        for i, val in enumerate((x, y)):
+            if val is not None:
+                self.motion[i].move(val, self.velocity[i])
+                state.stage_pos[i] = val
+
+    def pos_at(self, t: float) -> list[float]:
+        """True x, y and z position at the perf_counter time t."""
+        return [float(ax.pos_at(t)) for ax in self.motion]
 
 
 @attr.s(auto_attribs=True)
@@ -28,6 +28,8 @@ class SampleHolder(ILissajousScanner):
     name: str = 'Pi Instruments Sampleholder'
     pos_home: tuple = POS_LIST
     has_zaxis: bool = True
+    # only the x axis, the fly axis of the image scans
+    has_velocity_control: typing.ClassVar[bool] = True
 
     def __attrs_post_init__(self):
         t2 = threading.Thread(target=self.init_mag)
@@ -58,15 +60,23 @@ class SampleHolder(ILissajousScanner):
         if y is not None:
             self.c843.move_mm(y)
 
+    def set_vel_mm(self, xvel=None, yvel=None):
+        if xvel is not None:
+            mag.VEL('1', xvel)
+
+    def get_vel_mm(self) -> typing.Tuple[float, typing.Optional[float]]:
+        # the C843 of the y axis moves with a fixed velocity
+        return mag.qVEL('1')['1'], None
+
     def get_pos_mm(self) -> typing.Tuple[float, float]:
         y = self.c843.get_pos_mm()
         x = mag.qPOS('1')['1']
         return x, y
 
     def is_moving(self) -> typing.Tuple[bool, bool]:
-        a = self.c843.is_moving()
-        b = mag.qMOV('1')['1']
-        return a, b
+        x = mag.qMOV('1')['1']
+        y = self.c843.is_moving()
+        return x, y
 
     def get_zpos_mm(self) -> float:
         return self.z_axis.get_pos_mm()
@@ -1,14 +1,33 @@
+import contextlib
+import functools
 import math
-from typing import Optional, Callable, Union, overload, Self
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import ClassVar, Optional, Callable, Tuple, Union, overload, Self
 
 import attr
 import numpy as np
+import scipy.fft
+import scipy.signal
 from numpy.typing import NDArray
 from scipy.constants import c
+import numba
+from loguru import logger
 from numba import njit, prange
 
 LOG10 = math.log(10)
 
+# The package directory may be read-only, in which case `cache=True` silently
+# falls back to compiling on every start. Hence the kernels are cached in the users
+# messpy directory, unless NUMBA_CACHE_DIR is set, see `configure_jit`.
+JIT_CACHE_DIR = Path(
+    os.environ.get("MESSPY_NUMBA_CACHE_DIR", Path.home() / ".messpy" / "numba_cache")
+)
+_jit_configured = False
+
 
 @overload
 def THz2cm(nu: float) -> float: ...
@@ -42,12 +61,30 @@ def first(arr, val: float) -> int:
     return 0
 
 
-def stats(probe, probe_max=None):
-    mean, std, mi, ma = fast_stats2d(probe.astype('float64')).T
+def pumped_shots(trigger: np.ndarray, val: float = 1) -> np.ndarray:
+    """
+    Mask of the pumped shots from the analog frame trigger of a read, the chopper
+    alternates every shot starting with the first shot above `val`.
+    """
+    n = first(trigger, val)
+    return np.arange(len(trigger)) % 2 == n % 2
+
+
+def stats(probe, probe_max=None, dtype=np.float64):
+    """
+    Mean, relative std in percent and max of a (pixel, shots) array. The kernels accept
+    any input dtype and accumulate in float64, the results are returned as `dtype`.
+    """
+    return _finish_stats(fast_stats2d(probe), probe_max, dtype)
+
+
+def _finish_stats(res, probe_max=None, dtype=np.float64):
+    res = res.astype(dtype, copy=False)
+    mean, std, mi, ma = res.T
     probe_mean = mean
     probe_std = 100 * std / probe_mean
     if probe_max is not None:
-        probe_max = np.nanmean(probe_max, 1)
+        probe_max = np.nanmean(probe_max, 1).astype(dtype, copy=False)
     else:
         probe_max = ma
     return probe_mean, probe_std, probe_max
@@ -66,30 +103,207 @@ def fast_stats2d(arr):
     return res
 
 
-@njit(fastmath=True, cache=True)
+@njit(cache=True)
 def fast_stats(arr: NDArray[np.float64]) -> tuple[float, float, float, float]:
     """
     For a given 1-dimensional array calculate mean, std, min_val and max_val in a single pass.
+    The sums are shifted by the first valid value, which avoids the cancellation of the
+    textbook formula for large offsets.
     """
-    s = 0
-    sq_sum = 0
+    n, mean, m2, min_val, max_val = _shifted_moments(arr)
+    if n == 0:
+        return np.nan, np.nan, np.nan, np.nan
+    return mean, math.sqrt(m2 / n), min_val, max_val
+
+
+@njit(cache=True)
+def _shifted_moments(arr):
     n = 0
-    min_val = max_val = arr[0]
+    shift = np.nan
+    s = 0.0
+    sq_sum = 0.0
+    min_val = np.inf
+    max_val = -np.inf
     for x in arr:
-        if not math.isnan(x):
-            n += 1
-        else:
+        x = float(x)
+        if math.isnan(x):
             continue
-        s += x
-        sq_sum += x * x
+        if n == 0:
+            shift = x
+        n += 1
+        d = x - shift
+        s += d
+        sq_sum += d * d
         if x > max_val:
             max_val = x
-        elif x < min_val:
+        if x < min_val:
             min_val = x
-    mean = s / n
-    var = (sq_sum - s * s / n) / n
-    std = math.sqrt(var)
-    return mean, std, min_val, max_val
+    if n == 0:
+        return 0, np.nan, 0.0, np.nan, np.nan
+    return n, shift + s / n, max(sq_sum - s * s / n, 0.0), min_val, max_val
+
+
+@njit(parallel=True, cache=True)
+def fast_moments2d(arr):
+    """
+    For a given 2-dimensional array calculate the number of valid values, the mean and the
+    sum of squared deviations (M2) along the second dimension, ignoring nans.
+
+    The result has the shape (n, 3) and can be combined with `merge_moments`.
+    """
+    n_rows = arr.shape[0]
+    res = np.zeros((n_rows, 3))
+    for i in prange(n_rows):
+        n, mean, m2, _, _ = _shifted_moments(arr[i, :])
+        res[i, 0] = n
+        res[i, 1] = mean
+        res[i, 2] = m2
+    return res
+
+
+@njit(cache=True)
+def merge_moments(count, mean, m2, count_b, mean_b, m2_b):
+    """
+    Merges the moments (count_b, mean_b, m2_b) into (count, mean, m2) inplace,
+    using the pairwise update of Chan et al. All arrays must be 1-dimensional.
+    """
+    for i in range(count.shape[0]):
+        nb = count_b[i]
+        if nb == 0:
+            continue
+        na = count[i]
+        n = na + nb
+        delta = mean_b[i] - mean[i]
+        mean[i] += delta * nb / n
+        m2[i] += m2_b[i] + delta * delta * na * nb / n
+        count[i] = n
+
+
+@njit(parallel=True, cache=True)
+def fast_frame_stats(arr, frames: int, first_frame: int):
+    """
+    For a given (pixel, shots) array calculate mean, std, min_val and max_val along
+    the second dimension and the nan-aware mean of every frame in a single pass.
+    Shot j belongs to frame j % frames, the frame axis is rolled by -first_frame.
+
+    Returns the stats with shape (pixel, 4) and the frame data with shape (pixel, frames).
+    """
+    n_pix, n_shots = arr.shape
+    res = np.empty((n_pix, 4))
+    frame_data = np.empty((n_pix, frames))
+    for i in prange(n_pix):
+        f_sum = np.zeros(frames)
+        f_cnt = np.zeros(frames, np.int64)
+        n = 0
+        shift = 0.0
+        s = 0.0
+        sq_sum = 0.0
+        min_val = np.inf
+        max_val = -np.inf
+        k = 0
+        for j in range(n_shots):
+            x = float(arr[i, j])
+            if not math.isnan(x):
+                if n == 0:
+                    shift = x
+                n += 1
+                d = x - shift
+                s += d
+                sq_sum += d * d
+                if x > max_val:
+                    max_val = x
+                if x < min_val:
+                    min_val = x
+                f_sum[k] += x
+                f_cnt[k] += 1
+            k += 1
+            if k == frames:
+                k = 0
+        if n > 0:
+            res[i, 0] = shift + s / n
+            res[i, 1] = math.sqrt(max(sq_sum - s * s / n, 0.0) / n)
+            res[i, 2] = min_val
+            res[i, 3] = max_val
+        else:
+            res[i, :] = np.nan
+        for k in range(frames):
+            dest = (k - first_frame) % frames
+            frame_data[i, dest] = f_sum[k] / f_cnt[k] if f_cnt[k] > 0 else np.nan
+    return res, frame_data
+
+
+@njit(cache=True)
+def _select(a, lo: int, hi: int, k: int):
+    """
+    Partially sorts a[lo:hi] inplace (quickselect), such that a[k] is at its sorted
+    position, with all smaller values before and all larger values after it.
+
+    Uses a branchless Lomuto partition, runs of equal values are skipped separately.
+    """
+    hi -= 1
+    while hi > lo:
+        mid = (lo + hi) // 2
+        if a[mid] < a[lo]:
+            a[mid], a[lo] = a[lo], a[mid]
+        if a[hi] < a[lo]:
+            a[hi], a[lo] = a[lo], a[hi]
+        if a[mid] < a[hi]:
+            a[hi], a[mid] = a[mid], a[hi]
+        pivot = a[hi]
+        store = lo
+        for i in range(lo, hi):
+            v = a[i]
+            a[i] = a[store]
+            a[store] = v
+            store += v < pivot
+        a[store], a[hi] = a[hi], a[store]
+        if k < store:
+            hi = store - 1
+        elif k > store:
+            eq = store + 1
+            for i in range(store + 1, hi + 1):
+                v = a[i]
+                a[i] = a[eq]
+                a[eq] = v
+                eq += v == pivot
+            if k < eq:
+                return
+            lo = eq
+        else:
+            return
+
+
+@njit(parallel=True, cache=True)
+def fast_trim_mean_pair(arr, proportion: float):
+    """
+    For a given (pixel, shots) array calculate the trimmed mean of the even and the
+    odd shots of each row, like `scipy.stats.trim_mean(arr[:, ::2], proportion, 1)`
+    and `scipy.stats.trim_mean(arr[:, 1::2], proportion, 1)`.
+
+    Only a partial selection is done instead of a full sort. Returns a (pixel, 2) array.
+    """
+    n_rows, n_shots = arr.shape
+    res = np.empty((n_rows, 2))
+    for i in prange(n_rows):
+        buf = np.empty((n_shots + 1) // 2)
+        for p in range(2):
+            m = 0
+            for j in range(p, n_shots, 2):
+                buf[m] = arr[i, j]
+                m += 1
+            lower = int(proportion * m)
+            upper = m - lower
+            if lower >= upper:
+                res[i, p] = np.nan
+                continue
+            if lower > 0:
+                _select(buf, 0, m, lower)
+                _select(buf, lower, m, upper)
+            s = 0.0
+            for j in range(lower, upper):
+                s += buf[j]
+            res[i, p] = s / (upper - lower)
+    return res
 
 
 @njit(fastmath=True, cache=True)
@@ -139,6 +353,83 @@ def fast_col_mean(arr, idx) -> NDArray[np.float64]:
     return s
 
 
+@attr.s(auto_attribs=True, cmp=False)
+class RunningStats:
+    """
+    Per-element running mean and variance. The raw values are not kept, new data
+    is merged into the stored moments, hence partial results of consecutive reads
+    or scans can be combined.
+    """
+
+    count: Optional[np.ndarray] = None
+    mean: Optional[np.ndarray] = None
+    m2: Optional[np.ndarray] = None
+
+    @property
+    def shape(self) -> Optional[tuple]:
+        return None if self.mean is None else self.mean.shape
+
+    def reset(self):
+        self.count = self.mean = self.m2 = None
+
+    def _merge(self, count, mean, m2):
+        if self.mean is None:
+            self.count = np.ascontiguousarray(count, dtype=np.float64)
+            self.mean = np.ascontiguousarray(mean, dtype=np.float64)
+            self.m2 = np.ascontiguousarray(m2, dtype=np.float64)
+            return
+        if self.mean.shape != mean.shape:
+            raise ValueError(f"Shape {mean.shape} does not match {self.mean.shape}")
+        merge_moments(
+            self.count.ravel(),
+            self.mean.ravel(),
+            self.m2.ravel(),
+            np.ascontiguousarray(count, dtype=np.float64).ravel(),
+            np.ascontiguousarray(mean, dtype=np.float64).ravel(),
+            np.ascontiguousarray(m2, dtype=np.float64).ravel(),
+        )
+
+    def add(self, data: np.ndarray):
+        """Adds all values along the last axis, e.g. the shots of a (line, pixel, shots) array."""
+        data = np.asarray(data)
+        shape = data.shape[:-1]
+        res = fast_moments2d(data.reshape(-1, data.shape[-1]))
+        self._merge(
+            res[:, 0].reshape(shape), res[:, 1].reshape(shape), res[:, 2].reshape(shape)
+        )
+
+    def add_sample(self, x: np.ndarray):
+        """Adds a single observation per element, nans are skipped."""
+        x = np.asarray(x, dtype=np.float64)
+        valid = ~np.isnan(x)
+        self._merge(valid.astype(np.float64), np.where(valid, x, 0), np.zeros(x.shape))
+
+    def merge(self, other: "RunningStats"):
+        if other.mean is not None:
+            self._merge(other.count, other.mean, other.m2)
+
+    @property
+    def masked_mean(self) -> np.ndarray:
+        """The mean, nan for elements without any valid sample."""
+        return np.where(self.count > 0, self.mean, np.nan)
+
+    @property
+    def var(self) -> np.ndarray:
+        """Population variance, like np.var."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.m2 / self.count
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.var)
+
+    @property
+    def sem(self) -> np.ndarray:
+        """Standard error of the mean, using the sample variance."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.m2 / (self.count - 1) / self.count)
+
+
 @attr.s(auto_attribs=True)
 class Spectrum:
     data: np.ndarray
@@ -153,23 +444,31 @@ class Spectrum:
 
     @classmethod
     def create(
-        cls, data, data_max=None, name=None, frames=None, first_frame=None
+        cls,
+        data,
+        data_max=None,
+        name=None,
+        frames=None,
+        first_frame=None,
+        dtype=np.float64,
     ) -> Self:
-        mean, std, max = stats(data, data_max)
+        """
+        Calculates the statistics of a (pixel, shots) array. `data` is stored as given,
+        all derived arrays have the given dtype.
+        """
         signal = None
         if frames is not None:
             assert first_frame is not None
-            frame_data = np.empty((mean.shape[0], frames))
-
-            for i in range(frames):
-                frame_data[:, i] = np.nanmean(data[:, i::frames], 1)
-            frame_data = np.roll(frame_data, -first_frame, 1)
+            res, frame_data = fast_frame_stats(data, frames, first_frame)
+            frame_data = frame_data.astype(dtype, copy=False)
+            mean, std, max = _finish_stats(res, data_max, dtype)
             if frames == 2:
                 with np.errstate(invalid="ignore"):
                     signal = (
                         1000 / LOG10 * np.log1p(frame_data[:, 0] / frame_data[:, 1] - 1)
                     )
         else:
+            mean, std, max = stats(data, data_max, dtype)
             frame_data = None
 
         return cls(
@@ -197,9 +496,315 @@ class Reading:
     valid: bool
 
 
+@attr.s(auto_attribs=True, cmp=False)
+class ReadingPool:
+    """
+    Hands out preallocated Readings, which the cameras fill in place. A reading
+    returned by `acquire` is held once by the caller, `release` returns it to the pool
+    when it is no longer held. Use `hold`/`holding` to keep a reading from being
+    reused, e.g. while it is plotted.
+
+    All readings of the pool have the same layout, if a different layout is requested
+    (e.g. after the number of shots changed) the old readings are dropped.
+    """
+
+    layout: Optional[tuple] = None
+    lock: threading.RLock = attr.Factory(threading.RLock)
+    _free: list[Reading] = attr.Factory(list)
+    _holds: weakref.WeakKeyDictionary = attr.Factory(weakref.WeakKeyDictionary)
+    _members: weakref.WeakSet = attr.Factory(weakref.WeakSet)
+
+    def acquire(
+        self,
+        lines_shape: tuple,
+        stds_shape: tuple,
+        signals_shape: tuple,
+        full_shape: Optional[tuple],
+        shots: int,
+        dtype=np.float64,
+    ) -> Reading:
+        """
+        Returns a free reading with arrays of the given shapes. The content of the
+        arrays is undefined. If `full_shape` is None, `full_data` has to be set by
+        the caller.
+        """
+        layout = (lines_shape, stds_shape, signals_shape, full_shape, np.dtype(dtype))
+        with self.lock:
+            if layout != self.layout:
+                self.layout = layout
+                self._free.clear()
+                self._members = weakref.WeakSet()
+            if self._free:
+                rd = self._free.pop()
+            else:
+                rd = Reading(
+                    lines=np.empty(lines_shape, dtype),
+                    stds=np.empty(stds_shape, dtype),
+                    signals=np.empty(signals_shape, dtype),
+                    full_data=None if full_shape is None else np.empty(full_shape, dtype),
+                    shots=shots,
+                    valid=True,
+                )
+                self._members.add(rd)
+            self._holds[rd] = 1
+        rd.shots = shots
+        rd.valid = True
+        return rd
+
+    def hold(self, rd: Reading):
+        """Adds a hold, a reading already released is taken back from the pool."""
+        with self.lock:
+            if rd in self._members:
+                if rd in self._free:
+                    self._free.remove(rd)
+                self._holds[rd] = self._holds.get(rd, 0) + 1
+
+    def release(self, rd: Optional[Reading]):
+        """Releases one hold, readings not belonging to the pool are ignored."""
+        if rd is None:
+            return
+        with self.lock:
+            if rd not in self._members:
+                return
+            n = self._holds.get(rd, 0) - 1
+            if n > 0:
+                self._holds[rd] = n
+            else:
+                self._holds.pop(rd, None)
+                if rd not in self._free:
+                    self._free.append(rd)
+
+    @contextlib.contextmanager
+    def holding(self, rd: Reading):
+        self.hold(rd)
+        try:
+            yield rd
+        finally:
+            self.release(rd)
+
+
+@attr.s(auto_attribs=True, frozen=True, cmp=False)
+class PhaseCycle:
+    """
+    Phase cycle with `n_frames` frames per t1 point. `phases` (n_frames, 2) holds the
+    phases of the scanned and the fixed pulse, `amps` the amplitude of the double pulse
+    for each frame, zero meaning the pump is blocked (chopping).
+
+    The interferogram is demodulated as ``scale * (f @ num) / (f @ den)``, where f
+    are the frames of one t1 point. Without `den` no normalization is done. Use
+    `from_phases` to derive the weights from the phases and `standard` for the
+    cycles used by the AOM.
+    """
+
+    phases: np.ndarray
+    num: np.ndarray
+    den: Optional[np.ndarray] = None
+    amps: np.ndarray = attr.ib()
+    scale: float = -1000 / LOG10
+    matrix: np.ndarray = attr.ib(init=False)
+
+    @amps.default
+    def _amps_default(self):
+        return np.ones(len(self.phases))
+
+    @matrix.default
+    def _calc_matrix(self):
+        cols = [self.num] if self.den is None else [self.num, self.den]
+        m = np.stack(cols, axis=1).astype(np.float64)
+        if m.shape[0] != self.n_frames:
+            raise ValueError("The weights must have one entry per frame of the cycle.")
+        m.flags.writeable = False
+        return m
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.phases)
+
+    @classmethod
+    def from_phases(
+        cls, phases: np.ndarray, amps: Optional[np.ndarray] = None
+    ) -> "PhaseCycle":
+        """
+        Cycle with weights cos(phi1 - phi2) for the interference term, shifted to
+        zero sum so that phase independent contributions cancel, normalized by the
+        sum of all frames. The weights are scaled to give the amplitude of the
+        standard 2 and 4 frame cycles, independent of the number of frames.
+        """
+        phases = np.asarray(phases, dtype=np.float64)
+        amps = np.ones(len(phases)) if amps is None else np.asarray(amps, float)
+        modulation = amps * np.cos(phases[:, 0] - phases[:, 1])
+        num = modulation - modulation.mean()
+        gain = num @ modulation
+        if np.isclose(gain, 0):
+            raise ValueError("The phases and amplitudes don't modulate the signal.")
+        den = np.ones(len(phases))
+        num *= den.sum() / gain
+        return cls(phases=phases, num=num, den=den, amps=amps)
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def standard(cls, n: int) -> "PhaseCycle":
+        """
+        The 1, 2 and 4 frame cycles, for other n an equally spaced n-step cycle of
+        the scanned pulse.
+        """
+        four_step = np.pi * np.array([(1, 1), (1, 0), (0, 0), (0, 1)])
+        if n == 1:
+            return cls(phases=four_step[:1], num=np.ones(1), scale=1)
+        elif n == 2:
+            return cls(phases=four_step[:2], num=np.array([1.0, -1]), den=np.full(2, 0.5))
+        elif n == 4:
+            return cls(phases=four_step, num=np.array([1.0, -1, 1, -1]), den=np.ones(4))
+        elif n >= 3:
+            phi1 = 2 * np.pi * np.arange(n) / n
+            return cls.from_phases(np.stack((phi1, np.zeros(n)), axis=1))
+        raise ValueError(f"Invalid number of frames {n}")
+
+    def demodulate(self, f: np.ndarray, n_t1: int) -> np.ndarray:
+        """Calculates the interferogram (pixel, t1) from the frame data (pixel, frames)."""
+        if f.shape[1] != n_t1 * self.n_frames:
+            raise ValueError(
+                f"Expected {n_t1 * self.n_frames} frames, got {f.shape[1]}"
+            )
+        if self.n_frames == 1 and self.den is None and self.scale * self.num[0] == 1:
+            return f
+        r = f.reshape(f.shape[0], n_t1, self.n_frames) @ self.matrix.astype(
+            f.dtype, copy=False
+        )
+        if self.den is None:
+            sig = r[..., 0]
+        else:
+            sig = r[..., 0] / r[..., 1]
+        if self.scale != 1:
+            sig *= self.scale
+        return sig
+
+
+@attr.s(auto_attribs=True, frozen=True, cmp=False)
+class TwoDTransform:
+    """
+    Real FFT along t1 of interferograms with a fixed number of points. The half-window
+    (including the halving of the first point) and the frequency axis are calculated
+    once, use `get_2d_transform` to get a cached instance.
+
+    If `pump_grid` is given as (start, stop, n) in cm-1, the spectrum is only evaluated
+    on that equidistant grid instead of the full zero-padded FFT, `upsample` has no
+    effect in that case. For short interferograms the windowed cosine kernel is
+    precomputed and applied as a single matrix product, longer ones use a chirp-z
+    transform.
+    """
+
+    n_t1: int
+    dt: float
+    upsample: int = 2
+    window: Optional[Callable] = np.hanning
+    rot_frame: float = 0
+    workers: int = -1
+    pump_grid: Optional[Tuple[float, float, int]] = None
+    weights: np.ndarray = attr.ib(init=False)
+    freqs: np.ndarray = attr.ib(init=False)
+    kernel: Optional[np.ndarray] = attr.ib(init=False)
+    czt: Optional[scipy.signal.CZT] = attr.ib(init=False)
+
+    max_kernel_size: ClassVar[int] = 2**20
+
+    @weights.default
+    def _calc_weights(self):
+        if self.window is not None:
+            w = self.window(self.n_t1 * 2)[self.n_t1 :].copy()
+        else:
+            w = np.ones(self.n_t1)
+        w[0] *= 0.5
+        w.flags.writeable = False
+        return w
+
+    @freqs.default
+    def _calc_freqs(self):
+        if self.pump_grid is not None:
+            start, stop, n = self.pump_grid
+            freqs = np.linspace(start, stop, int(n))
+        else:
+            freqs = THz2cm(scipy.fft.rfftfreq(self.n_t1 * self.upsample, self.dt))
+            freqs += self.rot_frame
+        freqs.flags.writeable = False
+        return freqs
+
+    @property
+    def _zoom_nu(self) -> np.ndarray:
+        # Frequencies relative to the rotating frame, in THz (dt is in ps).
+        return cm2THz(self.freqs - self.rot_frame)
+
+    @kernel.default
+    def _calc_kernel(self):
+        if self.pump_grid is None or self.n_t1 * self.freqs.size > self.max_kernel_size:
+            return None
+        t = np.arange(self.n_t1) * self.dt
+        k = self.weights[:, None] * np.cos(2 * np.pi * t[:, None] * self._zoom_nu)
+        k.flags.writeable = False
+        return k
+
+    @czt.default
+    def _calc_czt(self):
+        if self.pump_grid is None or self.kernel is not None:
+            return None
+        nu = self._zoom_nu
+        step = nu[1] - nu[0] if nu.size > 1 else 0.0
+        return scipy.signal.CZT(
+            self.n_t1,
+            nu.size,
+            w=np.exp(-2j * np.pi * step * self.dt),
+            a=np.exp(2j * np.pi * nu[0] * self.dt),
+        )
+
+    def transform(self, interferogram: np.ndarray) -> np.ndarray:
+        """
+        Transforms along the last axis, any number of leading axes is allowed, e.g.
+        (line, pixel, t1). The result has the dtype of the input.
+        """
+        if self.kernel is not None:
+            return interferogram @ self.kernel.astype(interferogram.dtype, copy=False)
+        a = interferogram * self.weights.astype(interferogram.dtype, copy=False)
+        if self.czt is not None:
+            out = self.czt(a, axis=-1)
+        else:
+            out = scipy.fft.rfft(
+                a,
+                self.n_t1 * self.upsample,
+                axis=-1,
+                overwrite_x=True,
+                workers=self.workers,
+            )
+        return out.real.astype(interferogram.dtype)
+
+
+def get_2d_transform(
+    n_t1: int,
+    dt: float,
+    upsample: int = 2,
+    window: Optional[Callable] = np.hanning,
+    rot_frame: float = 0,
+    pump_grid: Optional[Tuple[float, float, int]] = None,
+) -> TwoDTransform:
+    if pump_grid is not None:
+        pump_grid = (float(pump_grid[0]), float(pump_grid[1]), int(pump_grid[2]))
+    return _cached_2d_transform(n_t1, float(dt), upsample, window, rot_frame, pump_grid)
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_2d_transform(n_t1, dt, upsample, window, rot_frame, pump_grid):
+    return TwoDTransform(
+        n_t1=n_t1,
+        dt=dt,
+        upsample=upsample,
+        window=window,
+        rot_frame=rot_frame,
+        pump_grid=pump_grid,
+    )
+
+
 @attr.s(auto_attribs=True, cmp=False)
 class Reading2D:
-    """Has the shape (pixel, t2)"""
+    """Has the shape (pixel, t2). The arrays keep the dtype of the frame data."""
 
     spectra: Spectrum
     interferogram: np.ndarray
@@ -207,11 +812,27 @@ class Reading2D:
     window: Optional[Callable] = np.hanning
     upsample: int = 2
     rot_frame: float = 0
+    pump_grid: Optional[Tuple[float, float, int]] = None
     freqs: np.ndarray = attr.ib()
     signal_2D: np.ndarray = attr.ib()
     frames: Optional[np.ndarray] = None
     ref_frames: Optional[np.ndarray] = None
 
+    @staticmethod
+    def demodulate(
+        f: np.ndarray, n_t1: int, phase_cycle: Optional[PhaseCycle] = None
+    ) -> np.ndarray:
+        """
+        Calculates the interferogram (pixel, t1) from the frame data. Without a
+        `phase_cycle`, the standard cycle for the number of frames is used.
+        """
+        if phase_cycle is None:
+            n, rest = divmod(f.shape[1], n_t1)
+            if rest:
+                raise ValueError(f"Invalid number of frames {f.shape[1] / n_t1}")
+            phase_cycle = PhaseCycle.standard(n)
+        return phase_cycle.demodulate(f, n_t1)
+
     @classmethod
     def from_spectrum(
         cls,
@@ -220,24 +841,12 @@ class Reading2D:
         rot_frame: float,
         save_frame_enabled: bool,
         ref_frames: Optional[np.ndarray] = None,
+        phase_cycle: Optional[PhaseCycle] = None,
         **kwargs,
     ) -> "Reading2D":
         assert s.frame_data is not None
         f = s.frame_data
-        n = s.frame_data.shape[1] / len(t2_ps)
-        if n == 1:
-            sig = f
-        elif n == 2:
-            sig = (f[:, 0::2] - f[:, 1::2]) * (-1000 / LOG10)
-            sig /= 0.5 * (f[:, 0::2] + f[:, 1::2])
-        elif n == 4:
-            sig = ((f[:, 0::4] - f[:, 1::4]) + (f[:, 2::4] - f[:, 3::4])) * (
-                -1000 / LOG10
-            )  # type: np.ndarray
-            sig /= f[:, 0::4] + f[:, 1::4] + f[:, 2::4] + f[:, 3::4]
-        else:
-            raise ValueError(f"Invalid number of frames {n}")
-        assert sig.shape[1] == len(t2_ps)
+        sig = cls.demodulate(f, len(t2_ps), phase_cycle)
         if save_frame_enabled:
             kwargs["frames"] = f
             if ref_frames is not None:
@@ -246,18 +855,175 @@ class Reading2D:
             spectra=s, interferogram=sig, t2_ps=t2_ps, rot_frame=rot_frame, **kwargs
         )
 
+    @classmethod
+    def from_spectra(
+        cls,
+        spectra: dict[str, Spectrum],
+        t2_ps: np.ndarray,
+        rot_frame: float,
+        save_frame_enabled: bool,
+        phase_cycle: Optional[PhaseCycle] = None,
+        **kwargs,
+    ) -> dict[str, "Reading2D"]:
+        """
+        Like `from_spectrum` for several lines, the interferograms of all lines are
+        transformed by a single batched FFT.
+        """
+        ifrs = {
+            name: cls.demodulate(s.frame_data, len(t2_ps), phase_cycle)
+            for name, s in spectra.items()
+        }
+        trans = get_2d_transform(
+            len(t2_ps),
+            t2_ps[1] - t2_ps[0],
+            kwargs.get("upsample", 2),
+            kwargs.get("window", np.hanning),
+            rot_frame,
+            kwargs.get("pump_grid", None),
+        )
+        signals = trans.transform(np.stack(list(ifrs.values())))
+        readings = {}
+        for i, (name, s) in enumerate(spectra.items()):
+            if save_frame_enabled:
+                kwargs["frames"] = s.frame_data
+            readings[name] = cls(
+                spectra=s,
+                interferogram=ifrs[name],
+                t2_ps=t2_ps,
+                rot_frame=rot_frame,
+                freqs=trans.freqs.copy(),
+                signal_2D=signals[i],
+                **kwargs,
+            )
+        return readings
+
+    @property
+    def transform(self) -> TwoDTransform:
+        return get_2d_transform(
+            len(self.t2_ps),
+            self.t2_ps[1] - self.t2_ps[0],
+            self.upsample,
+            self.window,
+            self.rot_frame,
+            self.pump_grid,
+        )
+
     @freqs.default
     def calc_freqs(self):
-        freqs = np.fft.rfftfreq(
-            len(self.t2_ps) * self.upsample, self.t2_ps[1] - self.t2_ps[0]
-        )
-        return THz2cm(freqs) + self.rot_frame
+        # the axis of the cached transform is read-only
+        return self.transform.freqs.copy()
 
     @signal_2D.default
     def calc_2d(self):
-        a = self.interferogram.copy()
-        a[:, 0] *= 0.5
-        if self.window is not None:
-            win = self.window(a.shape[1] * 2)
-            a = a * win[None, a.shape[1] :]
-        return np.fft.rfft(a, a.shape[1] * self.upsample, 1).real
+        return self.transform.transform(self.interferogram)
+
+
+@njit(parallel=True, cache=True)
+def _launch_kernel(x):
+    """Runs on all threads, see `_launch_numba_threads`."""
+    for i in prange(x.shape[0]):
+        x[i] = i
+
+
+_cached_kernels = [
+    k for k in globals().values() if isinstance(k, numba.core.dispatcher.Dispatcher)
+]
+_warm_up_thread: Optional[threading.Thread] = None
+
+
+def _warm_up_calls(dtype) -> list[tuple[Callable, tuple]]:
+    """
+    Calls of the kernels with the array types the cameras pass: C-contiguous arrays
+    like the mocks and strided views like the lines of the PhaseTec camera. The raw
+    uint16 frames are only averaged by `fast_col_mean`.
+    """
+    cube = np.ones((4, 6, 8), dtype)[:, 1:3, :]
+    mask = np.ones((4, 2), bool)
+    if np.dtype(dtype).kind == "u":
+        return [(fast_col_mean, (cube, mask))]
+    a = np.ones((4, 8), dtype)
+    strided = np.ones((8, 2, 4), dtype).transpose()[:, 0, :]
+    v = np.ones(4)
+    calls = [
+        (first, (a[0], 0.5)),
+        (first, (v, 1)),
+        (fast_stats, (a[0],)),
+        (merge_moments, (v, v.copy(), v.copy(), v, v, v)),
+        (fast_trim_mean_pair, (a, 0.2)),
+        (fast_signal2d, (a,)),
+        (fast_col_mean, (cube, mask)),
+    ]
+    for arr in (a, strided):
+        calls += [
+            (fast_stats2d, (arr,)),
+            (fast_moments2d, (arr,)),
+            (fast_frame_stats, (arr, 4, 1)),
+        ]
+    return calls
+
+
+def warm_up(dtypes=("float64", "float32", "uint16")) -> float:
+    """
+    Compiles the kernels, or loads them from the cache, for the array types used by
+    the cameras. Returns the time needed in seconds.
+    """
+    t0 = time.perf_counter()
+    for dtype in dtypes:
+        for kernel, args in _warm_up_calls(dtype):
+            t = time.perf_counter()
+            kernel(*args)
+            logger.debug(
+                f"JIT {kernel.__name__}[{dtype}] ready after {time.perf_counter() - t:.2f} s"
+            )
+    total = time.perf_counter() - t0
+    logger.info(
+        f"JIT warm-up of signal kernels took {total:.2f} s, cache {numba.config.CACHE_DIR}"
+    )
+    return total
+
+
+def _launch_numba_threads():
+    """
+    The readings are made in worker threads. If the pool of the parallel kernels is
+    first started from one of those, the TBB layer blocks the interpreter at exit,
+    so it is started from the main thread by running a trivial parallel kernel.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    try:
+        _launch_kernel(np.zeros(numba.get_num_threads()))
+    except Exception as e:
+        logger.warning(f"Can't start the numba threading layer: {e}")
+
+
+def configure_jit():
+    """
+    Moves the kernel cache to `JIT_CACHE_DIR` and starts the numba threading layer,
+    when called from the main thread. Has to be called before the kernels are
+    used, e.g. by `start_warm_up` on startup. Only the first call has an effect.
+    """
+    global _jit_configured
+    if _jit_configured:
+        return
+    _jit_configured = True
+    if not os.environ.get("NUMBA_CACHE_DIR"):
+        try:
+            JIT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Can't use {JIT_CACHE_DIR} as numba cache: {e}")
+        else:
+            numba.config.CACHE_DIR = str(JIT_CACHE_DIR)
+            # the cache location is chosen when the caching is enabled
+            for kernel in _cached_kernels:
+                kernel.enable_caching()
+    _launch_numba_threads()
+
+
+def start_warm_up() -> threading.Thread:
+    """Runs `warm_up` once in a background thread, should be called on startup."""
+    global _warm_up_thread
+    configure_jit()
+    if _warm_up_thread is None:
+        _warm_up_thread = threading.Thread(target=warm_up, name="JIT warm-up", daemon=True)
+        _warm_up_thread.start()
+    return _warm_up_thread
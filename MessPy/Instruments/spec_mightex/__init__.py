@@ -8,7 +8,7 @@ from numpy import long
 import numpy as np
 
 from MessPy.Instruments.interfaces import ICam, T
-from MessPy.Instruments.signal_processing import Reading, Spectrum
+from MessPy.Instruments.signal_processing import Reading, Spectrum, fast_stats2d
 
 dll_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "x64", "MT_Spectrometer_SDK.dll")
 sdk = ctypes.WinDLL(dll_path)
@@ -126,9 +126,15 @@ class MightexSpectrometer(ICam):
             all_raw_data.append(raw_data)
 
         # Stack to (frames, 3648)
-        raw_data_stack = np.stack(all_raw_data, axis=0)
-
-        spec = Spectrum.create(raw_data_stack, name="Probe", frames=frames, first_frame=0)
+        raw_data_stack = np.stack(all_raw_data, axis=0, dtype=self.float_dtype)
+
+        spec = Spectrum.create(
+            raw_data_stack,
+            name="Probe",
+            frames=frames,
+            first_frame=0,
+            dtype=self.float_dtype,
+        )
 
         chop = np.zeros(frames, dtype=bool)
         chop[::2] = True
@@ -143,27 +149,21 @@ class MightexSpectrometer(ICam):
             raise ValueError(f"Expected ({self.shots}, 3648), got {data.shape}")
 
         a = data.T  # shape: (3648, shots)
-        b = a.copy()  # placeholder; in real use, would be another type of data
-        ratio = a / b  # shape: (3648, shots), all ones if a == b
+        rd = self.new_reading((3, self.channels, self.shots), lines=2, std_lines=3, sig_lines=2)
+        full_data = rd.full_data  # shape: (3, 3648, shots)
+        full_data[0] = a
+        full_data[1] = a  # placeholder; in real use, would be another type of data
+        np.divide(a, full_data[1], out=full_data[2])  # all ones if a == b
 
-        full_data = np.stack((a, b, ratio), axis=0)  # shape: (3, 3648, shots)
-
-        tm = full_data.mean(axis=2)  # shape: (3, 3648)
-        ts = 100 * full_data.std(axis=2) / tm  # shape: (3, 3648), % standard deviation
+        st = fast_stats2d(full_data.reshape(-1, self.shots)).reshape(3, -1, 4)
+        tm = st[..., 0]  # shape: (3, 3648)
+        rd.lines[:] = tm[:2, :]  # shape: (2, 3648)
+        np.divide(100 * st[..., 1], tm, out=rd.stds)  # shape: (3, 3648), % standard deviation
 
         with np.errstate(all="ignore"):
-            signal = np.mean(a, axis=1)  # shape: (3648,)
-            signal2 = np.zeros_like(signal)  # shape: (3648,)
-        signals = np.stack((signal, signal2))  # shape: (2, 3648)
-
-        return Reading(
-            lines=tm[:2, :],  # shape: (2, 3648)
-            stds=ts,  # shape: (3, 3648)
-            signals=signals,  # shape: (2, 3648)
-            valid=True,
-            full_data=full_data,  # shape: (3, 3648, shots)
-            shots=self.shots
-        )
+            np.mean(a, axis=1, out=rd.signals[0])  # shape: (3648,)
+            rd.signals[1] = 0  # shape: (3648,)
+        return rd
 
     #maybe switch over get_spectra() to read_cam()
     def read_cam(self):
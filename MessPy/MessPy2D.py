@@ -75,14 +75,14 @@ class MainWindow(QMainWindow):
             c.last_read
             self.xaxis[c] = c.wavelengths.copy()
 
-            obs = [lambda i=i, c=c: c.last_read.lines[i, :] for i in range(c.cam.lines)]
+            obs = [partial(c.copy_last, "lines", i) for i in range(c.cam.lines)]
             op = ObserverPlotWithControls(c.cam.line_names, obs, lf, x=c.disp_axis, plot_name="Readings")
             dw = QDockWidget("Readings")
             dw.setWidget(op)
             dock_wigdets.append(dw)
 
             obs = [
-                lambda i=i, c=c: c.last_read.stds[i, :] for i in range(c.cam.std_lines)
+                partial(c.copy_last, "stds", i) for i in range(c.cam.std_lines)
             ]
             op2 = ObserverPlotWithControls(c.cam.std_names, obs, lf, x=c.disp_axis, plot_name="Readings - stddev")
             op2.obs_plot.setYRange(0, 8)
@@ -90,10 +90,7 @@ class MainWindow(QMainWindow):
             dw.setWidget(op2)
             dock_wigdets.append(dw)
 
-            obs = [
-                lambda i=i, c=c: c.last_read.signals[i, :]
-                for i in range(c.cam.sig_lines)
-            ]
+            obs = [partial(c.copy_last, "signals", i) for i in range(c.cam.sig_lines)]
             op3 = ObserverPlotWithControls(c.cam.sig_names, obs, lf, x=c.disp_axis, plot_name="Signals")
             dw = QDockWidget("Pump-probe signal")
             dw.setWidget(op3)
@@ -138,6 +135,9 @@ class MainWindow(QMainWindow):
             ("test_plan", "ei.car", PumpProbeTasStarter)
         ]
 
+        if self.controller.delay_line._dl.has_velocity_control:
+            plans.append(("Fast Delay Scan", "fa5s.forward", FastDelayScanStarter))
+
         if self.controller.sample_holder is not None:
             plans.append(("Focus Scan", "fa5s.ruler-combined", FocusScanStarter))
             plans.append(("Signal Image", "fa5s.image", SignalImageStarter))
@@ -484,7 +484,9 @@ def start_app():
     import asyncio as aio
     import traceback
     from pyqtgraph import mkQApp
+    from MessPy.Instruments.signal_processing import start_warm_up
 
+    start_warm_up()
     app = mkQApp()
 
     app.setOrganizationName("USD")
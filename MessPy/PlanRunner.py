@@ -1,46 +1,104 @@
-from typing import ClassVar, Literal, Optional
+from typing import TYPE_CHECKING, ClassVar, Literal, Optional
 
-from attr import Factory, define
+from attr import define, field
 from loguru import logger
-from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
-from MessPy.Plans.PlanBase import Plan
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal, pyqtSlot
 
+if TYPE_CHECKING:
+    from MessPy.Plans.PlanBase import Plan
 
-@define
+
+@define(slots=False)
 class PlanRunner(QObject):
-    plan: Optional[Plan] = None
+    """
+    Runs the plans event driven. The steps of a generator plan are resumed from the
+    Qt event loop directly after the previous step. If a step waits on a future,
+    see `Plan.wait_for`, the plan is resumed by the done callback of the future
+    instead of polling it. Async plans run on the asyncio loop, here only their
+    task is watched.
+    """
+
+    plan: Optional["Plan"] = None
     state: Literal["running", "paused", "no_plan"] = "no_plan"
+    # Delay before resuming a step which did not wait on a future
+    idle_interval_ms: int = 10
+    # Steps scheduled for an older run are dropped, e.g. after a pause and resume
+    _run_id: int = field(init=False, default=0)
 
     sigPlanStopped: ClassVar[pyqtSignal] = pyqtSignal(bool)
     sigPlanStarted: ClassVar[pyqtSignal] = pyqtSignal(bool)
     sigPlanPaused: ClassVar[pyqtSignal] = pyqtSignal(bool)
+    sigStepDone: ClassVar[pyqtSignal] = pyqtSignal()
+    # Emitted with the run id to schedule a step, may be emitted from any thread
+    _sigWake: ClassVar[pyqtSignal] = pyqtSignal(int)
 
-    def __attr_post_init__(self):
-        super().__attr_post_init__()
+    def __attrs_post_init__(self):
+        super().__init__()
+        self._sigWake.connect(self._step, Qt.ConnectionType.QueuedConnection)
 
-    @pyqtSlot(plan)
-    def start_plan(self, plan: Plan):
+    @pyqtSlot(object)
+    def start_plan(self, plan: "Plan"):
         self.plan = plan
         self.state = "running"
         self.sigPlanStarted.emit(True)
-        if not plan.is_async:
-            pass
+        if plan.is_async:
+            plan.task.add_done_callback(self._task_done)
+        else:
+            self._schedule_step()
 
     @pyqtSlot()
     def pause_plan(self):
-        if self.plan:
+        if self.plan and self.state == "running":
             self.state = "paused"
             self.sigPlanPaused.emit(True)
 
     @pyqtSlot()
     def resume_plan(self):
-        if self.plan:
+        if self.plan and self.state == "paused":
             self.state = "running"
             self.sigPlanPaused.emit(False)
+            if not self.plan.is_async:
+                self._schedule_step()
 
     @pyqtSlot()
     def stop_plan(self):
         if self.plan:
+            self._run_id += 1
             self.plan.stop_plan()
+            self.plan = None
             self.sigPlanStopped.emit(True)
             self.state = "no_plan"
+
+    def _schedule_step(self):
+        self._run_id += 1
+        self._sigWake.emit(self._run_id)
+
+    @pyqtSlot(int)
+    def _step(self, run_id: int):
+        if run_id != self._run_id or self.state != "running" or self.plan is None:
+            return
+        plan = self.plan
+        try:
+            plan.make_step()
+        except StopIteration:
+            self.pause_plan()
+            return
+        except Exception as e:
+            logger.exception(f"Error in plan {plan.name}: {e}")
+            self.pause_plan()
+            return
+        self.sigStepDone.emit()
+        future = getattr(plan, "waiting_for", None)
+        if future is not None and future.done():
+            self._sigWake.emit(run_id)
+        elif future is not None:
+            future.add_done_callback(lambda _: self._sigWake.emit(run_id))
+        else:
+            QTimer.singleShot(self.idle_interval_ms, lambda: self._step(run_id))
+
+    def _task_done(self, task):
+        if task.cancelled() or self.plan is None or task is not self.plan.task:
+            return
+        if task.exception() is not None:
+            logger.error(f"Error in plan {self.plan.name}: {task.exception()}")
+        self.pause_plan()
@@ -209,9 +209,13 @@ class AOMTwoDStarter(PlanStartDialog):
             {"name": "Operator", "type": "str", "value": "Till"},
             {"name": "t1 (+)", "suffix": "ps", "type": "float", "value": -4},
             {"name": "t1 (step)", "suffix": "ps", "type": "float", "value": 0.1},
-            {"name": "Phase Cycles", "type": "list", "limits": [1, 2, 4], "value": 4},
+            {"name": "Phase Cycles", "type": "list", "limits": [1, 2, 3, 4, 6, 8], "value": 4},
             {"name": "Rot. Frame", "suffix": "cm-1", "type": "int", "value": 2000},
             {"name": "Rot. Frame Fixed", "suffix": "cm-1", "type": "int", "value": 0},
+            {"name": "Zoom Pump Axis", "type": "bool", "value": False},
+            {"name": "Pump Start", "suffix": "cm-1", "type": "float", "value": 1900},
+            {"name": "Pump Stop", "suffix": "cm-1", "type": "float", "value": 2200},
+            {"name": "Pump Points", "type": "int", "value": 151, "min": 2},
             dict(name="Pump Axis", type="str", readonly=True),
             {"name": "Mode", "type": "list", "limits": ["classic", "bragg"]},
             {"name": "AOM Amp.", "type": "float", "value": 0.3, "min": 0, "max": 0.6},
@@ -233,15 +237,24 @@ class AOMTwoDStarter(PlanStartDialog):
     def update_pump_axis(self, *args):
         try:
             ex = self.paras.child("Exp. Settings")
-            t1 = np.arange(0, ex["t1 (+)"], ex["t1 (step)"])
-            THz = np.fft.rfftfreq(t1.size * 2, d=t1[1] - t1[0])
-            freqs = THz2cm(THz) + ex["Rot. Frame"]
+            if ex["Zoom Pump Axis"]:
+                freqs = np.linspace(*self.pump_grid())
+            else:
+                t1 = np.arange(0, ex["t1 (+)"], ex["t1 (step)"])
+                THz = np.fft.rfftfreq(t1.size * 2, d=t1[1] - t1[0])
+                freqs = THz2cm(THz) + ex["Rot. Frame"]
             ex.child("Pump Axis").setValue(
                 f"{freqs.min():.2f} - {freqs.max():.2f} cm-1 step {freqs[1]-freqs[0]:.2f} cm-1"
             )
         except (ValueError, IndexError):
             pass
 
+    def pump_grid(self) -> tuple[float, float, int] | None:
+        ex = self.paras.child("Exp. Settings")
+        if not ex["Zoom Pump Axis"]:
+            return None
+        return ex["Pump Start"], ex["Pump Stop"], ex["Pump Points"]
+
     def create_plan(self, controller: Controller) -> AOMTwoDPlan:
         p = self.paras.child("Exp. Settings")
         s = self.paras.child("Sample")
@@ -262,6 +275,7 @@ class AOMTwoDStarter(PlanStartDialog):
             phase_frames=p["Phase Cycles"],
             mode=p["Mode"],
             repetitions=p["Repetitions"],
+            pump_grid=self.pump_grid(),
             save_frames_enabled=p["Save Frames"],
             save_ref=p["Save Ref. Frames"] and p["Save Frames"],
         )
@@ -1,7 +1,7 @@
 import functools
-import concurrent.futures
-import threading
 import json
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
 from numpy._typing import NDArray
 from datetime import datetime
@@ -9,6 +9,7 @@ from typing import (
     TYPE_CHECKING,
     Callable,
     ClassVar,
+    Deque,
     Dict,
     Generator,
     Literal,
@@ -23,9 +24,16 @@ from attr import attrib, attrs
 from PyQt5.QtCore import pyqtSignal
 from MessPy.ControlClasses import Controller
 from MessPy.Instruments.dac_px import AOM
-from MessPy.Instruments.signal_processing import THz2cm, cm2THz
+from MessPy.Instruments.signal_processing import (
+    PhaseCycle,
+    Reading2D,
+    RunningStats,
+    Spectrum,
+    cm2THz,
+    get_2d_transform,
+)
 
-from .PlanBase import Plan, ScanPlan
+from .PlanBase import H5Writer, Plan, ScanPlan
 
 
 h5py_ops = dict(
@@ -53,25 +61,53 @@ class AOMTwoDPlan(ScanPlan):
     mode: Literal["classic", "bragg"] = "bragg"
     rot_frame_freq: float = 0
     rot_frame2_freq: float = 0
-    phase_frames: Literal[1, 2, 4] = 4
+    phase_frames: int = 4
+    # Overrides the standard cycle given by phase_frames
+    phase_cycle: Optional[PhaseCycle] = None
     aom_amplitude: float = 0.3
     repetitions: int = 1
+    # (start, stop, n) in cm-1, if set only this pump grid is calculated
+    pump_grid: Optional[Tuple[float, float, int]] = None
 
     # Plan behavior
     initial_state: dict = attr.Factory(dict)
     do_stop: bool = False
     save_ref: bool = True
     save_frames_enabled: bool = False
+    # Points, whose processing may still be pending while the next one is measured
+    max_pending: int = 2
+
+    # Running mean and variance over the scans, by (line, "ifr" or "spec2d", t2 idx)
+    point_stats: Dict[Tuple[str, str, int], RunningStats] = attr.Factory(dict)
 
-    # Arrays to display
+    # Arrays to display, the means and variances of the last point
     disp_arrays: Dict[str, np.ndarray] = attr.Factory(dict)
     last_ir: Optional[np.ndarray] = None
     last_2d: Optional[Tuple[np.ndarray, np.ndarray]] = None
 
+    # Pipeline: the camera is read on the plan executor, demodulation and FFT run
+    # on the processor and the writer is the only user of the data file
+    writer: H5Writer = attrib(init=False)
+    _processor: ThreadPoolExecutor = attrib(init=False)
+    _pending: Deque[Future] = attrib(init=False, factory=deque)
+    _next_move: Optional[Future] = attrib(init=False, default=None)
+
     # Signals
     sigStepDone: ClassVar[pyqtSignal] = pyqtSignal()
     sigNewSpectra: ClassVar[pyqtSignal] = pyqtSignal(dict)
 
+    def __attrs_post_init__(self):
+        super(AOMTwoDPlan, self).__attrs_post_init__()
+        if self.phase_cycle is None:
+            self.phase_cycle = PhaseCycle.standard(self.phase_frames)
+        self.phase_frames = self.phase_cycle.n_frames
+        self.writer = H5Writer(
+            open_file=lambda: h5py.File(self.data_file_name, "a", track_order=True),
+            maxsize=2 * self.max_pending,
+            name="2D writer",
+        )
+        self._processor = ThreadPoolExecutor(1, thread_name_prefix="2D processing")
+
     @functools.cached_property
     def probe_freqs(self) -> np.ndarray:
         return self.controller.cam.wavenumbers
@@ -85,8 +121,15 @@ class AOMTwoDPlan(ScanPlan):
 
     @functools.cached_property
     def pump_freqs(self) -> np.ndarray:
-        THz = np.fft.rfftfreq(self.t1.size * 2, d=self.step_t1)
-        return THz2cm(THz) + self.rot_frame_freq
+        trans = get_2d_transform(
+            self.t1.size,
+            self.t1[1] - self.t1[0],
+            2,
+            np.hanning,
+            self.rot_frame_freq,
+            self.pump_grid,
+        )
+        return trans.freqs
 
     @functools.cached_property
     def data_file_name(self) -> Path:
@@ -97,6 +140,9 @@ class AOMTwoDPlan(ScanPlan):
             f["t1"] = self.t1
             f["t2"] = self.t2
             f["t1"].attrs["rot_frame"] = self.rot_frame_freq
+            f["pump_freqs"] = self.pump_freqs
+            f["phase_cycle"] = self.phase_cycle.phases
+            f["phase_cycle"].attrs["amps"] = self.phase_cycle.amps
             f["wn"] = self.controller.cam.wavenumbers
             f["wl"] = self.controller.cam.wavelengths
             grp = f.create_group("meta")
@@ -106,14 +152,18 @@ class AOMTwoDPlan(ScanPlan):
 
     def scan(self):
         c = self.controller
+        n = len(self.t2)
+        move = self._next_move or c.delay_line.submit_move(self.t2[0] * 1000)
         for self.t2_idx, self.cur_t2 in enumerate(self.t2):
-            c.delay_line.set_pos(self.cur_t2 * 1000, do_wait=False)
-            while c.delay_line.moving:
-                yield
-
-            yield from self.measure_point()
+            yield from self.wait_for(move)
+            spectra = yield from self.measure_point()
+            # The next delay, also the first of the next scan, is approached while
+            # the point is processed
+            move = c.delay_line.submit_move(self.t2[(self.t2_idx + 1) % n] * 1000)
+            yield from self.queue_processing(spectra)
             self.time_tracker.point_ending()
             self.sigStepDone.emit()
+        self._next_move = move
 
     def setup_plan(self) -> Generator:
         for k in "amp", "phase", "chopped", "phase_cycle", "do_dispersion_compensation":
@@ -128,7 +178,7 @@ class AOMTwoDPlan(ScanPlan):
             self.t1,
             cm2THz(self.rot_frame_freq),
             cm2THz(self.rot_frame2_freq),
-            self.phase_frames,
+            self.phase_cycle,
         )
 
         self.shaper.set_wave_amp(self.aom_amplitude)
@@ -137,31 +187,10 @@ class AOMTwoDPlan(ScanPlan):
         self.controller.cam.set_shots(
             self.repetitions * (self.t1.size * self.phase_frames)
         )
+        self.data_file_name  # creates the file before the writer opens it
         yield
 
-    def calculate_scan_means(self):        
-        with h5py.File(self.data_file_name, mode="a", track_order=True) as f:
-            f: h5py.File
-            for line in f["ifr_data"]:  # type: ignore
-                for t3_idx in f[f"ifr_data/{line}"]:  # type: ignore
-                    data = []
-                    specs = []
-                    for scan in f[f"ifr_data/{line}/{t3_idx}"]:  # type: ignore
-                        if scan == "mean":
-                            continue
-                        ifr = f"ifr_data/{line}/{t3_idx}/{scan}"
-                        data.append(f[ifr])
-                        spec = f"2d_data/{line}/{t3_idx}/{scan}"
-                        specs.append(f[spec])
-                    if "mean" in f[f"ifr_data/{line}/{t3_idx}/"]:  # type: ignore
-                        del f[f"ifr_data/{line}/{t3_idx}/mean"]
-                        del f[f"2d_data/{line}/{t3_idx}/mean"]
-                    f[f"ifr_data/{line}/{t3_idx}/mean"] = np.mean(data, 0)
-                    f[f"2d_data/{line}/{t3_idx}/mean"] = np.mean(specs, 0)
-
     def post_scan(self) -> Generator:
-        thr = threading.Thread(target=self.calculate_scan_means)
-        thr.start()
         self.save_meta()
         yield
 
@@ -171,90 +200,164 @@ class AOMTwoDPlan(ScanPlan):
         self.shaper.load_full_mask()
         self.shaper.generate_waveform()
         self.controller.cam.set_shots(self.initial_state["shots"])
+        pending = list(self._pending)
+        self._pending.clear()
+        wait(pending)
+        for future in pending:
+            if future.exception() is None:
+                self.show_means(future.result())
+        self.writer.close()
 
-    def measure_point(self):
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            self.time_tracker.point_starting()
-            future = executor.submit(
-                self.controller.cam.cam.make_2D_reading,
-                self.t1,
-                self.rot_frame_freq,
-                self.repetitions,
-                self.save_frames_enabled,
-            )
-
-        ret = future.result()
-        self.last_spectra = ret[1]
-        self.sigNewSpectra.emit(ret[1])
-        self.time_tracker.point_ending()
-        yield
-        thr = threading.Thread(
-            target=self.save_data,
-            args=(
-                ret[0],
-                self.t2_idx,
-                self.cur_scan,
+    def measure_point(self) -> Generator[None, None, Dict[str, Spectrum]]:
+        """Reads the camera, returns the spectra with the frame statistics."""
+        self.time_tracker.point_starting()
+        future = self.run_in_thread(
+            self.controller.cam.cam.get_2D_spectra, self.repetitions
+        )
+        yield from self.wait_for(future)
+        spectra = future.result()
+        self.last_spectra = spectra
+        self.sigNewSpectra.emit(spectra)
+        return spectra
+
+    def queue_processing(self, spectra: Dict[str, Spectrum]) -> Generator:
+        """
+        Hands the spectra of the current point to the processor. If `max_pending`
+        points are still processed, the plan waits for the oldest one, the writer
+        in turn stalls the processor. So a slow disk slows the plan down instead
+        of filling the memory.
+        """
+        while self._pending and self._pending[0].done():
+            self.show_means(self._pending.popleft().result())
+        while len(self._pending) >= self.max_pending:
+            oldest = self._pending.popleft()
+            yield from self.wait_for(oldest)
+            self.show_means(oldest.result())
+        future = self._processor.submit(
+            self.process_point, spectra, self.t2_idx, self.cur_scan, self.cur_t2
+        )
+        self._pending.append(future)
+
+    def process_point(
+        self, spectra: Dict[str, Spectrum], t2_idx: int, cur_scan: int, cur_t2: float
+    ) -> Dict[str, np.ndarray]:
+        """
+        Demodulates and transforms the spectra and queues the result for saving.
+        Returns the arrays to display, see `show_means`.
+        """
+        ret = self.controller.cam.cam.process_2D_spectra(
+            spectra,
+            self.t1,
+            self.rot_frame_freq,
+            self.save_frames_enabled,
+            self.pump_grid,
+            self.phase_cycle,
+        )
+        means, disp = self.update_means(ret, t2_idx)
+        self.writer.submit(
+            functools.partial(
+                self.save_data,
+                ret=ret,
+                means=means,
+                t2_idx=t2_idx,
+                cur_scan=cur_scan,
+                cur_t2=cur_t2,
             ),
+            droppable=False,
         )
-        thr.start()
+        return disp
+
+    def update_means(
+        self, ret: Dict[str, Reading2D], t2_idx: int
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Adds the interferograms and 2D spectra of a point to the running stats.
+        Returns the new means by their dataset name and the arrays to display.
+        Runs on the processor, so the displayed arrays are left to `show_means`.
+        """
+        means, disp = {}, {}
+        for line, data in ret.items():
+            if line == "Ref":
+                continue
+            for kind, group, arr in (
+                ("ifr", "ifr_data", data.interferogram),
+                ("spec2d", "2d_data", data.signal_2D),
+            ):
+                key = (line, kind, t2_idx)
+                stats = self.point_stats.setdefault(key, RunningStats())
+                stats.add_sample(arr)
+                mean = stats.masked_mean
+                means[f"{group}/{line}/{t2_idx}/mean"] = mean
+                disp[f"{line}_{kind}"] = mean
+                disp[f"{line}_{kind}_var"] = stats.var
+        return means, disp
 
-    def save_data(self, ret, t2_idx, cur_scan):
+    def show_means(self, disp: Dict[str, np.ndarray]):
+        """
+        Publishes the arrays of a processed point to the view. Called from the plan,
+        the dict is swapped instead of updated while the view may read it.
+        """
+        self.disp_arrays = {**self.disp_arrays, **disp}
+        self.last_ir = self.disp_arrays["Probe2_ifr"]
+        self.last_2d = (
+            self.disp_arrays["Probe1_spec2d"],
+            self.disp_arrays["Probe2_spec2d"],
+        )
+
+    def save_data(
+        self,
+        f: h5py.File,
+        ret: Dict[str, Reading2D],
+        means: Dict[str, np.ndarray],
+        t2_idx: int,
+        cur_scan: int,
+        cur_t2: float,
+    ):
         cur_date = datetime.now().isoformat()
-        with h5py.File(self.data_file_name, mode="a", track_order=True) as f:
-            data_ops = dict(
-                dtype="float64", scaleoffset=2, compression="gzip", compression_opts=3
-            )
-            for line, data in ret.items():
-                if line == "Ref":
-                    if self.save_ref:
-                        chunks = (1, data.frame_data.shape[1])
-                        ds = f.create_dataset(
-                            f"ref_data//{t2_idx}/{cur_scan}",
-                            data=data.frame_data,
-                            **data_ops,
-                            chunks=chunks,
-                        )
-                        ds.attrs['creation date'] = cur_date 
-                        ds.attrs["time"] = self.cur_t2
-                else:
+        data_ops = dict(
+            dtype="float64", scaleoffset=2, compression="gzip", compression_opts=3
+        )
+        for line, data in ret.items():
+            if line == "Ref":
+                if self.save_ref:
+                    chunks = (1, data.frame_data.shape[1])
                     ds = f.create_dataset(
-                        f"ifr_data/{line}/{t2_idx}/{cur_scan}",
-                        data=data.interferogram,
-                        dtype="float32",
+                        f"ref_data//{t2_idx}/{cur_scan}",
+                        data=data.frame_data,
+                        **data_ops,
+                        chunks=chunks,
                     )
-                    ds.attrs["time"] = self.cur_t2
                     ds.attrs['creation date'] = cur_date 
+                    ds.attrs["time"] = cur_t2
+            else:
+                ds = f.create_dataset(
+                    f"ifr_data/{line}/{t2_idx}/{cur_scan}",
+                    data=data.interferogram,
+                    dtype="float32",
+                )
+                ds.attrs["time"] = cur_t2
+                ds.attrs['creation date'] = cur_date 
+                ds = f.create_dataset(
+                    f"2d_data/{line}/{t2_idx}/{cur_scan}",
+                    data=data.signal_2D,
+                    dtype="float32",
+                )
+                ds.attrs["time"] = cur_t2
+                ds.attrs['creation date'] = cur_date 
+                if self.save_frames_enabled:
+                    chunks = (1, data.frames.shape[1])
                     ds = f.create_dataset(
-                        f"2d_data/{line}/{t2_idx}/{cur_scan}",
-                        data=data.signal_2D,
-                        dtype="float32",
+                        f"frames/{line}/{t2_idx}/{cur_scan}",
+                        data=data.frames,
+                        **data_ops,
+                        chunks=chunks,
                     )
-                    ds.attrs["time"] = self.cur_t2
                     ds.attrs['creation date'] = cur_date 
-                    if self.save_frames_enabled:
-                        chunks = (1, data.frames.shape[1])
-                        ds = f.create_dataset(
-                            f"frames/{line}/{t2_idx}/{cur_scan}",
-                            data=data.frames,
-                            **data_ops,
-                            chunks=chunks,
-                        )
-                        ds.attrs['creation date'] = cur_date 
-                    disp_2d = f.get(f"2d_data/{line}/{t2_idx}/mean", data.signal_2D)
-                    disp_ifr = f.get(
-                        f"ifr_data/{line}/{t2_idx}/mean", data.interferogram
-                    )
-                    # assert isinstance(disp_2d, h5py.Dataset)
-                    # assert isinstance(disp_ifr, h5py.Dataset)
-
-                    self.disp_arrays[line + "_spec2d"] = disp_2d[:]
-                    self.disp_arrays[line + "_ifr"] = disp_ifr[:]
-
-            self.last_2d = (
-                np.array(self.disp_arrays["Probe1_spec2d"]),
-                np.array(self.disp_arrays["Probe2_spec2d"]),
-            )
-            self.last_ir = np.array(disp_ifr)
+        for name, mean in means.items():
+            if name in f:
+                f[name][...] = mean
+            else:
+                f.create_dataset(name, data=mean, dtype="float32")
 
     def stop_plan(self):
         self.do_stop = True
@@ -1,4 +1,5 @@
 import pyqtgraph as pg
+import numpy as np
 import time
 from PyQt5.QtWidgets import (
     QWidget,
@@ -47,7 +48,13 @@ class AlignmentHelper(QWidget):
                 cb.toggled.connect(line.setVisible)
                 self.check_boxes.append(cb)
             self.graph_layouter.nextRow()
-        
+
+        self.accumulate_cb = QCheckBox("Accumulate Std")
+        self.accumulate_cb.setToolTip("Show the std of all shots since the box was checked")
+        for cam in controller.cam_list:
+            self.accumulate_cb.toggled.connect(cam.accumulate_stats)
+        self.check_boxes.append(self.accumulate_cb)
+
         self.setLayout(qh.hlay([self.graph_layouter,
                                 qh.vlay(self.check_boxes, add_stretch=True)]))
         controller.loop_finished.connect(self.update_plots)
@@ -64,13 +71,20 @@ class AlignmentHelper(QWidget):
             do_pop = False
 
         for (cam, line), (p, data) in self.amp_lines.items():
-            data.append(cam.last_read.lines[line].mean())
+            # the pooled reading could be refilled by the camera meanwhile
+            with cam.hold_last_read() as rd:
+                data.append(rd.lines[line].mean())
             if do_pop:
                 data.pop(0)
             p.setData(self.times, data)
 
         for (cam, line), (p, data) in self.std_lines.items():
-            data.append(cam.last_read.stds[line].mean())
+            rs = cam.running_stats
+            if rs is not None and rs.mean is not None and line < rs.mean.shape[0]:
+                data.append(np.nanmean(100 * rs.std[line] / rs.mean[line]))
+            else:
+                with cam.hold_last_read() as rd:
+                    data.append(rd.stds[line].mean())
             if do_pop:
                 data.pop(0)
             p.setData(self.times, data)
@@ -0,0 +1,168 @@
+import time
+import typing as T
+
+import attr
+import h5py
+import numpy as np
+from loguru import logger
+from PyQt5.QtCore import pyqtSignal
+
+from MessPy.ControlClasses import Controller
+from MessPy.Instruments.interfaces import fs_to_mm
+
+from .PlanBase import H5Writer, Plan
+from .shot_binning import (
+    PositionLog,
+    bin_edges,
+    bin_shots,
+    binned_signal,
+    select_spectrum,
+    shot_times,
+)
+
+
+@attr.s(auto_attribs=True, cmp=False, kw_only=True)
+class FastDelayScan(Plan):
+    """
+    Pump-probe scans with a continuously moving delay line. The stage sweeps over
+    `t_list` (ps) with a constant `velocity` (ps/s) while the camera is read.
+    Every shot is tagged with the delay interpolated from the polled stage
+    positions at its time and the shots are binned onto `t_list` afterwards.
+    The sweeps alternate their direction.
+    """
+
+    controller: Controller
+    t_list: np.ndarray
+    velocity: float = 1.0
+    shots: int = 200
+    # Spectrum of the camera, whose shots are binned, by default the first one
+    spectrum: T.Optional[str] = None
+    # The stage starts and stops this far outside of the grid, in ps
+    margin: float = 0.2
+    sweeps: int = 0
+    plan_shorthand: T.ClassVar[str] = "FastScan"
+
+    edges: np.ndarray = attr.ib(init=False)
+    # Summed shots and number of shots of all sweeps, see `bin_shots`
+    sums: T.Optional[np.ndarray] = attr.ib(init=False, default=None)
+    counts: T.Optional[np.ndarray] = attr.ib(init=False, default=None)
+    # pump-probe signal on `t_list` of all sweeps and of the last one, (t, pixel)
+    signal: T.Optional[np.ndarray] = attr.ib(init=False, default=None)
+    last_signal: T.Optional[np.ndarray] = attr.ib(init=False, default=None)
+    writer: H5Writer = attr.ib(init=False)
+
+    sigStepDone: T.ClassVar[pyqtSignal] = pyqtSignal()
+    sigSweepDone: T.ClassVar[pyqtSignal] = pyqtSignal()
+
+    def __attrs_post_init__(self):
+        super().__attrs_post_init__()
+        self.t_list = np.sort(np.asarray(self.t_list, dtype=float))
+        self.edges = bin_edges(self.t_list)
+        self.cam = self.controller.cam
+        self.dl = self.controller.delay_line._dl
+        if not self.dl.has_velocity_control:
+            raise NotImplementedError(f"{self.dl.name} has no velocity control")
+        self.log = PositionLog(self.dl.get_pos_fs)
+        self.pre_state = dict(shots=self.cam.shots)
+        self.writer = H5Writer(open_file=self._create_file, name=f"{self.name} writer")
+        gen = self.make_step_gen()
+        self.make_step = lambda: next(gen)
+
+    def _create_file(self) -> h5py.File:
+        f = h5py.File(self.get_file_name()[0], "w", libver="latest")
+        n_pix = self.sums.shape[2]
+        f.create_dataset("t", data=self.t_list)
+        f.create_dataset("wl", data=self.cam.wavelengths)
+        for name in ("sweeps", "counts"):
+            n_t = len(self.t_list)
+            shape = (n_t, n_pix) if name == "sweeps" else (2, n_t)
+            f.create_dataset(
+                name,
+                shape=(0, *shape),
+                maxshape=(None, *shape),
+                chunks=(1, *shape),
+                dtype="f8",
+            )
+        f.create_dataset(
+            "signal", shape=(len(self.t_list), n_pix), dtype="f8", fillvalue=np.nan
+        )
+        f.swmr_mode = True
+        return f
+
+    def read_tagged(self) -> T.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Reads the camera, returns the delays in ps, data and chopper of the shots."""
+        cam = self.cam.cam
+        t_start = time.perf_counter()
+        spectra, chopper = cam.get_spectra(None)
+        t_end = time.perf_counter()
+        data = select_spectrum(spectra, self.spectrum, cam.name).data
+        times = shot_times(t_start, t_end, data.shape[1], cam.rep_rate)
+        return self.log.pos_at(times) / 1000, data, cam.get_chopper(chopper)
+
+    def sweep(self, start: float, end: float) -> T.Generator:
+        yield from self.wait_for(self.controller.delay_line.submit_move(start * 1000))
+        self.dl.set_velocity(fs_to_mm(self.velocity * 1000) / self.dl.beam_passes)
+        self.log.start()
+        sums, counts = 0, 0
+        try:
+            with self.log.lock:
+                self.dl.move_fs(end * 1000, do_wait=False)
+            moving = True
+            while moving:
+                with self.log.lock:
+                    moving = self.dl.is_moving()
+                read = self.run_in_thread(self.read_tagged)
+                yield from self.wait_for(read)
+                s, c = bin_shots(*read.result(), self.edges)
+                sums, counts = sums + s, counts + c
+                self.last_signal = binned_signal(sums, counts)
+                self.sigStepDone.emit()
+        finally:
+            self.log.stop()
+            self.dl.set_velocity(None)
+        delay_line = self.controller.delay_line
+        delay_line.pos = self.log.positions[-1]
+        delay_line.sigPosChanged.emit(delay_line.pos)
+        return sums, counts
+
+    def make_step_gen(self):
+        self.cam.set_shots(self.shots)
+        while True:
+            lo, hi = self.t_list[0] - self.margin, self.t_list[-1] + self.margin
+            start, end = (lo, hi) if self.sweeps % 2 == 0 else (hi, lo)
+            t0 = time.perf_counter()
+            sums, counts = yield from self.sweep(start, end)
+            if self.sums is None:
+                self.sums, self.counts = sums, counts
+            else:
+                self.sums += sums
+                self.counts += counts
+            self.signal = binned_signal(self.sums, self.counts)
+            self.sweeps += 1
+            logger.info(
+                f"Sweep {self.sweeps} took {time.perf_counter() - t0:.2f} s, "
+                f"{counts.sum():.0f} shots binned"
+            )
+            self.save(self.last_signal, counts)
+            self.sigSweepDone.emit()
+            yield
+
+    def save(self, sweep_signal: np.ndarray, counts: np.ndarray):
+        self.save_meta()
+        signal = self.signal.copy()
+
+        def write(f: h5py.File):
+            n = f["sweeps"].shape[0]
+            for name, value in (("sweeps", sweep_signal), ("counts", counts)):
+                f[name].resize(n + 1, axis=0)
+                f[name][n] = value
+            f["signal"][...] = signal
+            f.flush()
+
+        self.writer.submit(write, droppable=False)
+
+    def restore_state(self):
+        super().restore_state()
+        self.writer.close()
+        self.dl.set_velocity(None)
+        self.cam.set_shots(self.pre_state["shots"])
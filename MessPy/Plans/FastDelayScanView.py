@@ -0,0 +1,99 @@
+import numpy as np
+import pyqtgraph.parametertree as pt
+from PyQt5.QtWidgets import QLabel, QWidget
+
+from MessPy.ControlClasses import Controller
+from MessPy.QtHelpers import ObserverPlot, PlanStartDialog, make_entry, vlay
+
+from .FastDelayScan import FastDelayScan
+from .PlanBase import sample_parameters
+
+
+class FastDelayScanView(QWidget):
+    def __init__(self, fast_plan: FastDelayScan, *args, **kwargs):
+        super(FastDelayScanView, self).__init__(*args, **kwargs)
+        self.plan = fast_plan
+        self.pixel = fast_plan.cam.channels // 2
+
+        def last_sweep():
+            if fast_plan.last_signal is None:
+                return np.full(fast_plan.t_list.size, np.nan)
+            return fast_plan.last_signal[:, self.pixel]
+
+        def mean():
+            if fast_plan.signal is None:
+                return np.full(fast_plan.t_list.size, np.nan)
+            return fast_plan.signal[:, self.pixel]
+
+        def spectrum():
+            if fast_plan.signal is None:
+                return np.full(fast_plan.cam.channels, np.nan)
+            return np.nanmean(fast_plan.signal[fast_plan.t_list > 0], 0)
+
+        self.trans_plot = ObserverPlot(
+            obs=[last_sweep, mean],
+            signal=fast_plan.sigStepDone,
+            x=fast_plan.t_list,
+        )
+        self.trans_plot.plotItem.setLabel("bottom", "Delay / ps")
+        self.trans_plot.plotItem.setLabel("left", "Signal / mOD")
+        self.spec_plot = ObserverPlot(
+            obs=[spectrum],
+            signal=fast_plan.sigSweepDone,
+            x=fast_plan.cam.disp_axis,
+        )
+        self.spec_plot.plotItem.setLabel("left", "Mean signal (t > 0) / mOD")
+        self.info = QLabel()
+        fast_plan.sigSweepDone.connect(self.update_info)
+        self.setLayout(vlay([self.trans_plot, self.spec_plot, self.info]))
+
+    def update_info(self):
+        plan = self.plan
+        self.info.setText(
+            f"Sweeps: {plan.sweeps}, shots per delay: {plan.counts.sum(0).mean():.0f}"
+        )
+
+
+class FastDelayScanStarter(PlanStartDialog):
+    experiment_type = "FastScan"
+    viewer = FastDelayScanView
+    title = "Fast Delay Scan"
+
+    def setup_paras(self):
+        tmp = [
+            {"name": "Filename", "type": "str", "value": "temp"},
+            {
+                "name": "Shots",
+                "type": "int",
+                "max": 4000,
+                "step": 50,
+                "value": 100,
+            },
+            {"name": "Min. Delay (ps)", "type": "float", "value": -1.0},
+            {"name": "Max. Delay (ps)", "type": "float", "value": 10.0},
+            {"name": "Step (ps)", "type": "float", "min": 0.001, "value": 0.1},
+            {"name": "Velocity (ps/s)", "type": "float", "min": 0.001, "value": 1.0},
+        ]
+        p = pt.Parameter(name="Exp. Settings", type="group", children=tmp)
+        params = [sample_parameters, p]
+        self.paras = pt.Parameter.create(
+            name="Fast Delay Scan", type="group", children=params
+        )
+        self.paras.getValues()
+        self.save_defaults()
+
+    def create_plan(self, controller: Controller):
+        p = self.paras.child("Exp. Settings")
+        t_list = np.arange(
+            p["Min. Delay (ps)"], p["Max. Delay (ps)"] + 1e-6, p["Step (ps)"]
+        )
+        plan = FastDelayScan(
+            name=p["Filename"],
+            meta=make_entry(self.paras),
+            controller=controller,
+            t_list=t_list,
+            velocity=p["Velocity (ps/s)"],
+            shots=p["Shots"],
+        )
+        self.save_defaults()
+        return plan
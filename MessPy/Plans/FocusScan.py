@@ -1,10 +1,10 @@
-import threading
 import typing as T
 
 import attr
 import numpy as np
 import scipy.optimize as opt
 import scipy.special as spec
+from loguru import logger
 from PyQt5.QtCore import pyqtSignal
 from MessPy.ControlClasses import Cam
 from MessPy.Instruments.interfaces import ILissajousScanner, IPowerMeter
@@ -15,6 +15,21 @@ def gauss_int(x, x0, amp, back, w):
     return 0.5 * amp * (1 + spec.erf(np.sqrt(2) * (x - x0) / w)) + back
 
 
+def gauss_int_jac(x, x0, amp, back, w):
+    """Derivatives of `gauss_int` by x0, amp, back and w, shape (x, 4)."""
+    u = np.sqrt(2) * (np.asarray(x) - x0) / w
+    peak = amp / np.sqrt(np.pi) * np.exp(-(u**2))
+    return np.stack(
+        (
+            -peak * np.sqrt(2) / w,
+            0.5 * (1 + spec.erf(u)),
+            np.ones_like(u),
+            -peak * u / w,
+        ),
+        axis=-1,
+    )
+
+
 @attr.dataclass
 class FitResult:
     name: str
@@ -23,6 +38,9 @@ class FitResult:
     pos: np.ndarray
     data: np.ndarray
     model: np.ndarray
+    # Covariance of the params and the variance of the residuals
+    cov: T.Optional[np.ndarray] = None
+    noise_var: float = np.nan
 
     def make_text(self):
         text = "%s\nBeamwaist: %2.3f mm \n 1/e: %2.3f mm \nFWHM %2.3f mm\nPOS %2.2f" % (
@@ -49,7 +67,11 @@ class FitResult:
 
         res = opt.least_squares(helper, x0)
         fit = gauss_int(pos, *res.x)
-        print(res.x)
+        noise_var = 2 * res.cost / max(len(pos) - len(res.x), 1)
+        try:
+            cov = np.linalg.inv(res.jac.T @ res.jac) * noise_var
+        except np.linalg.LinAlgError:
+            cov = np.full((len(res.x), len(res.x)), np.nan)
         return cls(
             success=res.status > 0,
             params=res.x,
@@ -57,6 +79,8 @@ class FitResult:
             name=name,
             data=val,
             pos=pos,
+            cov=cov,
+            noise_var=noise_var,
         )
 
 
@@ -73,6 +97,13 @@ class Scan:
     full: list[np.ndarray] = attr.Factory(list)
     min_step: float = 0.005
     max_diff: float = 0.1
+    # Std. error of the fitted width relative to the width, at which the model
+    # based scan stops. None scans the grid of `step` and fills the holes instead.
+    width_rtol: T.Optional[float] = None
+    n_init: int = 5
+    min_points: int = 10
+    max_points: int = 40
+    width_err: float = np.inf
 
     def analyze(self):
         fit_probe = FitResult.fit_curve(self.pos, self.probe, f"{self.axis} probe")
@@ -84,12 +115,62 @@ class Scan:
         return fit_probe, fit_ref, fit_extra
 
     def scan(self, mover, reader):
+        if self.width_rtol is not None:
+            yield from self.scan_model(mover, reader)
+            return
         sign = np.sign(self.end - self.start)
         for x0 in np.arange(self.start, self.end, sign * self.step):
             yield from self.check_point(x0, reader, mover)
         while x0 := self.check_for_holes():
             yield from self.check_point(x0, reader, mover)
 
+    def scan_model(self, mover, reader):
+        """
+        Measures `n_init` points, then fits `gauss_int` to the probe after every
+        point and measures next where the variances of x0 and the width drop the
+        most. Stops when the relative std. error of the width is below
+        `width_rtol`. While the fit fails, the holes of the edge and then the
+        largest gaps are measured, up to `min_points`.
+        """
+        for x0 in np.linspace(self.start, self.end, self.n_init):
+            yield from self.check_point(x0, reader, mover)
+        while len(self.pos) < self.max_points:
+            x0 = self.next_model_point()
+            if x0 is None:
+                break
+            yield from self.check_point(x0, reader, mover)
+
+    def next_model_point(self) -> T.Optional[float]:
+        """The next knife position of `scan_model`, None if the scan is done."""
+        pos, probe = self.get_data()[:2]
+        lo, hi = sorted((self.start, self.end))
+        candidates = np.arange(lo, hi + self.min_step / 2, self.min_step)
+        dist = np.abs(candidates[:, None] - pos[None, :]).min(1)
+        unmeasured = dist > self.min_step / 2
+        candidates, dist = candidates[unmeasured], dist[unmeasured]
+        fit = FitResult.fit_curve(pos, probe, self.axis)
+        if not (fit.success and np.isfinite(fit.cov).all()):
+            # the model does not describe the data yet, e.g. the edge is missing
+            hole = self.check_for_holes()
+            if hole is not False:
+                return hole
+            if len(pos) >= self.min_points or candidates.size == 0:
+                logger.warning(f"{self.axis} scan: the knife-edge fit failed")
+                return None
+            # fills the largest gap between the measured points
+            return candidates[np.argmax(dist)]
+        self.width_err = np.sqrt(fit.cov[3, 3])
+        rel_err = self.width_err / abs(fit.params[3])
+        done = len(pos) >= self.min_points and rel_err < self.width_rtol
+        if done or candidates.size == 0:
+            return None
+        # the variance of a parameter drops by (C g)^2 / (s^2 + g^T C g) after a
+        # measurement with the gradient g of the model, C being the covariance
+        g = gauss_int_jac(candidates, *fit.params)
+        cg = g @ fit.cov
+        gain = (cg[:, [0, 3]] ** 2).sum(1) / (fit.noise_var + (cg * g).sum(1))
+        return candidates[np.argmax(gain)]
+
     def check_point(self, x, reader, mover):
         yield from mover(x)
         for data, lines, pw in reader():
@@ -117,8 +198,8 @@ class Scan:
     def check_for_holes(self):
         x, y, y3 = self.get_data()[:3]
         xd = np.diff(x)
-        yd = np.diff(y) / y.ptp()
-        yd3 = np.diff(y3) / y3.ptp()
+        yd = np.diff(y) / np.ptp(y)
+        yd3 = np.diff(y3) / np.ptp(y3)
         i = (np.abs(yd) > self.max_diff) & (xd > self.min_step)
         i2 = (np.abs(yd3) > self.max_diff) & (xd > self.min_step)
         i = np.logical_or(i, i2)
@@ -145,6 +226,9 @@ class FocusScan(Plan):
     adaptive: bool = True
     max_rel_change: float = 0.1
     min_step: float = 0.005
+    # Target relative std. error of the width for the model based scans, see
+    # `Scan.scan_model`. None scans the grid of the parameters.
+    width_rtol: T.Optional[float] = 0.02
     shots: int = 100
     sigStepDone: T.ClassVar[pyqtSignal] = pyqtSignal()
     sigFitDone: T.ClassVar[pyqtSignal] = pyqtSignal(int)
@@ -181,6 +265,7 @@ class FocusScan(Plan):
             step=parameters[2],
             max_diff=self.max_rel_change if self.adaptive else 100,
             min_step=self.min_step,
+            width_rtol=self.width_rtol,
         )
 
     def make_scan_gen(self):
@@ -218,15 +303,13 @@ class FocusScan(Plan):
         yield
 
     def reader(self):
-        t = threading.Thread(target=self.cam.read_cam)
-        t.start()
+        read = self.cam.submit_read()
         if self.power_meter is not None:
             f = self.power_meter.read_power()
         else:
             f = None
-        while t.is_alive():
-            yield False, None, None
-        yield self.cam.last_read.lines.mean(1), self.cam.last_read.lines, f
+        yield from self.wait_for(read, busy=(False, None, None))
+        yield self.cam.last_read.lines.mean(1), self.cam.last_read.lines.copy(), f
 
     def save(self):
         name = self.get_file_name()[0]
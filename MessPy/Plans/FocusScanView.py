@@ -141,6 +141,7 @@ class FocusScanStarter(PlanStartDialog):
             {"name": "Adaptive", "type": "bool", "value": True},
             {"name": "Max rel. change", "type": "float", "value": 0.05, "step": 0.01},
             {"name": "Min step", "type": "float", "value": 0.01, "step": 0.01},
+            {"name": "Model width rtol (0 = grid)", "type": "float", "value": 0.02},
         ]
 
         self.candidate_cams = {c.cam.name: c for c in self.controller.cam_list}
@@ -183,6 +184,7 @@ class FocusScanStarter(PlanStartDialog):
             adaptive=p["Adaptive"],
             max_rel_change=p["Max rel. change"],
             min_step=p["Min step"],
+            width_rtol=p["Model width rtol (0 = grid)"] or None,
             z_points=z_points,
             fh=controller.sample_holder,
             power_meter=power,
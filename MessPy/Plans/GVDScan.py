@@ -1,5 +1,4 @@
 import os.path
-import threading
 import time
 import typing as T
 from pathlib import Path
@@ -60,14 +59,8 @@ class GVDScan(Plan):
             # d = {self.scan_mode: value}
             setattr(self.aom, self.scan_mode.lower(), value * 1000)
             self.aom.update_dispersion_compensation()
-            t = threading.Thread(target=time.sleep, args=(self.waiting_time,))
-            t.start()
-            while t.is_alive():
-                yield
-            t = threading.Thread(target=self.cam.read_cam)
-            t.start()
-            while t.is_alive():
-                yield
+            yield from self.wait_for(self.run_in_thread(time.sleep, self.waiting_time))
+            yield from self.wait_for(self.cam.submit_read())
 
             assert self.cam.last_read is not None
             probe = self.cam.last_read.lines[0, :]
@@ -17,12 +17,17 @@ from MessPy.Instruments.interfaces import (
     TargetThread,
     Reading,
 )
+from MessPy.Instruments.signal_processing import RunningStats
 
-from .PlanBase import ScanPlan
+from .PlanBase import H5Writer, ScanPlan
+
+# Arrays of a reading, which are saved per point
+SAVED_ARRAYS = ("signals", "stds", "lines", "full_data")
 
 
 @attrs(kw_only=True, auto_attribs=True)
 class NewPumpProbePlan(ScanPlan):
+    plan_shorthand: ClassVar[str] = "NewPumpProbe"
     shots: int
     t_points: NDArray[np.float64]
     cam: ICam
@@ -40,8 +45,20 @@ class NewPumpProbePlan(ScanPlan):
 
     center_wavelengths: NDArray[np.float64] = np.array([0.0])
     reader_thread: Optional[QThread] = None
+    # Running mean of the signals over the scans, one per center wavelength
+    scan_stats: list[RunningStats] = field(init=False)
+    mean_signal: NDArray[np.float64] = field(init=False)
+    writer: H5Writer = field(init=False)
     sigStepDone: ClassVar[pyqtSignal] = pyqtSignal()
 
+    def __attrs_post_init__(self):
+        super().__attrs_post_init__()
+        self.scan_stats = [RunningStats() for _ in self.center_wavelengths]
+        self.writer = H5Writer(
+            open_file=lambda: h5py.File(self.get_file_name()[0], "a"),
+            name="pump-probe writer",
+        )
+
     @cached_property
     def wl_cycle(self) -> cycle:
         return cycle(self.center_wavelengths)
@@ -71,8 +88,11 @@ class NewPumpProbePlan(ScanPlan):
             self.shutter_pump.close()
         if self.rot_stage and self.rot_angles:
             yield from self.move_rot_stage(self.rot_angles[self.rot_idx])
-        self.cur_scan_data = np.zeros(
-            (len(self.t_points), self.cam.channels, self.cam.lines)
+        self.cur_scan_data = np.full(
+            (len(self.t_points), self.cam.sig_lines, self.cam.channels), np.nan
+        )
+        self.mean_signal = np.full(
+            (len(self.center_wavelengths), *self.cur_scan_data.shape), np.nan
         )
 
     def pre_scan(self) -> Generator:
@@ -102,28 +122,55 @@ class NewPumpProbePlan(ScanPlan):
         self.save_point(reading)
 
     def save_point(self, reading: Reading):
-        fpath = self.get_file_name()[0]
-        cur_h5_path = f"/{self.cur_scan}/{self.cur_wl_idx}/{self.cur_t_idx}/"
-        with h5py.File(fpath, "a") as f:
-            f.create_dataset(cur_h5_path + "signal", data=reading.signals)
-            f.create_dataset(cur_h5_path + "std", data=reading.stds)
-            f.create_dataset(cur_h5_path + "lines", data=reading.lines)
-            f.create_dataset(cur_h5_path + "full_data", data=reading.full_data)
+        """
+        Queues the point for writing. The arrays of all points are stored in
+        datasets of the shape (scan, wl, t, ...), which are created with the first
+        point and grow by one scan when a new scan starts. Points not measured are
+        nan for float arrays and 0 otherwise.
+        """
         self.cur_scan_data[self.cur_t_idx] = reading.signals
+        idx = (self.cur_scan, self.cur_wl_idx, self.cur_t_idx)
+        shape = (len(self.center_wavelengths), len(self.t_points))
+
+        def write(f: h5py.File):
+            try:
+                for name in SAVED_ARRAYS:
+                    arr = getattr(reading, name)
+                    if name not in f:
+                        f.create_dataset(
+                            name,
+                            shape=(0, *shape, *arr.shape),
+                            maxshape=(None, *shape, *arr.shape),
+                            chunks=(1, 1, 1, *arr.shape),
+                            dtype=arr.dtype,
+                            fillvalue=np.nan if arr.dtype.kind == "f" else 0,
+                        )
+                    ds = f[name]
+                    if ds.shape[0] <= idx[0]:
+                        ds.resize(idx[0] + 1, axis=0)
+                    ds[idx] = arr
+            finally:
+                self.cam.reading_pool.release(reading)
+
+        self.writer.submit(write, droppable=False)
 
     def post_scan(self) -> Generator:
-        # create mean signals from h5 file over all scans
-        fpath = self.get_file_name()[0]
-        with h5py.File(fpath, "a") as f:
-            for t_idx in range(len(self.t_points)):
-                for scan_idx in range(self.cur_scan):
-                    signal = f[f"{scan_idx}/{self.cur_wl_idx}/{t_idx}/signal"]
-                    if scan_idx == 0:
-                        mean_signal = np.array(signal)
-                    else:
-                        mean_signal += signal  # type: ignore
-                mean_signal /= self.cur_scan
-                f.create_dataset(
-                    f"mean_signal/{self.cur_wl_idx}/{t_idx}", data=mean_signal
-                )
+        """Adds the scan to the running mean, only the mean of its wl is written."""
+        stats = self.scan_stats[self.cur_wl_idx]
+        stats.add_sample(self.cur_scan_data)
+        mean = stats.masked_mean
+        self.mean_signal[self.cur_wl_idx] = mean
+        wl_idx, shape = self.cur_wl_idx, self.mean_signal.shape
+
+        def write(f: h5py.File):
+            if "mean_signal" not in f:
+                f.create_dataset("mean_signal", shape, dtype="f8", fillvalue=np.nan)
+            f["mean_signal"][wl_idx] = mean
+
+        self.writer.submit(write, droppable=False)
+        self.cur_scan_data = np.full_like(self.cur_scan_data, np.nan)
         yield
+
+    def restore_state(self):
+        super().restore_state()
+        self.writer.close()
@@ -4,18 +4,24 @@ import json
 import time
 import threading
 from asyncio import Task
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import ClassVar, Tuple, Optional, Callable, Generator, Any
+from typing import ClassVar, Tuple, Optional, Callable, Generator, Any, Union, Literal
 
 import h5py
 import attr
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QThread
 from numpy import ndarray
 
+from loguru import logger
+
 from MessPy.Config import config
 from MessPy.Instruments.interfaces import IDevice
 
+# Shared by the plans for blocking calls, see `Plan.run_in_thread`
+plan_executor = ThreadPoolExecutor(thread_name_prefix="plan")
+
 sample_parameters = {
     "name": "Sample",
     "type": "group",
@@ -41,6 +47,8 @@ class TimeTracker(QObject):
     point_start_time: float = 0
     point_end_time: Optional[float] = None
     point_duration: Optional[float] = None
+    # Duration of the phases of the last point, e.g. move, read and processing
+    point_phases: dict = attr.Factory(dict)
 
     sigTimesUpdated: ClassVar[pyqtSignal] = pyqtSignal(str)
 
@@ -76,6 +84,10 @@ class TimeTracker(QObject):
         self.point_duration = self.point_end_time - self.point_start_time
         self.as_string()
 
+    def record_phases(self, **durations: float):
+        """Records the durations of the phases of the last point in seconds."""
+        self.point_phases = durations
+
     def as_string(self) -> str:
         """Format time information as a string."""
         s = f"""
@@ -84,6 +96,10 @@ class TimeTracker(QObject):
         """
         if self.point_duration:
             s += f"Time per Point: {timedelta(seconds=self.point_duration)}<br>"
+        if self.point_phases:
+            phases = self.point_phases.items()
+            s += ", ".join(f"{k}: {1000 * v:.0f} ms" for k, v in phases)
+            s += "<br>"
         if self.scan_duration:
             s += f"Time per Scan: {timedelta(seconds=self.scan_duration)}<br>"
         self.sigTimesUpdated.emit(s)
@@ -101,6 +117,8 @@ class Plan(QObject):
     is_async: bool = False
     time_tracker: TimeTracker = attr.Factory(TimeTracker)
     file_name: Tuple[Path, Path] | None = None
+    # Future the current step waits on, the PlanRunner resumes the plan when it is done
+    waiting_for: Union[Future, asyncio.Future, None] = attr.ib(init=False, default=None)
 
     sigPlanFinished: ClassVar[pyqtSignal] = pyqtSignal()
     sigPlanStarted: ClassVar[pyqtSignal] = pyqtSignal()
@@ -108,7 +126,9 @@ class Plan(QObject):
 
     def __attrs_post_init__(self):
         super(Plan, self).__init__()
-        self.get_file_name()  # check if name is valid
+        # checks if the name is valid, the names are fixed, since the check for an
+        # existing metafile would change them after the first save
+        self.file_name = self.get_file_name()
 
     def get_file_name(self) -> Tuple[Path, Path]:
         """Builds the filename and the metafilename"""
@@ -153,6 +173,26 @@ class Plan(QObject):
     def restore_state(self):
         pass
 
+    def run_in_thread(self, fn: Callable, *args, **kwargs) -> Future:
+        """Runs a blocking call, e.g. a move or a read, on the plan executor."""
+        return plan_executor.submit(fn, *args, **kwargs)
+
+    def wait_for(self, *futures: Future, busy: Any = None) -> Generator:
+        """
+        Yields `busy` until all futures are done and reraises their exceptions. Used
+        as `yield from self.wait_for(...)`, the PlanRunner then resumes the plan from
+        the done callbacks of the futures instead of polling them.
+        """
+        try:
+            for future in futures:
+                self.waiting_for = future
+                while not future.done():
+                    yield busy
+        finally:
+            self.waiting_for = None
+        for future in futures:
+            future.result()
+
     @pyqtSlot()
     def stop_plan(self):
         self.restore_state()
@@ -173,6 +213,68 @@ class H5PySaver:
                 f.create_dataset(k, data=v)
 
 
+@attr.s(auto_attribs=True, kw_only=True)
+class H5Writer:
+    """
+    Writes to a hdf5 file from a background thread. Jobs are functions called with
+    the open file, they run in order on a single thread, which is the only one
+    using the file. At most `maxsize` jobs are pending. With the policy "stall",
+    `submit` then blocks until a job is done, with "drop" the new job is dropped
+    and counted in `dropped`.
+    """
+
+    open_file: Callable[[], h5py.File]
+    maxsize: int = 16
+    policy: Literal["stall", "drop"] = "stall"
+    name: str = "h5 writer"
+    dropped: int = 0
+    written: int = 0
+    file: Optional[h5py.File] = attr.ib(init=False, default=None)
+    _slots: threading.Semaphore = attr.ib(init=False)
+    _executor: ThreadPoolExecutor = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        self._slots = threading.Semaphore(self.maxsize)
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix=self.name)
+
+    def submit(
+        self, job: Callable[[h5py.File], Any], droppable: bool = True
+    ) -> Optional[Future]:
+        """Queues the job, returns None if it was dropped. Not droppable jobs stall."""
+        if not self._slots.acquire(blocking=self.policy == "stall" or not droppable):
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"{self.name}: queue full, dropped {self.dropped} jobs")
+            return None
+        return self._executor.submit(self._run, job)
+
+    def _run(self, job: Callable[[h5py.File], Any]):
+        try:
+            if self.file is None:
+                self.file = self.open_file()
+            res = job(self.file)
+            self.written += 1
+            return res
+        except Exception as e:
+            logger.exception(f"{self.name}: writing failed: {e}")
+            raise
+        finally:
+            self._slots.release()
+
+    def flush(self):
+        """Waits until all queued jobs are written."""
+        self._executor.submit(lambda: self.file and self.file.flush()).result()
+
+    def close(self):
+        """Writes the pending jobs and closes the file."""
+        def close():
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+        self._executor.submit(close).result()
+
+
 @attr.s(auto_attribs=True, kw_only=True)
 class ScanPlan(Plan):
     sigScanStarted: ClassVar[pyqtSignal] = pyqtSignal()
@@ -220,9 +322,6 @@ class ScanPlan(Plan):
         yield True
 
 
-from concurrent.futures import ThreadPoolExecutor, Future
-
-
 @attr.s(auto_attribs=True, kw_only=True)
 class PointList:
     axis: str
@@ -244,14 +343,12 @@ class PointScan(ScanPlan):
         for i, pos in enumerate(self.points):
             yield from self.move_pos(pos)
 
-            with ThreadPoolExecutor() as executor:
-                future = executor.submit(self.measure_point)
-                while not future.done():
-                    yield True
-                data = future.result()
-                with h5py.File(self.file_name, "w") as f:
-                    for k, v in data.items():
-                        f.create_dataset(f"{self.cur_scan}/{k}", data=v)
+            future = self.run_in_thread(self.measure_point)
+            yield from self.wait_for(future, busy=True)
+            data = future.result()
+            with h5py.File(self.file_name, "w") as f:
+                for k, v in data.items():
+                    f.create_dataset(f"{self.cur_scan}/{k}", data=v)
 
     def measure_point(self) -> dict[str, ndarray]:
         raise NotImplementedError
@@ -1,6 +1,8 @@
 import os
-import threading, json
-from typing import Optional, List, Iterable, TYPE_CHECKING, Generator, ClassVar
+import json
+import time
+import warnings
+from typing import Optional, List, Iterable, TYPE_CHECKING, Generator, ClassVar, Literal
 
 from loguru import logger
 import numpy as np
@@ -10,11 +12,197 @@ import h5py
 import pandas as pd
 
 from PyQt5.QtCore import QObject, pyqtSignal
-from .PlanBase import Plan
+from MessPy.Instruments.signal_processing import RunningStats
+from .PlanBase import Plan, H5Writer
 
 if TYPE_CHECKING:
     from MessPy.ControlClasses import Controller, Cam
-    from MessPy.Instruments.interfaces import ICam, IRotationStage, IShutter
+    from MessPy.Instruments.interfaces import ICam, IRotationStage, IShutter, Reading
+
+
+def refine_delays(
+    t: np.ndarray,
+    y: np.ndarray,
+    n: int,
+    min_step: float = 0.01,
+    method: Literal["gradient", "curvature"] = "gradient",
+) -> np.ndarray:
+    """
+    Returns up to `n` new delays, the midpoints of the intervals between the sorted
+    delays `t` where the transients `y`, shape (t, traces), change fastest. Each
+    trace is normalized by its range and the median over the traces is used. With
+    "gradient" the change over an interval is scored, with "curvature" the second
+    difference at its ends. Intervals shorter than `2 * min_step` are not split.
+    """
+    order = np.argsort(t, kind="stable")
+    ts, ys = t[order], y[order]
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-nan slices
+        ys = ys / (np.nanmax(ys, 0) - np.nanmin(ys, 0))
+        if method == "gradient":
+            score = np.nanmedian(np.abs(np.diff(ys, axis=0)), 1)
+        elif method == "curvature":
+            c = np.zeros(len(ts))
+            c[1:-1] = np.nanmedian(np.abs(ys[2:] - 2 * ys[1:-1] + ys[:-2]), 1)
+            score = np.fmax(c[:-1], c[1:])
+        else:
+            raise ValueError(f"Unknown refinement method {method}")
+    score[~np.isfinite(score) | (np.diff(ts) < 2 * min_step)] = 0
+    idx = np.argsort(score)[::-1][:n]
+    idx = idx[score[idx] > 0]
+    return (ts[idx] + ts[idx + 1]) / 2
+
+
+@attrs(auto_attribs=True)
+class ScanFile:
+    """
+    Append-only storage of the completed scans of a pump-probe plan. The file is
+    kept open while the plan runs and every new scan is appended as one slab to the
+    resizable, chunked ``data_<cam>`` dataset, hence saving does not get slower with
+    the number of scans. In SWMR mode, the file can be read during the acquisition,
+    e.g. by ``h5py.File(name, "r", libver="latest", swmr=True)``. New datasets can't
+    be added in SWMR mode, so it is only used without the full shot data.
+
+    New delays, see `PumpProbePlan.max_points`, are appended to ``t`` and along
+    the delay axis of the datasets, the earlier scans are nan there. Hence ``t`` is
+    not sorted after a refinement.
+
+    Besides the scans, the per-point statistics over the scans are kept up to date
+    in ``mean_<cam>``, ``sem_<cam>``, ``var_<cam>`` and ``count_<cam>``.
+
+    All writes go through `writer`, the full shot data is written in the background
+    with the given queue size and policy, while the scans are never dropped.
+    """
+
+    plan: "PumpProbePlan"
+    swmr: bool = True
+    policy: Literal["stall", "drop"] = "stall"
+    maxsize: int = 16
+    writer: H5Writer = attrib(init=False)
+    # Number of scans written per cam and of written rotation angles
+    _saved: dict = Factory(dict)
+
+    def __attrs_post_init__(self):
+        self.writer = H5Writer(
+            open_file=self._create,
+            maxsize=self.maxsize,
+            policy=self.policy,
+            name=f"{self.plan.name} writer",
+        )
+
+    def _create(self) -> h5py.File:
+        plan = self.plan
+        f = h5py.File(plan.get_file_name()[0], "w", libver="latest", track_order=True)
+        for ppd in plan.cam_data:
+            shape = ppd.current_scan.shape
+            f.create_dataset("wl_" + ppd.cam.name, data=ppd.wavelengths)
+            f.create_dataset(
+                "data_" + ppd.cam.name,
+                shape=(0, *shape),
+                maxshape=(None, shape[0], None, *shape[2:]),
+                chunks=(1, 1, *shape[1:]),
+                dtype=np.float64,
+                fillvalue=np.nan,
+            )
+            for stat in ("mean_", "sem_", "var_", "count_"):
+                f.create_dataset(
+                    stat + ppd.cam.name,
+                    shape=shape,
+                    maxshape=(shape[0], None, *shape[2:]),
+                    chunks=(1, *shape[1:]),
+                    dtype=np.float64,
+                    fillvalue=np.nan,
+                )
+        f.create_dataset("t", data=plan.t_list, maxshape=(None,))
+        f.create_dataset("rot", shape=(0,), maxshape=(None,), dtype=np.float64)
+        f.attrs["meta"] = json.dumps(plan.meta)
+        if self.swmr:
+            f.swmr_mode = True
+        return f
+
+    def append_scans(self):
+        """Queues the scans completed since the last call and the current statistics."""
+        plan = self.plan
+        slabs = {}
+        for ppd in plan.cam_data:
+            n = self._saved.get(ppd.cam.name, 0)
+            if ppd.scan > n:
+                # save is called after every scan, so only the current one is new
+                assert ppd.scan == n + 1
+                st = ppd.scan_stats
+                stats = dict(
+                    mean_=ppd.mean_scans,
+                    sem_=ppd.sem_scans,
+                    var_=st.var,
+                    count_=st.count.copy(),
+                )
+                slabs[ppd.cam.name] = (n, ppd.current_scan.copy(), stats)
+                self._saved[ppd.cam.name] = ppd.scan
+        n_rot = self._saved.get("rot", 0)
+        rot = plan.rot_at_scan[n_rot:]
+        self._saved["rot"] = n_rot + len(rot)
+        meta = None if self.swmr else json.dumps(plan.meta)
+        t = np.array(plan.t_list)
+
+        def write(f: h5py.File):
+            if f["t"].shape[0] != len(t):
+                f["t"].resize(len(t), axis=0)
+                f["t"][:] = t
+            for name, (n, scan, stats) in slabs.items():
+                ds = f["data_" + name]
+                ds.resize((n + 1, ds.shape[1], len(t), *ds.shape[3:]))
+                ds[n] = scan
+                for stat, value in stats.items():
+                    f[stat + name].resize(len(t), axis=1)
+                    f[stat + name][...] = value
+            if rot:
+                ds = f["rot"]
+                ds.resize(n_rot + len(rot), axis=0)
+                ds[n_rot:] = rot
+            if meta is not None:
+                f.attrs["meta"] = meta
+            f.flush()
+
+        self.writer.submit(write, droppable=False)
+
+    def save_full_data(self, ppd: "PumpProbeData", lr: "Reading"):
+        """
+        Queues the full data of the reading, which is held until it is written.
+        The data is stored in the dtype of the camera.
+        """
+        pool = ppd.cam.cam.reading_pool
+        # like Cam.hold_last_read, a newer read may release lr meanwhile
+        with pool.lock:
+            current = lr is ppd.cam.last_read
+            if current:
+                pool.hold(lr)
+        if not current:
+            logger.warning("Full data not saved, the reading was already reused")
+            return
+        name = f"full_data/{ppd.cam.name}/scan_{ppd.scan}/t_{ppd.t_idx: 05d}"
+
+        def write(f: h5py.File):
+            try:
+                f.create_dataset(
+                    name,
+                    data=lr.full_data,
+                    compression="lzf",
+                    chunks=(1, lr.full_data.shape[1], min(20, lr.full_data.shape[2])),
+                    shuffle=True,
+                )
+            finally:
+                pool.release(lr)
+
+        if self.writer.submit(write) is None:
+            pool.release(lr)
+
+    def close(self):
+        """Writes the pending data and closes the file, then adds the final metadata."""
+        self.writer.close()
+        fname = self.plan.get_file_name()[0]
+        if fname.exists():
+            with h5py.File(fname, "a") as f:
+                f.attrs["meta"] = json.dumps(self.plan.meta)
 
 
 @attrs(auto_attribs=True)
@@ -39,6 +227,34 @@ class PumpProbePlan(Plan):
     do_ref_calib: bool = True
     probe_shutter: Optional["IShutter"] = None
     save_full_data: bool = False
+    # Queue size and policy of the background writer for the full shot data
+    full_data_queue: int = 16
+    full_data_policy: Literal["stall", "drop"] = "stall"
+    # Keep all scans in memory, they are always saved to the file
+    keep_scans: bool = True
+    scan_file: ScanFile = attrib(init=False)
+    # Move to the next delay as soon as a point is read and process the point
+    # meanwhile. The cameras are never read while the delay line moves.
+    overlap_move: bool = True
+    # Durations of the move, read and processing of every point in seconds
+    point_times: List[dict] = Factory(list)
+    # Adaptive averaging: after `min_scans` scans, only the delays whose standard
+    # error is above `target_sem` are measured again, the plan finishes when all
+    # delays reach it. The error of a delay is the median over the pixels of signal
+    # `sem_signal_idx`, the largest of all cams and wavelengths is used.
+    target_sem: Optional[float] = None
+    min_scans: int = 2
+    sem_signal_idx: int = 0
+    # Indices of the delays measured in the current scan, None for all
+    active_points: Optional[np.ndarray] = None
+    # Adaptive delays: after each scan, up to `refine_per_scan` delays are added
+    # where the mean transients change fastest, until there are `max_points`. See
+    # `refine_delays`, None keeps `t_list` fixed. New delays are appended to
+    # `t_list`, the scans go through the sorted delays.
+    max_points: Optional[int] = None
+    refine_per_scan: int = 4
+    refine_method: Literal["gradient", "curvature"] = "gradient"
+    min_step: float = 0.01
 
     sigStepDone: ClassVar[pyqtSignal] = pyqtSignal()
 
@@ -53,6 +269,12 @@ class PumpProbePlan(Plan):
         super(PumpProbePlan, self).__attrs_post_init__()
         gen = self.make_step_gen()
         self.make_step = lambda: next(gen)
+        self.scan_file = ScanFile(
+            plan=self,
+            swmr=not self.save_full_data,
+            policy=self.full_data_policy,
+            maxsize=self.full_data_queue,
+        )
         self.angle_cycle = []
         self.cam_data = []
         self.pre_state = dict(
@@ -67,6 +289,7 @@ class PumpProbePlan(Plan):
                     plan=self,
                     t_list=self.t_list,
                     save_full_data=self.save_full_data,
+                    keep_scans=self.keep_scans,
                 )
             )
 
@@ -82,9 +305,55 @@ class PumpProbePlan(Plan):
                     yield
 
     def move_delay_line(self, t):
-        self.controller.delay_line.set_pos(t, do_wait=False)
-        while self.controller.delay_line.moving:
-            yield
+        yield from self.wait_for(self.controller.delay_line.submit_move(t))
+
+    def point_sem(self) -> np.ndarray:
+        """The standard error of each delay for adaptive averaging, inf if unknown."""
+        sems = []
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-nan slices
+            for ppd in self.cam_data:
+                if ppd.sem_scans is None:
+                    return np.full(len(self.t_list), np.inf)
+                sem = np.nanmedian(ppd.sem_scans[:, :, self.sem_signal_idx, :], -1)
+                sems.append(np.where(np.isnan(sem), np.inf, sem).max(0))
+        return np.max(sems, 0)
+
+    def scan_order(self) -> np.ndarray:
+        """Indices of the delays in the order they are measured."""
+        if self.max_points is None:
+            return np.arange(len(self.t_list))
+        return np.argsort(self.t_list, kind="stable")
+
+    def refine(self):
+        """Adds new delays where the mean transients of all cams change fastest."""
+        n = min(self.refine_per_scan, self.max_points - len(self.t_list))
+        if n <= 0 or any(ppd.mean_scans is None for ppd in self.cam_data):
+            return
+        traces = []
+        for ppd in self.cam_data:
+            y = ppd.mean_scans[:, :, self.sem_signal_idx, :]
+            traces.append(np.moveaxis(y, 1, 0).reshape(len(self.t_list), -1))
+        new_t = refine_delays(
+            self.t_list, np.hstack(traces), n, self.min_step, self.refine_method
+        )
+        if new_t.size == 0:
+            return
+        logger.info(f"Adding delays {np.round(new_t, 3)}")
+        self.t_list = np.concatenate((self.t_list, new_t))
+        for ppd in self.cam_data:
+            ppd.add_delays(self.t_list)
+
+    def update_active_points(self) -> bool:
+        """Selects the delays of the next scan, returns False if all are converged."""
+        if self.target_sem is None or any(
+            ppd.scan < self.min_scans for ppd in self.cam_data
+        ):
+            return True
+        self.active_points = np.flatnonzero(self.point_sem() > self.target_sem)
+        n = self.active_points.size
+        logger.info(f"{n}/{len(self.t_list)} delays above the target SEM")
+        return self.active_points.size > 0
 
     def pre_scan(self) -> Generator:
         rs = self.controller.rot_stage
@@ -108,25 +377,44 @@ class PumpProbePlan(Plan):
             print("Calibrating Ref")
             print(f"At t={self.controller.delay_line.get_pos()}")
             self.cam_data[0].cam.cam.calibrate_ref()
-        for self.t_idx, t in enumerate(self.t_list):
-            yield from self.move_delay_line(t * 1000)
+        dl = self.controller.delay_line
+        points = self.scan_order()
+        if self.active_points is not None:
+            for pp in self.cam_data:
+                pp.skip_points(np.setdiff1d(points, self.active_points))
+            points = points[np.isin(points, self.active_points)]
+        move = None
+        for i, self.t_idx in enumerate(points):
+            t = self.t_list[self.t_idx]
+            t0 = time.perf_counter()
+            if move is None:
+                move = dl.submit_move(t * 1000)
+            yield from self.wait_for(move)
             if self.pump_shutter:
                 self.pump_shutter.open()
-            threads = []
             self.time_tracker.point_starting()
-            for pp in self.cam_data:
-                t = threading.Thread(target=pp.read_point, args=(self.t_idx,))
-                t.start()
-                threads.append(t)
-            while any([t.is_alive() for t in threads]):
-                yield
-            for pp in self.cam_data:
-                pp.sigStepDone.emit()
-
+            t_moved = time.perf_counter()
+            reads = [pp.cam.submit_read() for pp in self.cam_data]
+            yield from self.wait_for(*reads)
+            t_read = time.perf_counter()
             if self.pump_shutter:
                 self.pump_shutter.close()
+
+            move = None
+            if self.overlap_move and i + 1 < len(points):
+                move = dl.submit_move(self.t_list[points[i + 1]] * 1000)
+            for pp, read in zip(self.cam_data, reads):
+                pp.process_point(self.t_idx, read.result())
+                pp.sigStepDone.emit()
             self.sigStepDone.emit()
             self.time_tracker.point_ending()
+            times = dict(
+                move=t_moved - t0,
+                read=t_read - t_moved,
+                process=time.perf_counter() - t_read,
+            )
+            self.time_tracker.record_phases(**times)
+            self.point_times.append(times)
             yield
         self.time_tracker.scan_ending()
 
@@ -135,6 +423,12 @@ class PumpProbePlan(Plan):
         rs = self.controller.rot_stage
 
         while True:
+            if not self.update_active_points():
+                logger.info("All delays reached the target SEM")
+                # writes the pending data and closes the file
+                self.restore_state()
+                self.sigPlanFinished.emit()
+                return
             yield from self.pre_scan()
             yield from self.scan()
             delta_t = self.time_tracker.scan_duration
@@ -146,35 +440,24 @@ class PumpProbePlan(Plan):
             self.controller.delay_line.set_pos(self.t_list[0], do_wait=False)
             for pp in self.cam_data:
                 pp.post_scan()
+            full_cycle = self.num_scans % self.common_mulitple_cwls == 0
+            if self.max_points is not None and full_cycle:
+                self.refine()
 
-            if self.use_rot_stage and (self.num_scans % self.common_mulitple_cwls == 0):
+            if self.use_rot_stage and full_cycle:
                 assert self.rot_stage_angles is not None
                 assert rs is not None
                 self.rot_idx = (self.rot_idx + 1) % len(self.rot_stage_angles)
                 rs.set_degrees(self.rot_stage_angles[self.rot_idx])
 
-    def create_file(self):
-        with self.data_file as f:
-            for ppd in self.cam_data:
-                f.create_dataset("wl_" + ppd.cam.name, data=ppd.wavelengths)
-            f.create_dataset("t", data=self.t_list)
-            f.create_dataset("rot", data=self.rot_at_scan)
-
     def save(self):
-        logger.info(f"Saving to {self.data_file}")
+        logger.info(f"Saving to {self.get_file_name()[0]}")
         self.save_meta()
-
-        with self.data_file as f:
-            for ppd in self.cam_data:
-                if (name := "data_" + ppd.cam.name) in f:
-                    del f[name]
-                    del f["rot"]
-                f[name] = ppd.completed_scans
-                f.create_dataset("rot", data=self.rot_at_scan)
-            f.attrs["meta"] = json.dumps(self.meta)
+        self.scan_file.append_scans()
 
     def restore_state(self):
         super().restore_state()
+        self.scan_file.close()
         # TODO: cam_list
         self.controller.cam.set_shots(self.pre_state["shots"])
         self.controller.delay_line.set_pos(self.pre_state["delay"], do_wait=False)
@@ -201,6 +484,8 @@ class PumpProbeTasPlan(Plan):
     do_ref_calib: bool = True
     probe_shutter: Optional["IShutter"] = None
     save_full_data: bool = False
+    keep_scans: bool = True
+    scan_file: ScanFile = attrib(init=False)
 
     sigStepDone: ClassVar[pyqtSignal] = pyqtSignal()
 
@@ -215,6 +500,7 @@ class PumpProbeTasPlan(Plan):
         super(PumpProbeTasPlan, self).__attrs_post_init__()
         gen = self.make_step_gen()
         self.make_step = lambda: next(gen)
+        self.scan_file = ScanFile(plan=self, swmr=not self.save_full_data)
         self.angle_cycle = []
         self.cam_data = []
         self.pre_state = dict(
@@ -228,6 +514,7 @@ class PumpProbeTasPlan(Plan):
                     plan=self,
                     t_list=self.t_list,
                     save_full_data=self.save_full_data,
+                    keep_scans=self.keep_scans,
                 )
             )
             c.set_shots(self.shots)
@@ -265,14 +552,9 @@ class PumpProbeTasPlan(Plan):
             yield from self.move_delay_line(t * 1000)
             if self.pump_shutter:
                 self.pump_shutter.open()
-            threads = []
             self.time_tracker.point_starting()
-            for pp in self.cam_data:
-                t = threading.Thread(target=pp.read_point, args=(self.t_idx,))
-                t.start()
-                threads.append(t)
-            while any([t.is_alive() for t in threads]):
-                yield
+            reads = [self.run_in_thread(pp.read_point, self.t_idx) for pp in self.cam_data]
+            yield from self.wait_for(*reads)
             for pp in self.cam_data:
                 pp.sigStepDone.emit()
 
@@ -306,34 +588,19 @@ class PumpProbeTasPlan(Plan):
                 self.rot_idx = (self.rot_idx + 1) % len(self.rot_stage_angles)
                 rs.set_degrees(self.rot_stage_angles[self.rot_idx])
 
-    def create_file(self):
-        with self.data_file as f:
-            for ppd in self.cam_data:
-                f.create_dataset("wl_" + ppd.cam.name, data=ppd.wavelengths)
-            f.create_dataset("t", data=self.t_list)
-            f.create_dataset("rot", data=self.rot_at_scan)
-
     def save(self):
-        logger.info(f"Saving to {self.data_file}")
+        logger.info(f"Saving to {self.get_file_name()[0]}")
         self.save_meta()
-
-        with self.data_file as f:
-            for ppd in self.cam_data:
-                if (name := "data_" + ppd.cam.name) in f:
-                    del f[name]
-                    del f["rot"]
-                f[name] = ppd.completed_scans
-                f.create_dataset("rot", data=self.rot_at_scan)
-            f.attrs["meta"] = json.dumps(self.meta)
+        self.scan_file.append_scans()
 
         #save csv -- avg of all scans as a wavelength / y data pair
         for idx, ppd in enumerate(self.cam_data):
             try:
                 wavelengths = np.array(ppd.wavelengths).flatten()
-                scans = np.array(ppd.completed_scans)  # shape: (scans, 1, times, 1, pixels)
+                mean = np.array(ppd.mean_scans)  # shape: (1, times, 1, pixels)
 
                 # Just averages all intensities for all results at pixel/wavelength even though for this test plan there is no time delay change
-                avg_signal = scans.mean(axis=(0, 1, 2, 3)).flatten()
+                avg_signal = mean.mean(axis=(0, 1, 2)).flatten()
 
                 if wavelengths.shape != avg_signal.shape:
                     raise ValueError("Wavelength/signal shape mismatch.")
@@ -344,7 +611,7 @@ class PumpProbeTasPlan(Plan):
                     "Averaged Signal": avg_signal
                 })
 
-                base = os.path.splitext(self.data_file.filename)[0]
+                base = os.path.splitext(self.get_file_name()[0])[0]
                 csv_filename = f"{base}_cam{idx}_{ppd.cam.name.replace(' ', '_')}_avg.csv"
 
                 df.to_csv(csv_filename, index=False)
@@ -355,6 +622,7 @@ class PumpProbeTasPlan(Plan):
 
     def restore_state(self):
         super().restore_state()
+        self.scan_file.close()
         # TODO: cam_list
         self.controller.cam.set_shots(self.pre_state["shots"])
         self.controller.delay_line.set_pos(self.pre_state["delay"], do_wait=False)
@@ -374,11 +642,17 @@ class PumpProbeData(QObject):
 
     last_signal: Optional[np.ndarray] = None
     mean_signal: Optional[np.ndarray] = None
+    sem_signal: Optional[np.ndarray] = None
     current_scan: NDArray = attrib(init=False)
     mean_scans: Optional[np.ndarray] = None
-    completed_scans: Optional[np.ndarray] = None
+    # Standard error of mean_scans, nan with less than two scans
+    sem_scans: Optional[np.ndarray] = None
+    # Grows by doubling, the completed scans are the first `scan` entries
+    _scan_buffer: Optional[np.ndarray] = attrib(init=False, default=None)
+    scan_stats: RunningStats = Factory(RunningStats)
     wavelengths: np.ndarray = attrib(init=False)
     save_full_data: bool = False
+    keep_scans: bool = True
 
     sigWavelengthChanged = pyqtSignal()
     sigStepDone = pyqtSignal()
@@ -397,41 +671,69 @@ class PumpProbeData(QObject):
         if self.cam.changeable_wavelength:
             self.cam.set_wavelength(self.cwl[0])
 
+    @property
+    def completed_scans(self) -> Optional[np.ndarray]:
+        """All completed scans, shape (scans, wl, t, sig, pixel)"""
+        if self._scan_buffer is None:
+            return None
+        return self._scan_buffer[: self.scan]
+
+    def _append_scan(self):
+        if not self.keep_scans:
+            self.scan += 1
+            return
+        buf = self._scan_buffer
+        if buf is None or self.scan >= buf.shape[0]:
+            n = max(4, 2 * self.scan)
+            new = np.empty((n, *self.current_scan.shape))
+            if buf is not None:
+                new[: self.scan] = buf[: self.scan]
+            self._scan_buffer = buf = new
+        buf[self.scan] = self.current_scan
+        self.scan += 1
+
     def post_scan(self):
         "Called when a scan through the delay-line has finished"
         self.delay_scans += 1
         self.wl_idx = self.delay_scans % len(self.cwl)
         if self.delay_scans % len(self.cwl) == 0:
-            self.scan += 1
-            if self.completed_scans is None:
-                self.completed_scans = self.current_scan[None, ...].copy()
-                self.mean_scans = self.completed_scans[0, ...]
-            else:
-                self.completed_scans = np.concatenate(
-                    (self.completed_scans, self.current_scan[None, ...])
-                )
-                self.mean_scans = self.completed_scans.mean(0)
+            self._append_scan()
+            self.scan_stats.add_sample(self.current_scan)
+            self.mean_scans = self.scan_stats.masked_mean
+            self.sem_scans = self.scan_stats.sem
             self.plan.save()
         next_wl = self.cwl[self.wl_idx]
         if len(self.cwl) > 1:
             self.cam.set_wavelength(next_wl)
         self.sigWavelengthChanged.emit()
 
+    def add_delays(self, t_list: np.ndarray):
+        """Extends the data to `t_list`, the new delays are appended."""
+        n = len(t_list) - len(self.t_list)
+        self.t_list = t_list
+        self.current_scan = _grow(self.current_scan, n, 1, np.nan)
+        if self._scan_buffer is not None:
+            self._scan_buffer = _grow(self._scan_buffer, n, 2, np.nan)
+        st = self.scan_stats
+        if st.mean is not None:
+            st.count, st.mean, st.m2 = (
+                _grow(a, n, 1, 0) for a in (st.count, st.mean, st.m2)
+            )
+            self.mean_scans = _grow(self.mean_scans, n, 1, np.nan)
+            self.sem_scans = _grow(self.sem_scans, n, 1, np.nan)
+
+    def skip_points(self, t_idx: np.ndarray):
+        """Marks the delays as not measured in the current scan."""
+        self.current_scan[self.wl_idx, t_idx] = np.nan
+
     def read_point(self, t_idx):
+        self.process_point(t_idx, self.cam.read_cam())
+
+    def process_point(self, t_idx: int, lr: "Reading"):
+        """Stores the reading of the point t_idx."""
         self.t_idx = t_idx
-        self.cam.read_cam()
-        lr = self.cam.last_read
-        assert lr is not None
         if self.save_full_data:
-            with self.plan.data_file as f:
-                ds = f.create_dataset(
-                    f"full_data/{self.cam.name}/scan_{self.scan}/t_{t_idx: 05d}",
-                    data=lr.full_data.astype(np.float64),
-                    compression="lzf",
-                    chunks=(1, lr.full_data.shape[1], 20),
-                    shuffle=True,
-                    scaleoffset=2,
-                )
+            self.plan.scan_file.save_full_data(self, lr)
         if np.shape(lr.signals)[0] == 1:
             self.current_scan[self.wl_idx, t_idx, :, :] = lr.signals[...]
         elif np.shape(lr.signals)[0] == 2:
@@ -440,4 +742,12 @@ class PumpProbeData(QObject):
             print("Shape of lr.signal not matching current scan shape\n")
         if self.mean_scans is not None:
             self.mean_signal = self.mean_scans[self.wl_idx, t_idx, :, :]
-        self.last_signal = lr.signals[:, :]
+            self.sem_signal = self.sem_scans[self.wl_idx, t_idx, :, :]
+        self.last_signal = lr.signals.copy()
+
+
+def _grow(a: np.ndarray, n: int, axis: int, fill) -> np.ndarray:
+    """Appends n entries filled with `fill` along the axis."""
+    pad = [(0, 0)] * a.ndim
+    pad[axis] = (0, n)
+    return np.pad(a, pad, constant_values=fill)
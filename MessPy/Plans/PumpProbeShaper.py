@@ -16,7 +16,6 @@ from attr import define, field
 
 from MessPy.ControlClasses import Controller
 from .PlanBase import Plan, ScanPlan
-import concurrent.futures
 
 if TYPE_CHECKING:
     pass
@@ -70,13 +69,11 @@ class PumpProbeShaperPlan(Plan):
         self.sigPlanFinished.emit()
 
     def measure_point(self) -> Generator:
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            self.time_tracker.point_starting()
-            future = executor.submit(
-                self.controller.cam.cam.get_spectra, 2 * self.delays.size
-            )
-            while not future.done():
-                yield
+        self.time_tracker.point_starting()
+        future = self.run_in_thread(
+            self.controller.cam.cam.get_spectra, 2 * self.delays.size
+        )
+        yield from self.wait_for(future)
         self.time_tracker.point_ending()
         spectra, ext = future.result()
         yield spectra, ext
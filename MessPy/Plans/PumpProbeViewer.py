@@ -58,6 +58,7 @@ class IndicatorLine:
     wl_idx: int = attr.ib()
     trans_line: pg.PlotCurveItem = attr.ib()
     hist_trans_line: pg.PlotCurveItem = attr.ib()
+    hist_err: pg.ErrorBarItem = attr.ib()
     channel: int = attr.ib(0)
 
     def __attrs_post_init__(self):
@@ -133,6 +134,8 @@ class PumpProbeDataViewer(QWidget):
         self.mean_signal = np.zeros_like(self.last_signal)
         self.sig_plot.add_observed((self, "last_signal"))
         self.sig_plot.add_observed((self, "mean_signal"))
+        self.mean_err = pg.ErrorBarItem(beam=0)
+        self.sig_plot.addItem(self.mean_err)
         self.sig_plot.click_func = self.handle_sig_click
 
         self.trans_plot = ObserverPlot([], pp_plan.sigStepDone, aa=True)
@@ -156,6 +159,8 @@ class PumpProbeDataViewer(QWidget):
 
         tl = self.trans_plot.plot(pen=pg.mkPen(c, width=2))
         tlh = self.trans_plot.plot(pen=pg.mkPen(c, width=4))
+        err = pg.ErrorBarItem(pen=pg.mkPen(c, width=1), beam=0)
+        self.trans_plot.addItem(err)
 
         il = IndicatorLine(
             wl_idx=self.pp_plan.wl_idx,
@@ -164,6 +169,7 @@ class PumpProbeDataViewer(QWidget):
             line=l,
             trans_line=tl,
             hist_trans_line=tlh,
+            hist_err=err,
             entry_label=lbl,
         )
 
@@ -175,6 +181,7 @@ class PumpProbeDataViewer(QWidget):
             self.sig_plot.plotItem.removeItem(l)
             self.trans_plot.plotItem.removeItem(tl)
             self.trans_plot.plotItem.removeItem(tlh)
+            self.trans_plot.plotItem.removeItem(err)
             self.inf_lines[il.wl_idx].remove(il)
 
         lbl.mouseReleaseEvent = remove_line
@@ -187,6 +194,10 @@ class PumpProbeDataViewer(QWidget):
             rot_stage_pos = f"<dt>t pos:<dd>{s.t_idx + 1}/{len(s.t_list)}"
         else:
             rot_stage_pos = ""
+        if p.active_points is not None:
+            active = f"<dt>Active delays:<dd>{p.active_points.size}/{len(s.t_list)}"
+        else:
+            active = ""
 
         s = f"""
         <h3>Current Experiment</h3>
@@ -198,6 +209,7 @@ class PumpProbeDataViewer(QWidget):
         <dt>WL pos:<dd>{s.wl_idx + 1}/{len(s.cwl)}
         {rot_stage_pos}
         <dt>T pos:<dd>{s.t_idx}/{len(s.t_list)}
+        {active}
         <dt>Time per scan<dd>{p.time_per_scan}
         </dl>
         </big>
@@ -223,9 +235,11 @@ class PumpProbeDataViewer(QWidget):
         if not chk:
             for i in all_lines:
                 self.trans_plot.removeItem(i.hist_trans_line)
+                self.trans_plot.removeItem(i.hist_err)
         else:
             for i in all_lines:
                 self.trans_plot.addItem(i.hist_trans_line)
+                self.trans_plot.addItem(i.hist_err)
 
     def hide_current_lines(self, i):
         all_lines = []
@@ -252,22 +266,32 @@ class PumpProbeDataViewer(QWidget):
         self.last_signal = pp.last_signal[sig_ch, :]
         if pp.mean_signal is not None:
             self.mean_signal = pp.mean_signal[sig_ch, :]
+            self.mean_err.setData(
+                x=self.get_x(),
+                y=self.mean_signal,
+                height=2 * np.nan_to_num(pp.sem_signal[sig_ch, :]),
+            )
+        # the delays in scan order, they are not sorted after adding delays
+        order = self.pp.scan_order()
         if self.do_show_cur.checkState():
+            done = order[: np.flatnonzero(order == pp.t_idx)[0]]
             for i in self.inf_lines[pp.wl_idx]:
                 i.trans_line.setData(
-                    x=pp.t_list[: pp.t_idx],
-                    y=pp.current_scan[pp.wl_idx, : pp.t_idx, sig_ch, i.channel],
+                    x=pp.t_list[done],
+                    y=pp.current_scan[pp.wl_idx, done, sig_ch, i.channel],
                 )
 
-        if pp.completed_scans is not None and self.do_show_mean.checkState():
+        if pp.mean_scans is not None and self.do_show_mean.checkState():
             for j in self.inf_lines:
                 for i in j:
                     if i.hist_trans_line not in self.trans_plot.plotItem.dataItems:
                         continue
-                    ym = np.nanmean(
-                        pp.completed_scans[:, i.wl_idx, :, sig_ch, i.channel], 0
+                    ym = pp.mean_scans[i.wl_idx, order, sig_ch, i.channel]
+                    i.hist_trans_line.setData(x=pp.t_list[order], y=ym)
+                    sem = pp.sem_scans[i.wl_idx, order, sig_ch, i.channel]
+                    i.hist_err.setData(
+                        x=pp.t_list[order], y=ym, height=2 * np.nan_to_num(sem)
                     )
-                    i.hist_trans_line.setData(x=pp.t_list, y=ym)
 
     def get_x(self):
         wl = self.pp_plan.wavelengths[self.pp_plan.wl_idx]
@@ -479,6 +503,8 @@ class PumpProbeStarter(PlanStartDialog):
                 visible=has_rot,
             ),
             dict(name="Save Full Data", type="bool", value=False),
+            dict(name="Target SEM (0: off)", type="float", value=0, min=0),
+            dict(name="Max. Delays (0: fixed)", type="int", value=0, min=0),
         ]
 
         for c in self.controller.cam_list:
@@ -548,6 +574,8 @@ class PumpProbeStarter(PlanStartDialog):
             use_rot_stage=p["Use Rotation Stage"],
             rot_stage_angles=angles,
             save_full_data=p["Save Full Data"],
+            target_sem=p["Target SEM (0: off)"] or None,
+            max_points=p["Max. Delays (0: fixed)"] or None,
         )
         return p
 
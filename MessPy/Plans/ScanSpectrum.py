@@ -1,4 +1,3 @@
-import threading
 import typing as T
 
 import attr
@@ -35,17 +34,10 @@ class ScanSpectrum(Plan):
         self.sigPlanStarted.emit()
         self.cam.set_wavelength(self.wl_list[0])
         for self.wl_idx, wl in enumerate(self.wl_list):
-            t = threading.Thread(
-                target=self.cam.set_wavelength, args=(wl, self.timeout)
-            )
-            t.start()
-            while t.is_alive():
-                yield False
+            move = self.run_in_thread(self.cam.set_wavelength, wl, self.timeout)
+            yield from self.wait_for(move, busy=False)
             wls = self.cam.get_wavelengths(wl)
-            t = threading.Thread(target=self.cam.read_cam)
-            t.start()
-            while t.is_alive():
-                yield False
+            yield from self.wait_for(self.cam.submit_read(), busy=False)
 
             probe = self.cam.last_read.lines[0, :]
             ref = self.cam.last_read.lines[1, :]
@@ -1,34 +1,93 @@
-import concurrent
-import concurrent.futures
+import time
 
+import h5py
 from attr import define, attrib
 from PyQt5.QtCore import pyqtSignal
 from loguru import logger
-from MessPy.ControlClasses import Cam, Reading
 from MessPy.Instruments.interfaces import ICam, ILissajousScanner
-from MessPy.Plans.PlanBase import ScanPlan
+from MessPy.Instruments.signal_processing import RunningStats
+from MessPy.Plans.PlanBase import H5Writer, ScanPlan
+from MessPy.Plans.shot_binning import (
+    PositionLog,
+    bin_edges,
+    bin_shots,
+    binned_signal,
+    select_spectrum,
+    shot_times,
+)
 
 import numpy as np
-from typing import ClassVar
+from typing import ClassVar, Generator, Optional, Tuple
 
 
 @define(auto_attribs=True, slots=False)
 class SignalImagePlan(ScanPlan):
+    """
+    Images the pump-probe signal on the grid of sample stage `positions`, shape
+    (y, x, 2) with ascending x along the rows. The rows are scanned in alternating
+    directions.
+
+    By default the stage stops at every position and the camera is read
+    `settle_time` (s) after the stage reports to be done. With `fly_scan`, the
+    stage moves along a row with a constant velocity while the camera is read.
+    The shots are tagged with the x position interpolated from the polled stage
+    positions at their time and binned into the pixels. The velocity is chosen
+    so that a pixel gets about `shots` shots. A fly scan only measures the signal
+    of the `spectrum`, without reference, and stores it as the first signal.
+    """
+
     cam: ICam
     xy_stage: ILissajousScanner
     positions: np.ndarray
     wavelengths: np.ndarray
 
     cur_image: np.ndarray = attrib(init=False)
-
-    cur_signal: Reading = attrib(init=False)
     mean_signal: np.ndarray = attrib(init=False)
-    all_signals: np.ndarray = attrib(init=False)
+    scan_stats: RunningStats = attrib(init=False, factory=RunningStats)
+    writer: H5Writer = attrib(init=False)
 
     shots: int = 150
+    settle_time: float = 0.0
+    fly_scan: bool = False
+    # Spectrum of the camera used by the fly scans, by default the first one
+    spectrum: Optional[str] = None
+    # The stage starts and stops this far outside of a row in fly scans, in mm
+    margin: float = 0.05
+    ix: int = 0
+    iy: int = 0
     plan_shorthand: ClassVar[str] = "SignalImage"
     sigPointRead: ClassVar[pyqtSignal] = pyqtSignal()
 
+    def __attrs_post_init__(self):
+        super().__attrs_post_init__()
+        self.writer = H5Writer(open_file=self._create_file, name="signal image writer")
+        if self.fly_scan:
+            if not self.xy_stage.has_velocity_control:
+                raise NotImplementedError(f"{self.xy_stage.name} can not fly scan")
+            self.pre_velocity = self.xy_stage.get_vel_mm()[0]
+            self.log = PositionLog(lambda: self.xy_stage.get_pos_mm()[0])
+
+    @property
+    def fly_velocity(self) -> float:
+        """Velocity in mm/s, at which a pixel gets `shots` shots."""
+        pitch = np.abs(np.diff(self.positions[0, :, 0])).mean()
+        return pitch * self.cam.rep_rate / self.shots
+
+    def _create_file(self) -> h5py.File:
+        f = h5py.File(self.get_file_name()[0], "w")
+        shape = self.cur_image.shape
+        f.create_dataset("positions", data=self.positions)
+        f.create_dataset("wavelengths", data=self.wavelengths)
+        f.create_dataset(
+            "images",
+            shape=(0, *shape),
+            maxshape=(None, *shape),
+            chunks=(1, 1, *shape[1:]),
+            dtype="f8",
+        )
+        f.create_dataset("mean_signal", shape=shape, dtype="f8", fillvalue=np.nan)
+        return f
+
     def setup_plan(self):
         image_shape = (
             self.positions.shape[0],
@@ -36,43 +95,106 @@ class SignalImagePlan(ScanPlan):
             self.cam.sig_lines,
             self.cam.channels,
         )
-        self.cur_image = np.zeros(image_shape)
+        self.cur_image = np.full(image_shape, np.nan)
+        self.mean_signal = np.full(image_shape, np.nan)
         self.cam.set_shots(self.shots)
-        self.xy_stage.set_pos_mm(self.positions.flat[0])
-        yield
+        yield from self.wait_for(
+            self.run_in_thread(self.move_to, *self.positions[0, 0])
+        )
+
+    def move_to(self, x: float, y: float):
+        """Moves the stage and waits until it is settled, blocking."""
+        self.xy_stage.set_pos_mm(x, y)
+        while any(self.xy_stage.is_moving()):
+            time.sleep(0.005)
+        time.sleep(self.settle_time)
+
+    def row_indices(self, iy: int) -> range:
+        """The x indices of row iy in the order they are scanned."""
+        n = self.positions.shape[1]
+        return range(n) if iy % 2 == 0 else range(n - 1, -1, -1)
 
     def scan(self):
-        x_pos = self.positions[..., 0]
-        y_pos = self.positions[..., 1]
-        for self.ix, x in enumerate(x_pos[0, :]):
-            for self.iy, y in enumerate(y_pos[:, 0]):
+        for self.iy in range(self.positions.shape[0]):
+            if self.fly_scan:
                 self.time_tracker.point_starting()
-                self.xy_stage.set_pos_mm(x, y)
-                while not self.xy_stage.is_moving():
-                    yield
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(self.cam.make_reading)
-                while not future.done():
-                    yield
-                self.cur_signal = future.result()
-                self.cur_image[self.iy, self.ix, :, :] = self.cur_signal.signals
+                yield from self.fly_row(self.iy)
+                self.time_tracker.point_ending()
+                continue
+            for self.ix in self.row_indices(self.iy):
+                self.time_tracker.point_starting()
+                pos = self.positions[self.iy, self.ix]
+                yield from self.wait_for(self.run_in_thread(self.move_to, *pos))
+                read = self.run_in_thread(self.cam.make_reading)
+                yield from self.wait_for(read)
+                reading = read.result()
+                self.cur_image[self.iy, self.ix, :, :] = reading.signals
+                self.cam.reading_pool.release(reading)
                 self.sigPointRead.emit()
                 self.time_tracker.point_ending()
-                yield
+
+    def read_tagged(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Reads the camera, returns the x positions, data and chopper of the shots."""
+        t_start = time.perf_counter()
+        spectra, chopper = self.cam.get_spectra(None)
+        t_end = time.perf_counter()
+        data = select_spectrum(spectra, self.spectrum, self.cam.name).data
+        times = shot_times(t_start, t_end, data.shape[1], self.cam.rep_rate)
+        return self.log.pos_at(times), data, self.cam.get_chopper(chopper)
+
+    def fly_row(self, iy: int) -> Generator:
+        edges = bin_edges(self.positions[iy, :, 0])
+        lo, hi = edges[0] - self.margin, edges[-1] + self.margin
+        start, end = (lo, hi) if iy % 2 == 0 else (hi, lo)
+        y = self.positions[iy, 0, 1]
+        yield from self.wait_for(self.run_in_thread(self.move_to, start, y))
+        self.xy_stage.set_vel_mm(xvel=self.fly_velocity)
+        self.log.start()
+        sums, counts = 0, 0
+        try:
+            # the stage is polled by the log meanwhile
+            with self.log.lock:
+                self.xy_stage.set_pos_mm(x=end)
+            # the reads stop as soon as the stage left the row
+            last_edge = edges[-1] if end > start else edges[0]
+            done = False
+            while not done:
+                with self.log.lock:
+                    done = not self.xy_stage.is_moving()[0]
+                read = self.run_in_thread(self.read_tagged)
+                yield from self.wait_for(read)
+                x, data, chopper = read.result()
+                done = done or (x[-1] - last_edge) * (end - start) > 0
+                s, c = bin_shots(x, data, chopper, edges)
+                sums, counts = sums + s, counts + c
+                self.cur_image[iy, :, 0, :] = binned_signal(sums, counts)
+                pixel = np.searchsorted(edges, x[-1]) - 1
+                self.ix = int(np.clip(pixel, 0, len(edges) - 2))
+                self.sigPointRead.emit()
+        finally:
+            self.log.stop()
+            self.xy_stage.set_vel_mm(xvel=self.pre_velocity)
 
     def post_scan(self):
-        logger.info(f"Post scan, saving data, calculating mean image")
-        if self.cur_scan == 0:
-            self.all_signals = self.cur_image[None, ...]
-
-        else:
-            self.all_signals = np.append(
-                self.all_signals, self.cur_image[None, ...], axis=0
-            )
-        self.mean_signal = np.mean(self.all_signals, 0)
-        self.cur_image = np.zeros_like(self.cur_image)
-        assert self.cur_image.shape == self.mean_signal.shape
-        fname = self.get_file_name()[0]
-        np.savez(fname, data=self.all_signals, positions=self.positions)
+        logger.info("Post scan, saving data, calculating mean image")
+        stats = self.scan_stats
+        stats.add_sample(self.cur_image)
+        self.mean_signal = stats.masked_mean
+        image, mean = self.cur_image, self.mean_signal
 
+        def write(f: h5py.File):
+            n = f["images"].shape[0]
+            f["images"].resize(n + 1, axis=0)
+            f["images"][n] = image
+            f["mean_signal"][...] = mean
+            f.flush()
+
+        self.writer.submit(write, droppable=False)
+        self.cur_image = np.full_like(self.cur_image, np.nan)
         yield
+
+    def restore_state(self):
+        super().restore_state()
+        self.writer.close()
+        if self.fly_scan:
+            self.xy_stage.set_vel_mm(xvel=self.pre_velocity)
@@ -79,7 +79,7 @@ class SignalImageView(QWidget):
             self.mean_signal_line.setData(
                 x, p.mean_signal[p.iy, p.ix, self.signal_index, :]
             )
-        self.signal_line.setData(x, p.cur_signal.signals[self.signal_index, :])
+        self.signal_line.setData(x, p.cur_image[p.iy, p.ix, self.signal_index, :])
 
     @pyqtSlot()
     def update_image(self):
@@ -107,11 +107,21 @@ class SignalImageStarter(PlanStartDialog):
     viewer = SignalImageView
 
     def setup_paras(self):
+        stage = self.controller.sample_holder
+        # the fly scans need a stage with velocity control
+        self.can_fly = stage is not None and stage.has_velocity_control
         tmp = [
             {"name": "Filename", "type": "str", "value": "temp_signal_image"},
             {"name": "Shots", "type": "int", "max": 2000, "value": 100},
             {"name": "Resolution / mm", "type": "float", "value": 0.1, "step": 0.05},
             {"name": "Square width / mm", "type": "float", "value": 0.1, "step": 0.05},
+            {"name": "Settle time / s", "type": "float", "value": 0.0, "step": 0.01},
+            {
+                "name": "Fly scan",
+                "type": "bool",
+                "value": False,
+                "enabled": self.can_fly,
+            },
         ]
         self.p = pt.Parameter.create(name="Exp. Settings", type="group", children=tmp)
         params = [self.p]
@@ -139,6 +149,8 @@ class SignalImageStarter(PlanStartDialog):
             xy_stage=controller.sample_holder,
             positions=positions,
             shots=shots,
+            settle_time=p.child("Settle time / s").value(),
+            fly_scan=p.child("Fly scan").value() and self.can_fly,
             name=p.child("Filename").value(),
         )
 
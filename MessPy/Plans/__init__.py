@@ -15,6 +15,8 @@ from .ShaperCalibPlan import CalibPlan
 from .ShaperCalibView import CalibScanView
 from .SignalImagePlan import SignalImagePlan
 from .SignalImageView import SignalImageView, SignalImageStarter
+from .FastDelayScan import FastDelayScan
+from .FastDelayScanView import FastDelayScanView, FastDelayScanStarter
 from .PlanBase import Plan, ScanPlan
 # from .GermaniumPlan import GermaniumPlan
 # from .GermaniumView import GermaniumView, GermaniumStarter
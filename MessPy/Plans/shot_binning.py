@@ -0,0 +1,122 @@
+"""
+Helpers of the scans, which read the camera while a stage moves, e.g.
+`FastDelayScan` and the fly scans of `SignalImagePlan`. The stage positions are
+logged during the move, the shots are tagged with the interpolated position at
+their time and binned onto the grid of the scan.
+"""
+import threading
+import time
+import typing as T
+
+import attr
+import numpy as np
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class PositionLog:
+    """
+    Polls a position, e.g. `IDelayLine.get_pos_fs`, from a background thread.
+    The positions are timestamped with `time.perf_counter`, so that the position
+    of any moment during the logging can be interpolated. Drivers are usually not
+    thread safe, other calls to the device during the logging must hold `lock`.
+    """
+
+    read_pos: T.Callable[[], float]
+    interval: float = 0.002
+    times: list = attr.Factory(list)
+    positions: list = attr.Factory(list)
+    lock: threading.Lock = attr.Factory(threading.Lock)
+    _stop: threading.Event = attr.Factory(threading.Event)
+    _thread: T.Optional[threading.Thread] = None
+
+    def start(self):
+        self.times.clear()
+        self.positions.clear()
+        self._stop.clear()
+        self._poll()
+        self._thread = threading.Thread(
+            target=self._run, name="position log", daemon=True
+        )
+        self._thread.start()
+
+    def _poll(self):
+        with self.lock:
+            t0 = time.perf_counter()
+            pos = self.read_pos()
+            # the position is read at some time during the call
+            t = (t0 + time.perf_counter()) / 2
+        self.times.append(t)
+        self.positions.append(pos)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._poll()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._poll()
+
+    def pos_at(self, times: np.ndarray) -> np.ndarray:
+        """Interpolates the positions at the given times."""
+        return np.interp(times, self.times, self.positions)
+
+
+def shot_times(t_start: float, t_end: float, shots: int, rep_rate: float) -> np.ndarray:
+    """
+    Times of the shots of a read, which returned at `t_end`. The shots are the
+    last ones with the repetition rate before the return, but not before the
+    start of the read.
+    """
+    first = max(t_start, t_end - (shots - 1) / rep_rate)
+    return np.linspace(first, t_end, shots)
+
+
+def select_spectrum(spectra: dict, name: T.Optional[str], cam_name: str):
+    """
+    The spectrum `name` of a `get_spectra` result, None selects the first one.
+    The names differ between the cameras, e.g. "Probe" or "Probe1".
+    """
+    if name is None:
+        return next(iter(spectra.values()))
+    if name not in spectra:
+        raise KeyError(f"{cam_name} has no spectrum {name}, only {list(spectra)}")
+    return spectra[name]
+
+
+def bin_edges(t: np.ndarray) -> np.ndarray:
+    """Edges of the bins around the sorted grid t, reaching halfway to the neighbours."""
+    mid = (t[1:] + t[:-1]) / 2
+    first = t[0] - (mid[0] - t[0]) if len(t) > 1 else t[0] - 0.5
+    last = t[-1] + (t[-1] - mid[-1]) if len(t) > 1 else t[0] + 0.5
+    return np.concatenate(([first], mid, [last]))
+
+
+def bin_shots(
+    delays: np.ndarray, data: np.ndarray, chopper: np.ndarray, edges: np.ndarray
+) -> T.Tuple[np.ndarray, np.ndarray]:
+    """
+    Sums the shots of `data`, shape (pixel, shots), into the bins given by the
+    `edges` of their delays, or any other position. Returns the sums, shape (2, bins, pixel) for the pumped
+    (`chopper` True) and unpumped shots, and the number of shots, shape (2, bins).
+    Shots outside of the edges are dropped.
+    """
+    n_bins = len(edges) - 1
+    idx = np.searchsorted(edges, delays, side="right") - 1
+    valid = (idx >= 0) & (idx < n_bins)
+    sums = np.zeros((2, n_bins, data.shape[0]))
+    counts = np.zeros((2, n_bins))
+    for k, sel in enumerate((chopper, ~chopper)):
+        sel = sel & valid
+        np.add.at(sums[k], idx[sel], data[:, sel].T)
+        counts[k] = np.bincount(idx[sel], minlength=n_bins)
+    return sums, counts
+
+
+def binned_signal(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Pump-probe signal in mOD of the binned shots, see `bin_shots`."""
+    with np.errstate(all="ignore"):
+        mean = sums / counts[..., None]
+        return -1000 * np.log10(mean[0] / mean[1])
@@ -0,0 +1,4 @@
+from MessPy.Config import config
+
+# The hardware registry uses the mocks, has to be set before it is imported
+config.testing = True
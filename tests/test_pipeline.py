@@ -0,0 +1,768 @@
+"""
+End-to-end benchmarks of the acquisition pipeline, driving Cam, ICam.make_reading,
+Controller.loop and the plans headlessly against the mock hardware.
+
+Save a baseline with
+
+    pytest tests/test_pipeline.py --benchmark-only --benchmark-autosave
+
+and compare a change against it, failing on regressions, with
+
+    pytest tests/test_pipeline.py --benchmark-only --benchmark-compare --benchmark-compare-fail=mean:15%
+
+Reads/s, points/s and the peak RSS are added to the extra info of each benchmark.
+"""
+
+import atexit
+import time
+
+import numpy as np
+import pytest
+from PyQt5.QtCore import QEventLoop, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from MessPy.Config import config
+from MessPy.ControlClasses import Cam, Controller
+from MessPy.Instruments.dac_px.aom import AOM
+from MessPy.Instruments.mocks import CamMock, DACMock, MotionAxis, StageMock
+from MessPy.Instruments.signal_processing import pumped_shots
+from MessPy.Plans.AOMTwoPlan import AOMTwoDPlan
+from MessPy.Plans.FocusScan import FocusScan
+from MessPy.Plans.PumpProbe import PumpProbePlan
+from MessPy.Plans.SignalImagePlan import SignalImagePlan
+
+# (channels, shots) of the emulated cameras. The short reads keep the plan tests
+# fast, "phasetec_long" has the shot count of a real pump-probe read.
+SHAPES = {
+    "phasetec": (128, 200),
+    "mightex": (3648, 200),
+    "phasetec_long": (128, 4000),
+}
+# The mock does not wait for the laser, so that the processing dominates
+REP_RATE = float("inf")
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 2**20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report(benchmark, per_round: float, unit: str):
+    if benchmark.stats is None:  # --benchmark-disable
+        return
+    mean = benchmark.stats.stats.mean
+    benchmark.extra_info[unit] = per_round / mean
+    benchmark.extra_info["latency_ms"] = 1000 * mean / per_round
+    benchmark.extra_info["peak_rss_mb"] = peak_rss_mb()
+
+
+def no_state(device):
+    """Keeps the mock from writing its state into the config directory at exit."""
+    atexit.unregister(device.save_state)
+    return device
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    old = config.data_directory
+    config.data_directory = tmp_path
+    yield tmp_path
+    config.data_directory = old
+
+
+@pytest.fixture(params=list(SHAPES))
+def cam(request, qapp):
+    channels, shots = SHAPES[request.param]
+    mock = CamMock(
+        name=f"Mock {request.param}", channels=channels, shots=shots, rep_rate=REP_RATE
+    )
+    return Cam(cam=no_state(mock))
+
+
+@pytest.fixture
+def controller(cam):
+    c = Controller()
+    c.cam = cam
+    c.cam_list = [cam]
+    return c
+
+
+def test_make_reading(benchmark, cam):
+    def read():
+        rd = cam.cam.make_reading()
+        cam.cam.reading_pool.release(rd)
+
+    benchmark(read)
+    report(benchmark, 1, "reads/s")
+
+
+def test_read_cam(benchmark, cam):
+    benchmark(cam.read_cam)
+    report(benchmark, 1, "reads/s")
+
+
+def test_controller_loop(benchmark, controller):
+    benchmark(controller.loop)
+    report(benchmark, 1, "reads/s")
+
+
+def test_cam_running_stats(qapp):
+    mock = CamMock(name="Mock stats", channels=16, shots=50, rep_rate=REP_RATE)
+    cam = Cam(cam=no_state(mock))
+    cam.accumulate_stats(True)
+    shots = []
+    for _ in range(3):
+        rd = cam.read_cam()
+        assert rd.full_data.shape == (3, 16, 50)
+        shots.append(rd.full_data.copy())
+    shots = np.concatenate(shots, axis=2)
+    rs = cam.running_stats
+    np.testing.assert_allclose(rs.mean, shots.mean(2))
+    np.testing.assert_allclose(rs.std, np.std(shots, 2))
+
+
+def test_armed_read(benchmark, qapp):
+    # With a real rep. rate, a read takes 20 ms. The next read is armed during the
+    # emulated plotting, so that the plotting is hidden as long as it is faster.
+    mock = CamMock(name="Mock armed", channels=128, shots=20, rep_rate=1000.0)
+    cam = Cam(cam=no_state(mock))
+    controller = Controller()
+    controller.cam = cam
+    controller.cam_list = [cam]
+
+    def loop_and_plot():
+        controller.loop()
+        time.sleep(0.01)
+
+    benchmark.pedantic(loop_and_plot, rounds=30, warmup_rounds=3)
+    controller.stop_standard_read()
+    report(benchmark, 1, "reads/s")
+    # depends on the timing of the machine, hence only recorded
+    benchmark.extra_info["trigger_efficiency"] = cam.trigger_efficiency
+
+
+def run_points(controller, plan, n: int, timeout: float = 60, signal=None):
+    """
+    Lets the plan runner measure n points, the Qt event loop is run meanwhile. A
+    point is counted by `signal`, by default the sigStepDone of the plan.
+    """
+    signal = signal or plan.sigStepDone
+    done = []
+    signal.connect(lambda *args: done.append(1))
+    if controller.runner.plan is not plan:
+        controller.loop()  # hands the plan to the runner
+    else:
+        controller.runner.resume_plan()
+    app = QApplication.instance()
+    deadline = time.monotonic() + timeout
+    ticker = QTimer()
+    ticker.start(100)  # makes sure the deadline is checked
+    while len(done) < n:
+        app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+        assert time.monotonic() < deadline, "Plan got stuck"
+    ticker.stop()
+    controller.runner.pause_plan()
+    signal.disconnect()
+
+
+def test_plan_steps_in_controller_thread(controller, data_dir):
+    import attr
+    from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+    from MessPy.Plans.PlanBase import Plan
+
+    @attr.s(auto_attribs=True, kw_only=True, eq=False)
+    class ThreadPlan(Plan):
+        plan_shorthand = "Threads"
+        threads: list = attr.Factory(list)
+
+        def make_step(self):
+            self.threads.append(QThread.currentThread())
+
+    class Mover(QObject):
+        """Moves the controller back, Qt only pushes objects from their thread."""
+
+        sigCall = pyqtSignal()
+
+        @pyqtSlot()
+        def back(self):
+            controller.moveToThread(app.thread())
+
+    app = QApplication.instance()
+    worker = QThread()
+    controller.moveToThread(worker)
+    assert controller.runner.thread() is worker
+    mover = Mover()
+    mover.moveToThread(worker)
+    mover.sigCall.connect(mover.back)
+    worker.start()
+    plan = ThreadPlan(name="threads")
+    controller.plan = plan
+    try:
+        # loop is a slot, the queued call runs in the thread of the controller
+        mover.sigCall.disconnect()
+        mover.sigCall.connect(controller.loop)
+        mover.sigCall.emit()
+        deadline = time.monotonic() + 10
+        while len(plan.threads) < 5:
+            app.processEvents()
+            assert time.monotonic() < deadline, "Plan got stuck"
+        assert all(t is worker for t in plan.threads)
+    finally:
+        mover.sigCall.disconnect()
+        mover.sigCall.connect(controller.runner.stop_plan)
+        mover.sigCall.emit()
+        mover.sigCall.disconnect()
+        mover.sigCall.connect(mover.back)
+        mover.sigCall.emit()
+        while controller.thread() is worker:
+            app.processEvents()
+        worker.quit()
+        worker.wait()
+
+
+def test_pump_probe_plan(benchmark, controller, data_dir):
+    points = 5
+    plan = PumpProbePlan(
+        controller=controller,
+        t_list=np.linspace(-1, 10, 20),
+        name="bench",
+        shots=controller.cam.shots,
+    )
+    controller.plan = plan
+    benchmark.pedantic(run_points, (controller, plan, points), rounds=3)
+    report(benchmark, points, "points/s")
+    assert len(plan.point_times) >= points
+    benchmark.extra_info["process_ms"] = 1000 * np.mean(
+        [p["process"] for p in plan.point_times]
+    )
+
+
+@pytest.mark.parametrize("full_data", [False, True])
+def test_pump_probe_scan_file(controller, data_dir, full_data):
+    import h5py
+
+    plan = PumpProbePlan(
+        controller=controller,
+        t_list=np.linspace(-1, 10, 4),
+        name="scans",
+        shots=controller.cam.shots,
+        save_full_data=full_data,
+    )
+    controller.plan = plan
+    run_points(controller, plan, 13)  # three scans and the first point of the next
+    ppd = plan.cam_data[0]
+    assert ppd.scan == 3
+    plan.scan_file.writer.flush()
+    fname = plan.get_file_name()[0]
+    # without the full data, readable while the plan holds the file open
+    if not full_data:
+        with h5py.File(fname, "r", libver="latest", swmr=True) as f:
+            ds = f["data_" + ppd.cam.name]
+            assert ds.shape == (3, *ppd.current_scan.shape)
+            np.testing.assert_allclose(ds[...], ppd.completed_scans)
+            scans = ppd.completed_scans
+            np.testing.assert_allclose(f["mean_" + ppd.cam.name], np.nanmean(scans, 0))
+            n = np.sum(~np.isnan(scans), 0)
+            with np.errstate(all="ignore"):
+                sem = np.nanstd(scans, 0, ddof=1) / np.sqrt(n)
+            np.testing.assert_allclose(f["sem_" + ppd.cam.name], sem)
+            np.testing.assert_allclose(ppd.sem_scans, sem)
+    controller.stop_plan()
+    with h5py.File(fname, "r") as f:
+        assert "meta" in f.attrs
+        assert f["data_" + ppd.cam.name].shape[0] == 3
+        if full_data:
+            scans = f["full_data/" + ppd.cam.name]
+            assert len(scans) == 4 and len(scans["scan_0"]) == 4
+            ds = scans["scan_3/t_ 0000"]
+            assert ds.dtype == controller.cam.cam.float_dtype
+            assert ds.shape == controller.cam.last_read.full_data.shape
+
+
+def test_pump_probe_target_sem(controller, data_dir):
+    plan = PumpProbePlan(
+        controller=controller,
+        t_list=np.linspace(-1, 10, 4),
+        name="sem",
+        shots=controller.cam.shots,
+        min_scans=2,
+    )
+    sem = plan.point_sem()
+    assert np.all(np.isinf(sem))
+    controller.start_plan(plan)
+    run_points(controller, plan, 9)  # two scans and the first point of the third
+    sem = plan.point_sem()
+    assert np.all(np.isfinite(sem))
+    plan.target_sem = np.sort(sem)[0]
+    assert plan.update_active_points()
+    assert plan.active_points.tolist() == np.flatnonzero(sem > plan.target_sem).tolist()
+
+    # only the active delays are measured, the others are nan in the current scan
+    plan.target_sem = None
+    plan.active_points = np.array([1, 3])
+    run_points(controller, plan, 3 + 2)
+    ppd = plan.cam_data[0]
+    assert plan.t_idx == 3 and ppd.scan == 3
+    assert np.isnan(ppd.current_scan[0, [0, 2]]).all()
+    assert not np.isnan(ppd.current_scan[0, [1, 3]]).all()
+
+    # finishes when all delays are converged
+    plan.target_sem = np.inf
+    finished = []
+    plan.sigPlanFinished.connect(lambda: finished.append(1))
+    controller.runner.resume_plan()
+    deadline = time.monotonic() + 30
+    while not finished:
+        QApplication.instance().processEvents()
+        assert time.monotonic() < deadline
+    assert controller.plan is None
+    assert plan.scan_file.writer.file is None
+
+
+@pytest.mark.parametrize("method", ["gradient", "curvature"])
+def test_refine_delays(method):
+    from MessPy.Plans.PumpProbe import refine_delays
+
+    t = np.linspace(-2, 10, 13)
+    y = np.tanh(3 * (t[:, None] - 0.5)) * np.ones((1, 5))
+    new = refine_delays(t[::-1], y[::-1], 2, method=method)
+    assert len(new) == 2
+    assert np.all(np.abs(new - 0.5) < 1.1)
+    # intervals below twice the min. step are not split
+    assert refine_delays(t, y, 2, min_step=1, method=method).size == 0
+
+
+def test_pump_probe_refinement(controller, data_dir):
+    import h5py
+
+    plan = PumpProbePlan(
+        controller=controller,
+        t_list=np.array([-1.0, 0.0, 1.0, 10.0]),
+        name="refine",
+        shots=controller.cam.shots,
+        max_points=6,
+        refine_per_scan=2,
+    )
+    controller.plan = plan
+    run_points(controller, plan, 4 + 6 + 1)
+    ppd = plan.cam_data[0]
+    assert len(plan.t_list) == 6 and ppd.t_list is plan.t_list
+    assert ppd.scan == 2
+    assert ppd.completed_scans.shape[2] == 6
+    # the first scan did not measure the new delays
+    assert np.isnan(ppd.completed_scans[0, :, 4:]).all()
+    assert (ppd.scan_stats.count[:, 4:] <= 1).all()
+    # the second scan went through the sorted delays
+    assert plan.point_times and plan.t_idx == plan.scan_order()[0]
+    plan.scan_file.writer.flush()
+    with h5py.File(plan.get_file_name()[0], "r", libver="latest", swmr=True) as f:
+        np.testing.assert_allclose(f["t"], plan.t_list)
+        ds = f["data_" + ppd.cam.name]
+        assert ds.shape == (2, *ppd.current_scan.shape)
+        np.testing.assert_allclose(ds[...], ppd.completed_scans)
+        assert f["mean_" + ppd.cam.name].shape == ppd.current_scan.shape
+
+
+def test_h5_writer_policy(tmp_path):
+    import threading
+
+    import h5py
+
+    from MessPy.Plans.PlanBase import H5Writer
+
+    writer = H5Writer(
+        open_file=lambda: h5py.File(tmp_path / "w.h5", "w"), maxsize=1, policy="drop"
+    )
+    release = threading.Event()
+    assert writer.submit(lambda f: release.wait()) is not None
+    assert writer.submit(lambda f: f.create_dataset("dropped", data=[1])) is None
+    assert writer.dropped == 1
+    release.set()
+    # not droppable jobs wait for a free slot
+    writer.submit(lambda f: f.create_dataset("kept", data=[1]), droppable=False)
+    writer.close()
+    with h5py.File(tmp_path / "w.h5", "r") as f:
+        assert list(f) == ["kept"]
+
+
+@pytest.fixture
+def aom(qapp):
+    aom = no_state(AOM(dac=DACMock(), name="AOM Mock"))
+    aom.nu = np.linspace(45, 65, aom.pixel.size)
+    return aom
+
+
+def test_aom_2d_plan(benchmark, data_dir, aom, qapp):
+    import h5py
+
+    mock = CamMock(name="Mock 2D", channels=128, shots=320, rep_rate=REP_RATE)
+    cam = Cam(cam=no_state(mock))
+    controller = Controller()
+    controller.cam = cam
+    controller.cam_list = [cam]
+    plan = AOMTwoDPlan(
+        name="bench",
+        meta={},
+        controller=controller,
+        shaper=aom,
+        t2=np.linspace(0, 5, 20),
+        max_t1=4,
+        step_t1=0.05,
+        phase_frames=4,
+        rot_frame_freq=2000,
+    )
+    controller.plan = plan
+    # setup_plan sets the shots to t1 * phase_frames
+    run_points(controller, plan, 1)
+    assert cam.shots == 4 * plan.t1.size
+    points = 3
+    benchmark.pedantic(run_points, (controller, plan, points), rounds=3)
+    report(benchmark, points, "points/s")
+    # stopping writes the points, which were still processed. The plan was paused
+    # after it went on to the next delay.
+    done = plan.t2_idx
+    controller.stop_plan()
+    with h5py.File(plan.get_file_name()[0], "r") as f:
+        assert len(f["ifr_data/Probe1"]) == done
+        ifr = f[f"ifr_data/Probe2/{done - 1}/0"]
+        assert ifr.attrs["time"] == plan.t2[done - 1]
+        # the mean of a single scan is the scan itself
+        mean = f[f"2d_data/Probe1/{done - 1}/mean"]
+        np.testing.assert_allclose(mean, f[f"2d_data/Probe1/{done - 1}/0"])
+        np.testing.assert_allclose(plan.last_2d[0], mean, rtol=1e-6)
+
+
+def test_process_2d_spectra_names(qapp):
+    mock = CamMock(name="Mock 2D", channels=16, shots=4 * 20, rep_rate=REP_RATE)
+    no_state(mock)
+    spectra = mock.get_2D_spectra()
+    t1 = np.arange(20) * 0.05
+    ret = mock.process_2D_spectra(spectra, t1, 0)
+    assert set(ret) == {"Probe1", "Probe2", "Ref"}
+    assert ret["Ref"] is spectra["Ref"]
+    # cameras with other spectrum names, e.g. a single "Probe", work as well
+    single = mock.process_2D_spectra({"Probe": spectra["Probe1"]}, t1, 0)
+    assert set(single) == {"Probe"}
+    np.testing.assert_allclose(single["Probe"].signal_2D, ret["Probe1"].signal_2D)
+
+
+def test_aom_2d_means(data_dir, aom):
+    from types import SimpleNamespace
+
+    plan = AOMTwoDPlan(name="means", controller=Controller(), shaper=aom, t2=np.arange(3))
+    rng = np.random.default_rng(0)
+    scans = rng.normal(size=(3, 2, 2, 8, 5))
+    for ifr, spec in scans:
+        ret = {
+            line: SimpleNamespace(interferogram=ifr[i], signal_2D=spec[i])
+            for i, line in enumerate(["Probe1", "Probe2"])
+        }
+        means, disp = plan.update_means(ret, 1)
+    assert not plan.disp_arrays  # only shown from the plan thread
+    plan.show_means(disp)
+    np.testing.assert_allclose(means["2d_data/Probe2/1/mean"], scans[:, 1, 1].mean(0))
+    np.testing.assert_allclose(means["ifr_data/Probe1/1/mean"], scans[:, 0, 0].mean(0))
+    np.testing.assert_allclose(plan.disp_arrays["Probe2_ifr_var"], scans[:, 0, 1].var(0))
+    assert plan.last_2d[1] is plan.disp_arrays["Probe2_spec2d"]
+
+
+def test_fast_delay_scan(data_dir, qapp):
+    import h5py
+
+    from MessPy.ControlClasses import DelayLine
+    from MessPy.Instruments.mocks import DelayLineMock
+    from MessPy.Plans.FastDelayScan import FastDelayScan
+    from MessPy.Plans.FastDelayScanView import FastDelayScanView
+
+    mock = CamMock(name="Mock fast", channels=128, shots=20, rep_rate=1000.0)
+    mock.noise_scale = 0.01
+    cam = Cam(cam=no_state(mock))
+    controller = Controller()
+    controller.cam = cam
+    controller.cam_list = [cam]
+    controller.delay_line = DelayLine(dl=no_state(DelayLineMock()))
+    plan = FastDelayScan(
+        name="fast",
+        controller=controller,
+        t_list=np.linspace(-1, 6, 15),
+        velocity=20,
+        shots=20,
+    )
+    view = FastDelayScanView(plan)
+    controller.start_plan(plan)
+    sweeps = []
+    plan.sigSweepDone.connect(lambda: sweeps.append(1))
+    controller.loop()  # hands the plan to the runner
+    deadline = time.monotonic() + 60
+    while len(sweeps) < 2:
+        QApplication.instance().processEvents()
+        assert time.monotonic() < deadline
+    controller.stop_plan()
+    view.update_info()
+    # both directions passed every delay, the stage stands still afterwards
+    assert (plan.counts > 0).all()
+    assert plan.dl.get_velocity() is None and not plan.dl.is_moving()
+    # the binned signal follows the decaying transient of the mock, which bleaches
+    # the first pixels
+    after = plan.t_list > 0.3
+    trace = -plan.signal[:, :10].mean(1)
+    assert np.abs(trace[plan.t_list < -0.3]).max() < 0.3 * trace[after].max()
+    assert np.corrcoef(trace[after], np.exp(-plan.t_list[after] / 3))[0, 1] > 0.8
+    with h5py.File(plan.get_file_name()[0], "r") as f:
+        assert f["sweeps"].shape == (2, 15, 128)
+        np.testing.assert_allclose(f["counts"][...].sum(0), plan.counts)
+    controller.delay_line = DelayLine(dl=no_state(DelayLineMock()))
+    controller.delay_line._dl.has_velocity_control = False
+    with pytest.raises(NotImplementedError):
+        FastDelayScan(name="fast", controller=controller, t_list=np.arange(3.0))
+
+
+
+class AnalogChopperMock(CamMock):
+    """Returns the chopper like the PhaseTec camera, as analog (channels, shots)."""
+
+    def get_spectra(self, frames=None):
+        spectra, chopper = super().get_spectra(frames)
+        ch = np.random.uniform(0, 0.5, size=(2, len(chopper)))
+        ch[0, chopper] = 4.5
+        return spectra, ch
+
+    def get_chopper(self, ch):
+        return pumped_shots(ch[0], 1)
+
+
+def test_fast_delay_scan_analog_chopper(data_dir, qapp):
+    from MessPy.ControlClasses import DelayLine
+    from MessPy.Instruments.mocks import DelayLineMock
+    from MessPy.Plans.FastDelayScan import FastDelayScan
+    from MessPy.Plans.shot_binning import bin_shots
+
+    # the pumped shots alternate, starting with the first triggered one
+    trigger = np.array([0.1, 0.2, 4.5, 0.1, 4.5, 0.2])
+    np.testing.assert_array_equal(pumped_shots(trigger), np.arange(6) % 2 == 0)
+    np.testing.assert_array_equal(pumped_shots(trigger[1:]), np.arange(5) % 2 == 1)
+
+    mock = AnalogChopperMock(name="Mock analog", channels=16, shots=20, rep_rate=1000.0)
+    cam = Cam(cam=no_state(mock))
+    controller = Controller()
+    controller.cam = cam
+    controller.cam_list = [cam]
+    controller.delay_line = DelayLine(dl=no_state(DelayLineMock()))
+    plan = FastDelayScan(
+        name="analog", controller=controller, t_list=np.linspace(-1, 1, 5), shots=20
+    )
+    plan.log.start()
+    try:
+        t, data, chopper = plan.read_tagged()
+    finally:
+        plan.log.stop()
+    assert chopper.shape == (20,)
+    np.testing.assert_array_equal(chopper, np.arange(20) % 2 == 0)
+    sums, counts = bin_shots(np.zeros(20), data, chopper, plan.edges)
+    np.testing.assert_array_equal(counts.sum(1), [10, 10])
+
+def test_select_spectrum():
+    from MessPy.Plans.shot_binning import select_spectrum
+
+    # single probe cameras like the Mightex name their spectrum "Probe"
+    spectra = {"Probe": "probe", "Ref": "ref"}
+    assert select_spectrum(spectra, None, "cam") == "probe"
+    assert select_spectrum(spectra, "Ref", "cam") == "ref"
+    with pytest.raises(KeyError, match="Probe1"):
+        select_spectrum(spectra, "Probe1", "cam")
+
+
+def test_position_log_lock():
+    from MessPy.Plans.shot_binning import PositionLog
+
+    busy, overlaps = [], []
+
+    def device_call() -> float:
+        overlaps.append(len(busy))
+        busy.append(1)
+        time.sleep(0.0005)
+        busy.pop()
+        return time.perf_counter()
+
+    log = PositionLog(device_call, interval=0.0002)
+    log.start()
+    for _ in range(100):
+        with log.lock:
+            device_call()
+    log.stop()
+    assert len(log.positions) > 10
+    assert not any(overlaps)
+    # the timestamp is the middle of the call
+    np.testing.assert_allclose(log.positions, log.times, atol=1e-3)
+
+
+def test_motion_axis():
+    ax = MotionAxis(max_velocity=10, acceleration=100, settle_time=0.05)
+    ax.readback_noise = 0
+    ax.move(2.0)
+    t0 = ax.current_move[0]
+    # 0.1 s acceleration to 10 mm/s, 0.1 s cruise and 0.1 s deceleration
+    times = t0 + np.array([-1, 0.05, 0.1, 0.2, 0.25, 0.3, 1])
+    np.testing.assert_allclose(ax.pos_at(times), [0, 0.125, 0.5, 1.5, 1.875, 2, 2])
+    assert ax.done_at() == pytest.approx(t0 + 0.35)
+    assert ax.is_moving()
+    # short moves do not reach the max. velocity, the profile is a triangle
+    ax.current_move = None
+    ax.move(1.9)
+    t_acc = np.sqrt(0.1 / 100)
+    t0 = ax.current_move[0]
+    assert ax.pos_at(t0 + t_acc) == pytest.approx(1.95)
+    assert ax.done_at() == pytest.approx(t0 + 2 * t_acc + 0.05)
+    ax.readback_noise = 0.01
+    ax.current_move = None
+    assert np.std([ax.read_pos() for _ in range(200)]) == pytest.approx(0.01, rel=0.3)
+
+
+@pytest.fixture
+def stage(qapp):
+    from MessPy.Instruments.mocks import state
+
+    yield no_state(StageMock())
+    state.sample_stage = None
+
+
+@pytest.mark.parametrize("fly_scan", [False, True], ids=["stepped", "fly"])
+def test_signal_image_plan(
+    benchmark, data_dir, controller, stage, fly_scan, monkeypatch
+):
+    import h5py
+
+    from MessPy.Instruments.mocks import state
+
+    # at the delay 0 of the mock the signal is strongest
+    monkeypatch.setattr(state, "delay_line", None)
+    monkeypatch.setattr(state, "t", 0.0)
+    x = np.linspace(-0.2, 0.2, 5)
+    positions = np.dstack(np.meshgrid(x, x))
+    # the shots pass by at the laser rate during the fly scans
+    controller.cam.cam.rep_rate = 1000.0
+    # the fly scans have no reference, which cancels the common noise
+    controller.cam.cam.noise_scale = 0.01
+    plan = SignalImagePlan(
+        name="bench",
+        cam=controller.cam.cam,
+        xy_stage=stage,
+        positions=positions,
+        wavelengths=controller.cam.wavelengths,
+        shots=20,
+        fly_scan=fly_scan,
+    )
+    controller.plan = plan
+    benchmark.pedantic(
+        run_points, (controller, plan, 1), {"signal": plan.sigScanFinished}, rounds=2
+    )
+    report(benchmark, x.size**2, "points/s")
+    controller.stop_plan()
+    assert stage.get_vel_mm() == (5.0, 5.0)
+    with h5py.File(plan.get_file_name()[0], "r") as f:
+        images = f["images"][:]
+        mean = f["mean_signal"][:]
+    assert images.shape == (2, 5, 5, controller.cam.sig_lines, controller.cam.channels)
+    with np.errstate(all="ignore"):
+        np.testing.assert_allclose(mean, np.nanmean(images, 0))
+    # the signal is strongest at the center and decays with the distance
+    ch = np.argmin(abs(controller.cam.wavelengths - 250))
+    sig = mean[..., 0, ch : ch + 10].mean(-1)
+    assert np.isfinite(sig).all()
+    assert sig[2, 2] < sig[0, 0] < 0
+    stage.has_velocity_control = False
+    with pytest.raises(NotImplementedError):
+        SignalImagePlan(
+            name="bench",
+            cam=controller.cam.cam,
+            xy_stage=stage,
+            positions=positions,
+            wavelengths=controller.cam.wavelengths,
+            fly_scan=True,
+        )
+
+
+def test_focus_scan(benchmark, controller, data_dir, stage):
+    def scan():
+        plan = FocusScan(
+            name="bench",
+            cam=controller.cam,
+            fh=stage,
+            x_parameters=[0, 1, 0.1],
+            y_parameters=None,
+            shots=20,
+        )
+        controller.start_plan(plan)
+        run_points(controller, plan, 1, signal=plan.sigFitDone)
+        return plan
+
+    plan = benchmark.pedantic(scan, rounds=2)
+    points = len(plan.scans["x_0"].pos)
+    report(benchmark, points, "points/s")
+    fit = plan.scans["x_0"].analyze()[0]
+    assert fit.params[0] == pytest.approx(0.5, abs=0.05)
+    # the mock beam has the width 0.25 * sqrt(2) at z = 0
+    assert fit.params[3] == pytest.approx(0.354, abs=0.05)
+    assert points <= plan.scans["x_0"].max_points
+
+
+def test_focus_scan_edge_outside():
+    from MessPy.Plans.FocusScan import Scan, gauss_int
+
+    rng = np.random.default_rng(1)
+    knife = []
+
+    def mover(x):
+        knife.append(x)
+        return iter(())
+
+    def reader():
+        # the edge lies beyond the end of the scanned range
+        y = gauss_int(knife[-1], 1.5, 1, 0.1, 0.05) + 1e-3 * rng.normal()
+        yield (y, y), None, None
+
+    scan = Scan(axis="x", start=0, end=1, step=0.1, width_rtol=0.02)
+    for _ in scan.scan(mover, reader):
+        pass
+    # the failed fits do not end the scan after the initial points
+    assert scan.min_points <= len(scan.pos) <= scan.max_points
+    assert len(set(scan.pos)) == len(scan.pos)
+
+
+def test_new_pump_probe_plan(data_dir, cam):
+    import warnings
+
+    import h5py
+
+    from MessPy.Instruments.mocks import DelayLineMock
+    from MessPy.Plans.NewPumpProbePlan import NewPumpProbePlan
+
+    controller = Controller()
+    plan = NewPumpProbePlan(
+        name="new pp",
+        cam=cam.cam,
+        delay_line=no_state(DelayLineMock()),
+        t_points=np.array([-1000.0, 0.0, 1000.0]),
+        shots=20,
+    )
+    controller.plan = plan
+    run_points(controller, plan, 2 * 3 + 1)
+    scans = plan.scan_stats[0]
+    assert plan.cur_scan == 2 and scans.count.max() == 2
+    plan.writer.flush()
+    with h5py.File(plan.get_file_name()[0], "r") as f:
+        signals = f["signals"]
+        assert signals.shape == (3, 1, 3, cam.cam.sig_lines, cam.cam.channels)
+        assert np.isnan(signals[2, 0, 1:]).all()
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nanmean(signals[:2, 0], 0)
+        np.testing.assert_allclose(f["mean_signal"][0], mean)
+        assert f["full_data"].shape[3:] == cam.cam.make_reading().full_data.shape
+    controller.stop_plan()
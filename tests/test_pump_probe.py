@@ -27,7 +27,7 @@ def test_functions():
         assert not c.shutter[0].is_open()
 
 
-def test_pump_probe():
+def test_pump_probe(qapp):
     c = Controller()
     t_list = range(0, 10)
     cwls = [
@@ -42,6 +42,8 @@ def test_pump_probe():
     )
     c.plan = pp
 
+    # the loop hands the plan to the runner, which is stepped by the event loop
+    c.loop()
     while pp.num_scans < 2:
-        c.loop()
+        qapp.processEvents()
     assert pp.cam_data[0].completed_scans.shape[0] == pp.cam_data[0].scan
@@ -5,7 +5,22 @@ from MessPy.Instruments.signal_processing import (
     fast_signal,
     fast_signal2d,
     fast_col_mean,
+    fast_frame_stats,
+    fast_moments2d,
+    RunningStats,
+    Spectrum,
+    Reading2D,
+    TwoDTransform,
+    PhaseCycle,
+    LOG10,
+    warm_up,
+    configure_jit,
+    ReadingPool,
+    fast_trim_mean_pair,
+    get_2d_transform,
+    THz2cm,
 )
+from scipy.stats import trim_mean
 import numpy as np
 from numpy.testing import assert_almost_equal
 
@@ -99,3 +114,349 @@ def test_col_mean():
     idx2 = np.tile(idx[..., None], arr.shape[2])
     true_val = np.average(arr, axis=0, weights=idx2)
     assert_almost_equal(true_val, fast_col_mean(arr, idx))
+
+
+@pytest.fixture
+def frame_array():
+    np.random.seed(1)
+    x = 12000 + 100 * np.random.random((128, 4000))
+    return x
+
+
+def classic_frame_stats(x, frames, first_frame):
+    frame_data = np.empty((x.shape[0], frames))
+    for i in range(frames):
+        frame_data[:, i] = np.nanmean(x[:, i::frames], 1)
+    return classic(x), np.roll(frame_data, -first_frame, 1)
+
+
+def test_classic_frame_stats(frame_array, benchmark):
+    benchmark(classic_frame_stats, frame_array, 320, 3)
+
+
+def test_fast_frame_stats(frame_array, benchmark):
+    frame_array[5, 17] = np.nan
+    res, frame_data = benchmark(fast_frame_stats, frame_array, 320, 3)
+    with np.errstate(invalid="ignore"):
+        (mean, std, mi, ma), true_frames = classic_frame_stats(frame_array, 320, 3)
+    ok = np.arange(128) != 5
+    assert_almost_equal(mean[ok], res[ok, 0])
+    assert_almost_equal(std[ok], res[ok, 1], 5)
+    assert_almost_equal(mi[ok], res[ok, 2])
+    assert_almost_equal(ma[ok], res[ok, 3])
+    assert_almost_equal(np.nanmean(frame_array[5]), res[5, 0])
+    assert_almost_equal(true_frames, frame_data)
+
+
+def test_spectrum_create_frames(array):
+    spec = Spectrum.create(array, frames=2, first_frame=1)
+    assert spec.frame_data.shape == (128, 2)
+    assert_almost_equal(spec.frame_data[:, 0], array[:, 1::2].mean(1))
+    assert_almost_equal(spec.frame_data[:, 1], array[:, ::2].mean(1))
+    assert_almost_equal(spec.mean, array.mean(1))
+    assert spec.signal.shape == (128,)
+
+
+def test_moments_large_offset():
+    np.random.seed(2)
+    x = 12000 + np.random.normal(scale=0.5, size=(4, 20000))
+    x = x.astype(np.float32).astype(np.float64)
+    mean, std, mi, ma = fast_stats(x[0])
+    assert_almost_equal(std, x[0].std(), 6)
+    res = fast_moments2d(x)
+    assert_almost_equal(res[:, 0], 20000)
+    assert_almost_equal(res[:, 1], x.mean(1))
+    assert_almost_equal(res[:, 2] / 20000, x.var(1), 6)
+
+
+def test_running_stats_merge():
+    np.random.seed(3)
+    x = 12000 + np.random.normal(size=(3, 50, 1000))
+    x[0, 3, 10] = np.nan
+    rs = RunningStats()
+    for i in range(0, 1000, 300):
+        rs.add(x[..., i : i + 300])
+    assert rs.count[0, 3] == 999
+    assert_almost_equal(rs.mean, np.nanmean(x, -1))
+    assert_almost_equal(rs.std, np.nanstd(x, -1))
+
+    rs2 = RunningStats()
+    rs2.add(x[..., :500])
+    rs3 = RunningStats()
+    rs3.add(x[..., 500:])
+    rs2.merge(rs3)
+    assert_almost_equal(rs2.mean, rs.mean)
+    assert_almost_equal(rs2.var, rs.var)
+
+
+def test_running_stats_samples():
+    np.random.seed(4)
+    scans = np.random.normal(size=(7, 2, 5, 16))
+    rs = RunningStats()
+    for s in scans:
+        rs.add_sample(s)
+    assert_almost_equal(rs.mean, scans.mean(0))
+    assert_almost_equal(rs.sem, scans.std(0, ddof=1) / np.sqrt(7))
+    rs.add_sample(np.full(scans.shape[1:], np.nan))
+    assert_almost_equal(rs.masked_mean, scans.mean(0))
+    empty = RunningStats()
+    empty.add_sample(np.where(scans[0] > 0, scans[0], np.nan))
+    assert np.isnan(empty.masked_mean[scans[0] <= 0]).all()
+
+
+# The reductions accumulate in float64 for both dtypes and run at about the same
+# speed, float32 only pays off where full shot arrays are built, see
+# test_full_data_dtype.
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_spectrum_create_dtype(frame_array, benchmark, dtype):
+    data = frame_array.astype(dtype)
+    spec = benchmark(Spectrum.create, data, frames=320, first_frame=0, dtype=dtype)
+    assert spec.mean.dtype == dtype
+    assert spec.frame_data.dtype == dtype
+    assert_almost_equal(spec.mean, frame_array.mean(1), 2)
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_stats2d_dtype(benchmark, dtype):
+    np.random.seed(1)
+    data = (12000 + 100 * np.random.random((3 * 3648, 200))).astype(dtype)
+    res = benchmark(fast_stats2d, data)
+    assert_almost_equal(res[:, 0], data.mean(1, dtype=np.float64), 3)
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_reading2d_dtype(benchmark, dtype):
+    np.random.seed(1)
+    data = (12000 + 100 * np.random.random((128, 4 * 80 * 20))).astype(dtype)
+    spec = Spectrum.create(data, frames=4 * 80, first_frame=0, dtype=dtype)
+    t2 = np.arange(80) * 0.05
+    r = benchmark(Reading2D.from_spectrum, spec, t2, 0, False)
+    assert r.interferogram.dtype == dtype
+    assert r.signal_2D.dtype == dtype
+
+
+def stack_full_data(a, b):
+    full_data = np.stack((a, b, a / b))
+    return full_data, fast_stats2d(full_data.reshape(-1, a.shape[1]))
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_full_data_dtype(benchmark, dtype):
+    np.random.seed(1)
+    a = (12000 + 100 * np.random.random((3648, 500))).astype(dtype)
+    b = a[::-1].copy()
+    full_data, res = benchmark(stack_full_data, a, b)
+    assert full_data.dtype == dtype
+    benchmark.extra_info["full_data_mb"] = full_data.nbytes / 2**20
+
+
+def test_full_data_float32_storage(tmp_path):
+    # The gain of float32: the full shot data takes half the memory and about half
+    # of the space in the file, see ScanFile.save_full_data
+    import h5py
+
+    np.random.seed(1)
+    a = 12000 + 100 * np.random.random((3648, 500))
+    stored = {}
+    with h5py.File(tmp_path / "full.h5", "w") as f:
+        for dtype in ("float64", "float32"):
+            full_data, _ = stack_full_data(a.astype(dtype), a[::-1].astype(dtype))
+            ds = f.create_dataset(
+                dtype,
+                data=full_data,
+                compression="lzf",
+                chunks=(1, full_data.shape[1], 20),
+                shuffle=True,
+            )
+            stored[dtype] = ds.id.get_storage_size()
+    assert stored["float32"] < 0.7 * stored["float64"]
+
+
+def classic_trim_mean_pair(x):
+    return trim_mean(x[:, ::2], 0.2, 1), trim_mean(x[:, 1::2], 0.2, 1)
+
+
+def test_classic_trim_mean(frame_array, benchmark):
+    benchmark(classic_trim_mean_pair, frame_array)
+
+
+@pytest.mark.parametrize("shots", [4000, 1001, 7, 2])
+def test_fast_trim_mean(frame_array, benchmark, shots):
+    np.random.seed(5)
+    x = frame_array[:, :shots].copy()
+    x[:, ::7] = np.round(x[:, ::7])  # some ties
+    x[3, :] = 1.0
+    res = benchmark(fast_trim_mean_pair, x, 0.2)
+    pu, not_pu = classic_trim_mean_pair(x)
+    assert_almost_equal(res[:, 0], pu)
+    assert_almost_equal(res[:, 1], not_pu)
+
+
+def classic_2d(ifr, upsample=2):
+    a = ifr.copy()
+    a[:, 0] *= 0.5
+    win = np.hanning(a.shape[1] * 2)
+    a = a * win[None, a.shape[1] :]
+    return np.fft.rfft(a, a.shape[1] * upsample, 1).real
+
+
+@pytest.fixture
+def two_d_spectra():
+    np.random.seed(1)
+    t1 = np.arange(80) * 0.05
+    specs = {}
+    for name in ("Probe1", "Probe2"):
+        data = 12000 + 100 * np.random.random((128, 4 * 80 * 10))
+        specs[name] = Spectrum.create(data, frames=4 * 80, first_frame=0)
+    return specs, t1
+
+
+def test_classic_reading2d(two_d_spectra, benchmark):
+    specs, t1 = two_d_spectra
+
+    def f():
+        return {n: classic_2d(Reading2D.demodulate(s.frame_data, 80)) for n, s in specs.items()}
+
+    benchmark(f)
+
+
+def test_reading2d_from_spectra(two_d_spectra, benchmark):
+    specs, t1 = two_d_spectra
+    res = benchmark(Reading2D.from_spectra, specs, t1, 1600, False)
+    for name, s in specs.items():
+        single = Reading2D.from_spectrum(s, t1, 1600, False)
+        assert_almost_equal(res[name].signal_2D, single.signal_2D)
+        assert_almost_equal(single.signal_2D, classic_2d(single.interferogram))
+        freqs = THz2cm(np.fft.rfftfreq(160, 0.05)) + 1600
+        assert_almost_equal(res[name].freqs, freqs)
+    assert get_2d_transform(80, t1[1] - t1[0], 2, np.hanning, 1600) is single.transform
+    # the readings own their axis, the cached one stays untouched
+    single.freqs -= 1600
+    res["Probe1"].freqs -= 1600
+    assert_almost_equal(single.transform.freqs, freqs)
+
+
+def test_reading2d_pump_grid(two_d_spectra, benchmark):
+    specs, t1 = two_d_spectra
+    full = Reading2D.from_spectra(specs, t1, 1600, False)
+    grid = (full["Probe1"].freqs[10], full["Probe1"].freqs[40], 31)
+    res = benchmark(Reading2D.from_spectra, specs, t1, 1600, False, pump_grid=grid)
+    for name in specs:
+        assert_almost_equal(res[name].freqs, full[name].freqs[10:41])
+        assert_almost_equal(res[name].signal_2D, full[name].signal_2D[:, 10:41])
+        single = Reading2D.from_spectrum(specs[name], t1, 1600, False, pump_grid=grid)
+        assert_almost_equal(single.signal_2D, res[name].signal_2D)
+
+
+def test_pump_grid_czt(monkeypatch):
+    np.random.seed(1)
+    x = np.random.random((2, 128, 80))
+    full = TwoDTransform(80, -0.05, rot_frame=1600)
+    grid = (full.freqs[10], full.freqs[40], 31)
+    monkeypatch.setattr(TwoDTransform, "max_kernel_size", 0)
+    zoom = TwoDTransform(80, -0.05, rot_frame=1600, pump_grid=grid)
+    assert zoom.kernel is None and zoom.czt is not None
+    assert_almost_equal(zoom.transform(x), full.transform(x)[..., 10:41])
+
+
+def classic_demodulate(f, n_t1):
+    n = f.shape[1] / n_t1
+    if n == 1:
+        return f
+    elif n == 2:
+        sig = (f[:, 0::2] - f[:, 1::2]) * (-1000 / LOG10)
+        return sig / (0.5 * (f[:, 0::2] + f[:, 1::2]))
+    sig = ((f[:, 0::4] - f[:, 1::4]) + (f[:, 2::4] - f[:, 3::4])) * (-1000 / LOG10)
+    return sig / (f[:, 0::4] + f[:, 1::4] + f[:, 2::4] + f[:, 3::4])
+
+
+@pytest.mark.parametrize("n", [1, 2, 4])
+def test_classic_demodulate(benchmark, n):
+    np.random.seed(1)
+    f = 12000 + 100 * np.random.random((128, n * 80 * 5))
+    benchmark(classic_demodulate, f, 80 * 5)
+
+
+@pytest.mark.parametrize("n", [1, 2, 4])
+def test_phase_cycle_demodulate(benchmark, n):
+    np.random.seed(1)
+    f = 12000 + 100 * np.random.random((128, n * 80 * 5))
+    sig = benchmark(Reading2D.demodulate, f, 80 * 5)
+    assert_almost_equal(sig, classic_demodulate(f, 80 * 5))
+    with pytest.raises(ValueError):
+        Reading2D.demodulate(f[:, :-1], 80 * 5)
+
+
+@pytest.mark.parametrize("n", [3, 6])
+def test_phase_cycle_n_step(n):
+    t = np.arange(80)
+    theta = 0.3 * t
+
+    def interferogram(cycle):
+        dphi = cycle.phases[:, 0] - cycle.phases[:, 1]
+        f = 1000 + 10 * np.cos(theta[:, None] + dphi[None, :])
+        return np.tile(f.reshape(1, -1), (4, 1))
+
+    cycle, four_step = PhaseCycle.standard(n), PhaseCycle.standard(4)
+    sig = Reading2D.demodulate(interferogram(cycle), 80, cycle)
+    ref = Reading2D.demodulate(interferogram(four_step), 80, four_step)
+    assert_almost_equal(sig, ref)
+    assert_almost_equal(sig[0], cycle.scale * 10 * np.cos(theta) / 1000)
+    chopped = PhaseCycle.from_phases(np.zeros((2, 2)), amps=np.array([1, 0]))
+    assert_almost_equal(chopped.num, [2, -2])
+    with pytest.raises(ValueError):
+        PhaseCycle.from_phases(np.zeros((2, 2)))
+
+
+def test_warm_up():
+    assert warm_up(("float64", "uint16")) >= 0
+    # the strided lines of the PhaseTec camera are compiled as well
+    assert {sig[0].layout for sig in fast_stats2d.signatures} >= {"C", "A"}
+    assert any(sig[0].dtype.name == "uint16" for sig in fast_col_mean.signatures)
+
+
+def test_configure_jit(tmp_path, monkeypatch):
+    import numba
+    from MessPy.Instruments import signal_processing as sp
+
+    monkeypatch.delenv("NUMBA_CACHE_DIR", raising=False)
+    monkeypatch.setattr(numba.config, "CACHE_DIR", numba.config.CACHE_DIR)
+    monkeypatch.setattr(sp, "JIT_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(sp, "_jit_configured", False)
+    configure_jit()
+    assert numba.config.CACHE_DIR == str(tmp_path / "cache")
+    assert fast_stats2d._cache._cache_path.startswith(str(tmp_path))
+    monkeypatch.undo()
+    for kernel in sp._cached_kernels:
+        kernel.enable_caching()
+
+
+def test_reading_pool():
+    pool = ReadingPool()
+    shapes = ((2, 10), (3, 10), (2, 10), (3, 10, 20))
+    rd = pool.acquire(*shapes, shots=20)
+    assert rd.full_data.shape == (3, 10, 20)
+    pool.hold(rd)
+    pool.release(rd)
+    assert pool.acquire(*shapes, shots=20) is not rd
+    with pool.holding(rd):
+        pool.release(rd)
+        assert pool.acquire(*shapes, shots=20) is not rd
+    assert pool.acquire(*shapes, shots=20) is rd
+    pool.release(rd)
+    other = pool.acquire((2, 10), (3, 10), (2, 10), (3, 10, 40), shots=40)
+    assert other is not rd and other.full_data.shape == (3, 10, 40)
+    pool.release(rd)
+    assert pool.acquire((2, 10), (3, 10), (2, 10), (3, 10, 40), shots=40) is not rd
+
+    # holding a released reading takes it back from the pool, releasing twice
+    # does not free it twice
+    rd = pool.acquire((2, 10), (3, 10), (2, 10), (3, 10, 40), shots=40)
+    pool.release(rd)
+    pool.hold(rd)
+    assert pool.acquire((2, 10), (3, 10), (2, 10), (3, 10, 40), shots=40) is not rd
+    pool.release(rd)
+    pool.release(rd)
+    assert pool.acquire((2, 10), (3, 10), (2, 10), (3, 10, 40), shots=40) is rd
+    assert pool.acquire((2, 10), (3, 10), (2, 10), (3, 10, 40), shots=40) is not rd
+